@@ -0,0 +1,195 @@
+import fcntl
+import json
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc
+
+from dashboard_core import DEFAULT_METRICS
+
+RAW_METRICS = [key for key, metric in DEFAULT_METRICS.items() if metric['type'] == 'raw']
+
+# One directory per account: manifest.json plus append-only segment-NNNNNN.arrow files
+ARROW_STORE_DIR = os.environ.get('DASHBOARD_ARROW_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'arrow_store'))
+
+# Merge an account's segments into one once it has this many
+COMPACT_SEGMENTS = 16
+
+MANIFEST_NAME = 'manifest.json'
+
+SCHEMA = pa.schema([('date', pa.string())] + [(metric_key, pa.float64()) for metric_key in RAW_METRICS])
+
+def empty_manifest():
+    return {'version': 0, 'next_segment': 1, 'segments': []}
+
+class InsightsStore:
+    """Daily raw metrics per account in Arrow IPC files, memory-mapped read-only
+    
+    Writers (any process) append a segment file and then atomically replace
+    the manifest under an flock. Readers map each segment once and share the
+    page cache with every other process. A segment's days override the same
+    days in older segments.
+    """
+    def __init__(self, root=ARROW_STORE_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+        self.manifests = {}
+        self.segments = {}
+    
+    def account_dir(self, account_id):
+        return os.path.join(self.root, str(account_id))
+    
+    def read_manifest(self, account_id):
+        path = os.path.join(self.account_dir(account_id), MANIFEST_NAME)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return empty_manifest()
+    
+    def write_manifest(self, account_id, manifest):
+        """Swap in a new manifest atomically; readers see either the old or the new one"""
+        directory = self.account_dir(account_id)
+        temp_path = os.path.join(directory, MANIFEST_NAME + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(directory, MANIFEST_NAME))
+    
+    def write_segment(self, account_id, manifest, table, start_date=None, end_date=None, fetched_at=None):
+        """Write a new segment file and return its manifest entry
+        
+        min_date/max_date record the fetched span, which can be wider than
+        the stored days because days without delivery have no rows.
+        fetched_at is when the days left the Graph API.
+        """
+        name = f"segment-{manifest['next_segment']:06d}.arrow"
+        path = os.path.join(self.account_dir(account_id), name)
+        with pa.OSFile(path + '.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, SCHEMA) as writer:
+                writer.write_table(table)
+        os.replace(path + '.tmp', path)
+        manifest['next_segment'] += 1
+        dates = table.column('date').to_pylist()
+        return {
+            'file': name,
+            'rows': table.num_rows,
+            'min_date': min(dates + [start_date] if start_date else dates),
+            'max_date': max(dates + [end_date] if end_date else dates),
+            'fetched_at': fetched_at
+        }
+    
+    def append_days(self, account_id, daily_data, start_date=None, end_date=None, fetched_at=None):
+        """Append fetched days ({date: raw metrics}) as a new segment; returns the manifest version"""
+        # A fetch without rows still records its span, so it masks older days
+        if not daily_data and not (start_date and end_date):
+            return None
+        dates = sorted(daily_data)
+        table = pa.table(
+            [pa.array(dates, pa.string())] + [
+                pa.array([float(daily_data[date].get(metric_key, 0)) for date in dates], pa.float64())
+                for metric_key in RAW_METRICS
+            ],
+            schema=SCHEMA
+        )
+        
+        directory = self.account_dir(account_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            manifest = self.read_manifest(account_id)
+            manifest['segments'].append(self.write_segment(account_id, manifest, table, start_date, end_date, fetched_at))
+            replaced = []
+            if len(manifest['segments']) >= COMPACT_SEGMENTS:
+                replaced = [segment['file'] for segment in manifest['segments']]
+                with self.lock:
+                    merged = self.resolve(account_id, manifest)
+                # The merged days are as old as the oldest segment's (unknown if any is)
+                fetched = [segment.get('fetched_at') for segment in manifest['segments']]
+                manifest['segments'] = [self.write_segment(
+                    account_id,
+                    manifest,
+                    merged,
+                    min(segment['min_date'] for segment in manifest['segments']),
+                    max(segment['max_date'] for segment in manifest['segments']),
+                    None if None in fetched else min(fetched)
+                )]
+            manifest['version'] += 1
+            self.write_manifest(account_id, manifest)
+            
+            # Unlink compacted segments only after the new manifest is in place;
+            # processes that still map them keep their pages until they reload
+            for name in replaced:
+                os.remove(os.path.join(directory, name))
+            return manifest['version']
+    
+    def map_segment(self, account_id, name):
+        """Memory-map one segment read-only, reusing the mapping across manifest versions"""
+        key = (str(account_id), name)
+        table = self.segments.get(key)
+        if table is None:
+            source = pa.memory_map(os.path.join(self.account_dir(account_id), name), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            self.segments[key] = table
+        return table
+    
+    def current_segments(self, account_id):
+        """(mapped table, manifest entry) of each segment in the account's current manifest, oldest first"""
+        path = os.path.join(self.account_dir(account_id), MANIFEST_NAME)
+        try:
+            stat = os.stat(path)
+            stamp = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return []
+        
+        with self.lock:
+            cached = self.manifests.get(str(account_id))
+            if cached is None or cached[0] != stamp:
+                manifest = self.read_manifest(account_id)
+                names = [segment['file'] for segment in manifest['segments']]
+                # Drop mappings of segments a compaction replaced
+                for key in [key for key in self.segments if key[0] == str(account_id) and key[1] not in names]:
+                    del self.segments[key]
+                cached = (stamp, [
+                    (self.map_segment(account_id, segment['file']), segment) for segment in manifest['segments']
+                ])
+                self.manifests[str(account_id)] = cached
+            return cached[1]
+    
+    def resolve(self, account_id, manifest):
+        """One table with each day taken from the newest segment covering it"""
+        segments = [(self.map_segment(account_id, segment['file']), segment) for segment in manifest['segments']]
+        return self.latest_days(segments)
+    
+    def latest_days(self, segments, start_date=None, end_date=None):
+        """Filter segments newest first, skipping days inside a newer segment's fetched span
+        
+        A span covers its days without delivery too, so a re-fetch that
+        returned no row for a day drops that day's older values.
+        """
+        parts = []
+        spans = []
+        for table, segment in reversed(segments):
+            dates = table.column('date')
+            mask = pa.array([True] * table.num_rows, pa.bool_())
+            for min_date, max_date in spans:
+                covered = pc.and_(pc.greater_equal(dates, min_date), pc.less_equal(dates, max_date))
+                mask = pc.and_(mask, pc.invert(covered))
+            if start_date:
+                mask = pc.and_(mask, pc.greater_equal(dates, start_date))
+            if end_date:
+                mask = pc.and_(mask, pc.less_equal(dates, end_date))
+            parts.append(table.filter(mask))
+            spans.append((segment['min_date'], segment['max_date']))
+        if not parts:
+            return SCHEMA.empty_table()
+        return pa.concat_tables(parts).sort_by('date')
+    
+    def get_daily(self, account_id, start_date, end_date):
+        """Stored days in a range as {date: raw metrics}, the shape process_daily_facebook_data returns"""
+        table = self.latest_days(self.current_segments(account_id), start_date, end_date)
+        rows = table.to_pylist()
+        return {row.pop('date'): row for row in rows}
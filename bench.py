@@ -0,0 +1,530 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Each measurement runs in a fresh interpreter so module caches start cold,
+# the same as the first script run after a Streamlit worker starts.
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = ['streamlit_app.py', 'new_dashboard.py']
+
+# Git revision holding the entry points from before the shared logic moved
+# into dashboard_core; the startup benchmark times them in the same harness.
+# Unset, it is where this branch forked from the first of these branches.
+STARTUP_BASELINE_REV = os.environ.get('BENCH_BASELINE_REV')
+STARTUP_BASELINE_BRANCHES = ['main', 'origin/main']
+
+FIRST_RUN_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+harness_seconds = time.perf_counter() - started
+started = time.perf_counter()
+at = AppTest.from_file({path!r}, default_timeout=120).run()
+first_run_seconds = time.perf_counter() - started
+print(json.dumps({{
+    'harness_seconds': harness_seconds,
+    'first_run_seconds': first_run_seconds,
+    'exceptions': len(at.exception),
+    'pandas_loaded': 'pandas' in sys.modules,
+    'requests_loaded': 'requests' in sys.modules
+}}))
+'''
+
+IMPORT_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - started}}))
+'''
+
+def run_json(script):
+    """Run a script in a fresh interpreter and parse its JSON output"""
+    result = subprocess.run(
+        [sys.executable, '-c', script],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def first_run(path, repeat):
+    """Median first script run of one entry point, each run in a fresh interpreter"""
+    runs = [run_json(FIRST_RUN_SCRIPT.format(path=path)) for _ in range(repeat)]
+    return {
+        'first_run_ms': median([run['first_run_seconds'] for run in runs]) * 1000,
+        'exceptions': max(run['exceptions'] for run in runs),
+        'pandas_loaded': any(run['pandas_loaded'] for run in runs),
+        'requests_loaded': any(run['requests_loaded'] for run in runs)
+    }
+
+def git(*args):
+    """Output of a git command in the app checkout, or None when it fails"""
+    result = subprocess.run(['git', *args], cwd=APP_DIR, capture_output=True, text=True)
+    return result.stdout if result.returncode == 0 else None
+
+def baseline_rev():
+    """BENCH_BASELINE_REV, or the merge-base with the main branch"""
+    if STARTUP_BASELINE_REV:
+        return STARTUP_BASELINE_REV
+    for branch in STARTUP_BASELINE_BRANCHES:
+        merge_base = git('merge-base', 'HEAD', branch)
+        if merge_base:
+            return merge_base.strip()
+    raise SystemExit(
+        f"No baseline for the startup benchmark: none of {', '.join(STARTUP_BASELINE_BRANCHES)} exists here. "
+        "Set BENCH_BASELINE_REV to a revision with the entry points from before the dashboard_core split."
+    )
+
+def checkout_baseline(root, rev):
+    """Write the entry points at rev into root and return their paths"""
+    paths = {}
+    for entry_point in ENTRY_POINTS:
+        source = git('show', f"{rev}:{entry_point}")
+        if source is None:
+            raise SystemExit(f"{entry_point} is not in baseline revision {rev}; set BENCH_BASELINE_REV to one that has it.")
+        paths[entry_point] = os.path.join(root, entry_point)
+        with open(paths[entry_point], 'w') as f:
+            f.write(source)
+    return paths
+
+def bench_startup(repeat):
+    """Time the first script run of each entry point from a cold interpreter, against the baseline"""
+    import shutil
+    import tempfile
+    
+    rev = baseline_rev()
+    
+    # What an eager top-level import of the heavy dependencies would add
+    deferred_seconds = sum(
+        median([run_json(IMPORT_SCRIPT.format(module=module))['seconds'] for _ in range(repeat)])
+        for module in ['pandas', 'requests']
+    )
+    print(f"Deferred pandas + requests import cost: {deferred_seconds * 1000:.0f} ms")
+    
+    root = tempfile.mkdtemp(prefix='startup-bench-')
+    results = {}
+    try:
+        baseline_paths = checkout_baseline(root, rev)
+        print(f"Baseline: {rev}")
+        for entry_point in ENTRY_POINTS:
+            runs = {
+                'current': first_run(os.path.join(APP_DIR, entry_point), repeat),
+                'baseline': first_run(baseline_paths[entry_point], repeat)
+            }
+            results[entry_point] = runs
+            for name, result in runs.items():
+                print(
+                    f"{entry_point} ({name}): first run {result['first_run_ms']:.0f} ms, "
+                    f"pandas loaded: {result['pandas_loaded']}, "
+                    f"requests loaded: {result['requests_loaded']}, "
+                    f"exceptions: {result['exceptions']}"
+                )
+            print(f"{entry_point}: {runs['baseline']['first_run_ms'] / runs['current']['first_run_ms']:.1f}x faster first run")
+    finally:
+        shutil.rmtree(root)
+    return results
+
+# (columns per platform table, raw daily rows) for the workbook export benchmark
+EXPORT_SIZES = [(4, 28), (52, 365), (260, 3650)]
+
+def synthetic_export_data(column_count, day_count):
+    """Platform tables with column_count weekly columns plus day_count daily rows"""
+    from dashboard_core import DEFAULT_METRICS, PLATFORM_NAMES, create_initial_table
+    
+    end = datetime(2026, 1, 4)
+    tables = {}
+    for table_key, platform in PLATFORM_NAMES.items():
+        table = create_initial_table(platform)
+        table['columns'] = []
+        for i in range(column_count):
+            week_end = end - timedelta(days=7 * (column_count - 1 - i))
+            week_start = week_end - timedelta(days=6)
+            table['columns'].append({
+                'name': f'Week {i + 1}',
+                'start_date': week_start.strftime('%Y-%m-%d'),
+                'end_date': week_end.strftime('%Y-%m-%d'),
+                'display_name': f"{week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}"
+            })
+        for metric_key in DEFAULT_METRICS:
+            table['data'][metric_key] = {column['name']: float(i + 1) for i, column in enumerate(table['columns'])}
+            table['data_source'][metric_key] = {column['name']: 'api' for column in table['columns']}
+        tables[table_key] = table
+    
+    def daily_rows():
+        for i in range(day_count):
+            date = (end - timedelta(days=day_count - 1 - i)).strftime('%Y-%m-%d')
+            yield date, 'Facebook API', {'spend': 10.0 + i, 'impressions': 1000 + i, 'clicks': 20 + i}
+    
+    return tables, daily_rows
+
+def bench_export(repeat):
+    """Time the streamed multi-sheet workbook export and track its peak Python memory"""
+    from workbook import build_workbook_bytes, platform_tables
+    
+    results = {}
+    for column_count, day_count in EXPORT_SIZES:
+        tables, daily_rows = synthetic_export_data(column_count, day_count)
+        timings = []
+        peaks = []
+        for _ in range(repeat):
+            tracemalloc.start()
+            started = time.perf_counter()
+            workbook_bytes = build_workbook_bytes(platform_tables(tables), daily_rows())
+            timings.append(time.perf_counter() - started)
+            # The returned file itself is excluded; it is handed straight to the browser
+            peaks.append(tracemalloc.get_traced_memory()[1] - len(workbook_bytes))
+            tracemalloc.stop()
+        results[(column_count, day_count)] = {
+            'ms': median(timings) * 1000,
+            'peak_kb': median(peaks) / 1024,
+            'size_kb': len(workbook_bytes) / 1024
+        }
+        print(
+            f"{column_count} columns x {len(tables)} platforms, {day_count} daily rows: "
+            f"{results[(column_count, day_count)]['ms']:.0f} ms, "
+            f"peak {results[(column_count, day_count)]['peak_kb']:.0f} KB working memory, "
+            f"{results[(column_count, day_count)]['size_kb']:.0f} KB file"
+        )
+    return results
+
+IMPORT_ROWS = [100000, 1000000]
+
+def write_synthetic_export(path, row_count, ads_per_day=5000):
+    """A Google Ads style export: title lines, one row per ad and day, a totals footer"""
+    start = datetime(2025, 1, 1)
+    with open(path, 'w') as f:
+        f.write('Ad performance report\n"All time"\n')
+        f.write('Day,Campaign,Ad,Cost,Impr.,Clicks,Add to cart,Begin checkout,Conversions,Conv. value\n')
+        for i in range(row_count):
+            day = (start + timedelta(days=i // ads_per_day)).strftime('%Y-%m-%d')
+            f.write(f'{day},Campaign {i % 7},"Ad {i % ads_per_day}","1,{i % 1000:03d}.50",{i % 900},{i % 40},{i % 5},{i % 3},{i % 2},"${i % 90}.00"\n')
+        f.write('Total: Account,,,"--",--,--,--,--,--,--\n')
+
+def bench_import(repeat):
+    """Time the chunked CSV import and track its peak Python memory against the file size"""
+    import tempfile
+    
+    from importer import IMPORT_COLUMN_MAPPINGS, aggregate_daily
+    
+    results = {}
+    for row_count in IMPORT_ROWS:
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        try:
+            write_synthetic_export(path, row_count)
+            aggregate_daily(path, IMPORT_COLUMN_MAPPINGS['google'])
+            timings = []
+            peaks = []
+            for _ in range(repeat):
+                tracemalloc.start()
+                started = time.perf_counter()
+                imported = aggregate_daily(path, IMPORT_COLUMN_MAPPINGS['google'])
+                timings.append(time.perf_counter() - started)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            results[row_count] = {
+                'ms': median(timings) * 1000,
+                'peak_mb': median(peaks) / 1024 / 1024,
+                'file_mb': os.path.getsize(path) / 1024 / 1024,
+                'days': len(imported['daily'])
+            }
+        finally:
+            os.remove(path)
+        print(
+            f"{row_count:,} rows ({results[row_count]['file_mb']:.0f} MB) into {results[row_count]['days']} days: "
+            f"{results[row_count]['ms']:.0f} ms, peak {results[row_count]['peak_mb']:.0f} MB working memory"
+        )
+    return results
+
+INDEX_DAYS = [365, 3650]
+
+def bench_index(repeat):
+    """Compare re-summing daily rows with prefix-sum lookups for every column of a long table"""
+    from dashboard_core import DEFAULT_METRICS, sum_daily_metrics
+    from range_index import PrefixSumIndex
+    
+    raw_metrics = [key for key, metric in DEFAULT_METRICS.items() if metric['type'] == 'raw']
+    results = {}
+    for day_count in INDEX_DAYS:
+        start = datetime(2016, 1, 1)
+        dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(day_count)]
+        daily_data = {date: {metric_key: float(i) for metric_key in raw_metrics} for i, date in enumerate(dates)}
+        # One column per week, the way a long weekly table asks for totals
+        columns = [(dates[i], dates[min(i + 6, day_count - 1)]) for i in range(0, day_count, 7)]
+        
+        started = time.perf_counter()
+        index = PrefixSumIndex()
+        index.add_days(daily_data)
+        build_seconds = time.perf_counter() - started
+        
+        scan_timings = []
+        index_timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for start_date, end_date in columns:
+                sum_daily_metrics(daily_data, start_date, end_date, raw_metrics)
+            scan_timings.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            for start_date, end_date in columns:
+                index.range_totals(start_date, end_date)
+            index_timings.append(time.perf_counter() - started)
+        results[day_count] = {
+            'build_ms': build_seconds * 1000,
+            'scan_ms': median(scan_timings) * 1000,
+            'index_ms': median(index_timings) * 1000
+        }
+        print(
+            f"{day_count} days, {len(columns)} columns: re-sum {results[day_count]['scan_ms']:.1f} ms, "
+            f"prefix-sum {results[day_count]['index_ms']:.1f} ms (index built in {results[day_count]['build_ms']:.1f} ms)"
+        )
+    return results
+
+TREND_COLUMNS = [4, 50, 200]
+
+def bench_trends(repeat):
+    """Time computing changes and anomaly scores for every cell of a wide table"""
+    from trends import compute_trends
+    
+    results = {}
+    for column_count in TREND_COLUMNS:
+        tables, _ = synthetic_export_data(column_count, 0)
+        table = tables['facebook']
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            compute_trends(table)
+            timings.append(time.perf_counter() - started)
+        results[column_count] = median(timings) * 1000
+        print(f"{column_count} columns x {len(table['metrics'])} metrics: {results[column_count]:.2f} ms")
+    return results
+
+CHART_DAYS = [365, 1825, 3650]
+
+def bench_charts(repeat):
+    """Time building a downsampled daily trend figure and serializing it for the browser"""
+    import numpy as np
+    from charts import build_trend_figure
+    
+    results = {}
+    for day_count in CHART_DAYS:
+        dates = np.datetime64('2016-01-01') + np.arange(day_count)
+        values = np.random.default_rng(0).gamma(2.0, 50.0, day_count)
+        series = [(name, dates, values) for name in ['Facebook', 'Google Ads']]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            figure, sent, total = build_trend_figure(series, 'spend')
+            payload = figure.to_json()
+            timings.append(time.perf_counter() - started)
+        results[day_count] = {'ms': median(timings) * 1000, 'points': sent, 'bytes': len(payload)}
+        print(
+            f"{day_count} days x {len(series)} series: {results[day_count]['ms']:.1f} ms, "
+            f"{sent:,} of {total:,} points sent ({len(payload) / 1024:.0f} KB)"
+        )
+    return results
+
+# Half a compaction past a multiple of JOURNAL_COMPACT_ENTRIES (500), so every
+# reopen replays a journal on top of the last snapshot
+WORKSPACE_EDITS = [250, 1250, 10250, 100250]
+
+def bench_workspace(repeat):
+    """Time journaling single-cell edits and reopening a workspace, with the journal replay timed apart"""
+    import shutil
+    import tempfile
+    from dashboard_core import PLATFORM_NAMES, create_initial_table
+    from workspace import Workspace
+    
+    results = {}
+    for edit_count in WORKSPACE_EDITS:
+        root = tempfile.mkdtemp(prefix='workspace-bench-')
+        try:
+            workspace = Workspace('bench', root)
+            workspace.record({
+                table_key: [('table', create_initial_table(platform))] for table_key, platform in PLATFORM_NAMES.items()
+            })
+            metric_keys = list(workspace.tables['facebook']['data'])
+            started = time.perf_counter()
+            for i in range(edit_count):
+                cell = [metric_keys[i % len(metric_keys)], f"Week {i % 4 + 1}", float(i), 'manual']
+                workspace.record({'facebook': [('cells', [cell])]})
+                # One flush per 50 edits, the way the debounce batches a burst of typing
+                if i % 50 == 49:
+                    workspace.flush()
+            workspace.flush()
+            record_ms = (time.perf_counter() - started) * 1000
+            
+            def reopen_ms():
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    reopened = Workspace('bench', root)
+                    timings.append(time.perf_counter() - started)
+                assert reopened.tables == workspace.tables
+                return median(timings) * 1000, reopened.journal_entries
+            
+            replay_ms, journal_entries = reopen_ms()
+            # The same tables with the journal folded in leaves only the snapshot load
+            workspace.compact()
+            snapshot_ms, _ = reopen_ms()
+            results[edit_count] = {
+                'record_us': record_ms * 1000 / edit_count,
+                'reopen_ms': replay_ms,
+                'snapshot_ms': snapshot_ms,
+                'journal_entries': journal_entries
+            }
+            print(
+                f"{edit_count} edits: {results[edit_count]['record_us']:.0f} us per edit journaled, "
+                f"reopen {replay_ms:.2f} ms with {journal_entries} journal entries replayed, "
+                f"{snapshot_ms:.2f} ms from the snapshot alone"
+            )
+        finally:
+            shutil.rmtree(root)
+    return results
+
+SHARED_SESSIONS = [8, 32, 64]
+SHARED_EDITS_PER_SESSION = 100
+
+def bench_shared(repeat):
+    """Time cell saves from many concurrent sessions against the shared SQLite workspace store"""
+    import random
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from dashboard_core import DEFAULT_METRICS, PLATFORM_NAMES, create_initial_table
+    from shared_workspace import SharedWorkspaceStore
+    
+    results = {}
+    for session_count in SHARED_SESSIONS:
+        root = tempfile.mkdtemp(prefix='shared-bench-')
+        try:
+            workspace = SharedWorkspaceStore(os.path.join(root, 'workspaces.db')).get('bench')
+            workspace.commit({table_key: [('create', create_initial_table(platform))] for table_key, platform in PLATFORM_NAMES.items()}, {})
+            _, versions = workspace.checkout()
+            metric_keys = list(DEFAULT_METRICS)
+            
+            def edit_session(seed):
+                # Each session syncs, then saves one cell, the way a rerun after an edit does
+                rng = random.Random(seed)
+                session_versions = dict(versions)
+                latencies = []
+                conflicts = 0
+                for _ in range(SHARED_EDITS_PER_SESSION):
+                    _, session_versions = workspace.changes_since(session_versions)
+                    table_key = rng.choice(list(PLATFORM_NAMES))
+                    cell = [rng.choice(metric_keys), f"Week {rng.randint(1, 4)}", float(rng.randint(0, 1000)), 'manual']
+                    started = time.perf_counter()
+                    session_versions, _, conflicted = workspace.commit({table_key: [('cells', [cell])]}, session_versions)
+                    latencies.append(time.perf_counter() - started)
+                    conflicts += len(conflicted)
+                return latencies, conflicts
+            
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=session_count) as executor:
+                outcomes = list(executor.map(edit_session, range(session_count)))
+            wall_seconds = time.perf_counter() - started
+            latencies = sorted(latency for session_latencies, _ in outcomes for latency in session_latencies)
+            results[session_count] = {
+                'saves_per_second': len(latencies) / wall_seconds,
+                'p50_ms': latencies[len(latencies) // 2] * 1000,
+                'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+                'conflicts': sum(conflicts for _, conflicts in outcomes)
+            }
+            print(
+                f"{session_count} sessions x {SHARED_EDITS_PER_SESSION} saves: {results[session_count]['saves_per_second']:.0f} saves/s, "
+                f"p50 {results[session_count]['p50_ms']:.2f} ms, p99 {results[session_count]['p99_ms']:.2f} ms, "
+                f"{results[session_count]['conflicts']} conflicts"
+            )
+        finally:
+            shutil.rmtree(root)
+    return results
+
+CACHE_LOOKUPS = [10, 100, 1000]
+
+def bench_cache(repeat):
+    """Time per-key and batched lookups against a cache daemon started on a temporary socket"""
+    import shutil
+    import tempfile
+    from cache_daemon import CacheClient
+    from dashboard_core import insights_cache_key, insights_cache_ttl, insights_refresh_due, plan_insights_fields
+    
+    root = tempfile.mkdtemp(prefix='cache-bench-')
+    path = os.path.join(root, 'cache.sock')
+    daemon = subprocess.Popen([sys.executable, os.path.join(APP_DIR, 'cache_daemon.py'), '--socket', path], stdout=subprocess.DEVNULL)
+    results = {}
+    try:
+        while not os.path.exists(path):
+            time.sleep(0.05)
+        client = CacheClient(path)
+        plan = plan_insights_fields()
+        # A totals row shaped like the Graph API's, with every action type present
+        row = {'impressions': '123456', 'clicks': '2345', 'spend': '4567.89', 'reach': '98765'}
+        row['actions'] = [{'action_type': action_type, 'value': '12'} for action_type in plan['action_types']]
+        row['action_values'] = [{'action_type': action_type, 'value': '345.67'} for action_type in plan['action_types']]
+        
+        def lookup(batch):
+            # Filtered by age like get_cached_rows, so the timing covers what a fetch waits for
+            return {
+                key: entry for key, entry in client.get_many(batch).items()
+                if not insights_refresh_due('2024-01-07', entry['fetched_at'])
+            }
+        
+        for lookups in CACHE_LOOKUPS:
+            keys = [insights_cache_key(str(account), '2024-01-01', '2024-01-07', plan) for account in range(lookups)]
+            # Half the keys are cached, as if half the accounts were fetched by another replica;
+            # entries are stored the way get_insight_rows stores them
+            client.set_many({key: {'rows': [row], 'fetched_at': time.time()} for key in keys[::2]}, insights_cache_ttl('2024-01-07'))
+            single, batched = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                for key in keys:
+                    lookup([key])
+                single.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                found = lookup(keys)
+                batched.append(time.perf_counter() - started)
+            assert len(found) == len(keys[::2]) and all(entry['rows'] == [row] for entry in found.values())
+            results[lookups] = {'single_ms': median(single) * 1000, 'batched_ms': median(batched) * 1000}
+            print(
+                f"{lookups} lookups: {results[lookups]['single_ms']:.2f} ms one key at a time, "
+                f"{results[lookups]['batched_ms']:.2f} ms in one batch"
+            )
+        stats = client.get_stats()['daemon']
+        print(f"daemon: {stats['hit_rate']:.0%} hit rate, {stats['entries']} entries, {stats['bytes'] / 1024:.0f} KB")
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        shutil.rmtree(root)
+    return results
+
+BENCHMARKS = {
+    'cache': bench_cache,
+    'charts': bench_charts,
+    'export': bench_export,
+    'import': bench_import,
+    'index': bench_index,
+    'shared': bench_shared,
+    'trends': bench_trends,
+    'workspace': bench_workspace,
+    'startup': bench_startup
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ad reporting dashboard benchmarks")
+    parser.add_argument('benchmarks', nargs='*', help=f"any of: {', '.join(sorted(BENCHMARKS))}")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        print(f"== {name} ==")
+        BENCHMARKS[name](args.repeat)
@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Unix socket the daemon listens on; every dashboard replica on the host connects to it
+CACHE_SOCKET = os.environ.get('DASHBOARD_CACHE_SOCKET', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache.sock'))
+
+# Memory for cached values before least recently used entries are evicted
+CACHE_MAX_MB = float(os.environ.get('DASHBOARD_CACHE_MAX_MB', 256))
+
+# A slow or hung daemon turns into cache misses after this long
+CACHE_TIMEOUT_SECONDS = 0.5
+
+# After a failed connection the client stops trying for this long
+CACHE_RETRY_SECONDS = 30
+
+# Idle client connections kept open per process
+CACHE_POOL_SIZE = 8
+
+class LRUCache:
+    """Byte-bounded LRU of JSON-encoded values, each with its own expiry
+    
+    Values are kept as the JSON text clients sent, so a get answers without
+    decoding or re-encoding them. Expired entries are dropped when read or
+    when they reach the cold end of the LRU.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expired': 0, 'rejected': 0}
+    
+    def get_many(self, keys):
+        """JSON text per key, None for a miss"""
+        now = time.time()
+        values = []
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    self.remove(key)
+                    self.stats['expired'] += 1
+                    entry = None
+                if entry is None:
+                    self.stats['misses'] += 1
+                    values.append(None)
+                else:
+                    self.entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    values.append(entry[1])
+        return values
+    
+    def set_many(self, items):
+        """Store (key, JSON text, ttl seconds) items, evicting the coldest entries past max_bytes; returns how many were stored
+        
+        Only entries older than the batch are evicted. Of a batch bigger than
+        the whole cache, the last items that fit are kept and the rest rejected.
+        """
+        now = time.time()
+        # Walk the batch from its end so later values of a key win and the newest items fit first
+        batch = {}
+        size = 0
+        rejected = 0
+        for key, raw, ttl in reversed(items):
+            if key in batch:
+                continue
+            if size + len(key) + len(raw) > self.max_bytes:
+                rejected += 1
+                continue
+            batch[key] = (ttl, raw)
+            size += len(key) + len(raw)
+        
+        with self.lock:
+            self.stats['rejected'] += rejected
+            for key, (ttl, raw) in reversed(batch.items()):
+                if key in self.entries:
+                    self.remove(key)
+                self.entries[key] = (now + ttl, raw)
+                self.bytes += len(key) + len(raw)
+                self.stats['sets'] += 1
+            # The batch sits at the hot end and fits on its own, so this stops before reaching it
+            while self.bytes > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.stats['evictions'] += 1
+        return len(batch)
+    
+    def delete_many(self, keys):
+        with self.lock:
+            deleted = [key for key in keys if key in self.entries]
+            for key in deleted:
+                self.remove(key)
+        return len(deleted)
+    
+    def remove(self, key):
+        _, raw = self.entries.pop(key)
+        self.bytes -= len(key) + len(raw)
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, entries=len(self.entries), bytes=self.bytes, max_bytes=self.max_bytes)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+class CacheRequestHandler(socketserver.StreamRequestHandler):
+    """One client connection: newline-delimited JSON requests, each answered with one JSON line
+    
+    {"op": "get", "keys": [...]}                 -> {"values": [value or null, ...]}
+    {"op": "set", "items": [[key, json, ttl]]}   -> {"stored": n}
+    {"op": "delete", "keys": [...]}              -> {"deleted": n}
+    {"op": "stats"}                              -> {"hits": ..., "hit_rate": ...}
+    """
+    def handle(self):
+        cache = self.server.cache
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                op = request['op']
+                if op == 'get':
+                    # Stored values are already JSON, so the reply is assembled as text
+                    values = cache.get_many(request['keys'])
+                    response = '{"values": [' + ', '.join('null' if raw is None else raw for raw in values) + ']}'
+                elif op == 'set':
+                    for _, raw, ttl in request['items']:
+                        json.loads(raw)
+                        float(ttl)
+                    response = json.dumps({'stored': cache.set_many(request['items'])})
+                elif op == 'delete':
+                    response = json.dumps({'deleted': cache.delete_many(request['keys'])})
+                elif op == 'stats':
+                    response = json.dumps(cache.get_stats())
+                else:
+                    response = json.dumps({'error': f"unknown op {op!r}"})
+            except (ValueError, KeyError, TypeError) as e:
+                response = json.dumps({'error': str(e)})
+            self.wfile.write(response.encode() + b'\n')
+            self.wfile.flush()
+
+class CacheServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    
+    def __init__(self, path=CACHE_SOCKET, max_mb=CACHE_MAX_MB):
+        self.cache = LRUCache(int(max_mb * 1024 * 1024))
+        remove_stale_socket(path)
+        super().__init__(path, CacheRequestHandler)
+    
+    def server_bind(self):
+        # Only processes of the same user may read or fill the cache; the socket
+        # is created with those permissions instead of being narrowed after bind()
+        previous = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous)
+    
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+def remove_stale_socket(path):
+    """Remove a socket file left by a daemon that died; refuse to start next to a live one"""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"A cache daemon is already listening on {path}")
+
+class CacheClient:
+    """Pooled client for the cache daemon; when the daemon is unreachable every lookup is a miss"""
+    def __init__(self, path=CACHE_SOCKET, timeout=CACHE_TIMEOUT_SECONDS):
+        self.path = path
+        self.timeout = timeout
+        self.pool = queue.LifoQueue()
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0}
+    
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock, sock.makefile('rb')
+    
+    def request(self, message):
+        """Send one request and return the decoded reply, or None when the daemon is unavailable"""
+        if time.time() < self.retry_at:
+            return None
+        payload = json.dumps(message).encode() + b'\n'
+        while True:
+            try:
+                connection, pooled = self.pool.get_nowait(), True
+            except queue.Empty:
+                connection, pooled = None, False
+            try:
+                if connection is None:
+                    connection = self.connect()
+                sock, reader = connection
+                sock.sendall(payload)
+                line = reader.readline()
+                if not line:
+                    raise ConnectionError("cache daemon closed the connection")
+                reply = json.loads(line)
+                break
+            except (OSError, ValueError):
+                if connection is not None:
+                    connection[1].close()
+                    connection[0].close()
+                # A pooled connection may predate a daemon restart; try again on a fresh one
+                if pooled:
+                    continue
+                with self.lock:
+                    self.stats['errors'] += 1
+                    self.retry_at = time.time() + CACHE_RETRY_SECONDS
+                return None
+        if self.pool.qsize() < CACHE_POOL_SIZE:
+            self.pool.put(connection)
+        else:
+            connection[1].close()
+            connection[0].close()
+        return reply
+    
+    def get_many(self, keys):
+        """{key: value} for the keys the daemon holds, fetched in one round trip"""
+        if not keys:
+            return {}
+        reply = self.request({'op': 'get', 'keys': list(keys)})
+        values = reply.get('values') if reply else None
+        found = {} if values is None else {key: value for key, value in zip(keys, values) if value is not None}
+        with self.lock:
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(keys) - len(found)
+        return found
+    
+    def set_many(self, values, ttl):
+        """Store {key: value} for ttl seconds; True if the daemon took them"""
+        if not values:
+            return False
+        items = [[key, json.dumps(value), ttl] for key, value in values.items()]
+        reply = self.request({'op': 'set', 'items': items})
+        return bool(reply and 'stored' in reply)
+    
+    def delete_many(self, keys):
+        reply = self.request({'op': 'delete', 'keys': list(keys)})
+        return reply.get('deleted', 0) if reply else 0
+    
+    def get_stats(self):
+        """This process's lookups, plus the daemon's own counters when it is reachable"""
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['daemon'] = self.request({'op': 'stats'})
+        return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared insights cache for dashboard replicas on this host")
+    parser.add_argument('--socket', default=CACHE_SOCKET)
+    parser.add_argument('--max-mb', type=float, default=CACHE_MAX_MB)
+    parser.add_argument('--stats', action='store_true', help="print a running daemon's stats and exit")
+    args = parser.parse_args()
+    
+    if args.stats:
+        stats = CacheClient(args.socket).request({'op': 'stats'})
+        if stats is None:
+            sys.exit(f"No cache daemon on {args.socket}")
+        print(json.dumps(stats, indent=2))
+        return
+    
+    try:
+        server = CacheServer(args.socket, args.max_mb)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    # Stopped by a service manager: unwind so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Insights cache listening on {args.socket} ({args.max_mb:g} MB)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import numpy as np
+import plotly.graph_objects as go
+
+from dashboard_core import DEFAULT_METRICS
+from hourly import apply_formula
+from trends import table_matrix
+
+# Points sent to the browser per trace; longer series are downsampled
+MAX_CHART_POINTS = 2000
+
+# Traces with more points than this use WebGL
+WEBGL_MIN_POINTS = 1000
+
+# Same blue as the table's calculated cells, then the platform palette
+TRACE_COLORS = ['#0176d3', '#2e844a', '#b8860b', '#7526e3', '#c23934', '#706e6b']
+
+def lttb(x, y, threshold=MAX_CHART_POINTS):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points
+    
+    Keeps the first and last points and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the next bucket's average. Peaks and dips
+    survive, unlike with plain striding or averaging.
+    """
+    count = len(y)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.floor(np.linspace(1, count - 1, threshold - 1)).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = count - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = stop, edges[bucket + 2] if bucket + 2 < len(edges) else count
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        # Twice the triangle area for every candidate in the bucket at once
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+def metric_values(metric_key, raw_columns):
+    """A metric's values from raw metric arrays ({raw key: array}), calculated metrics included"""
+    if DEFAULT_METRICS[metric_key]['type'] == 'raw':
+        return raw_columns[metric_key]
+    return apply_formula(metric_key, raw_columns)
+
+def daily_series(index, metric_key):
+    """(dates, values) of a metric for every loaded day of a prefix-sum index"""
+    dates, values = index.daily_matrix()
+    raw_columns = {key: values[:, i] for i, key in enumerate(index.metrics)}
+    return dates, metric_values(metric_key, raw_columns)
+
+def period_series(table, metric_key):
+    """(column end dates, values) of a metric across a table's columns"""
+    metric_keys, values = table_matrix(table)
+    dates = np.array([column['end_date'] for column in table['columns']], dtype='datetime64[D]')
+    if metric_key in metric_keys:
+        return dates, values[metric_keys.index(metric_key)]
+    return dates, np.zeros(len(dates))
+
+def build_trend_figure(series, metric_key, max_points=MAX_CHART_POINTS):
+    """Plotly line chart of named (dates, values) series, each downsampled to max_points
+    
+    Returns the figure plus (points sent, points in the source series).
+    """
+    metric = DEFAULT_METRICS[metric_key]
+    figure = go.Figure()
+    sent = 0
+    total = 0
+    for i, (name, dates, values) in enumerate(series):
+        order = np.argsort(dates, kind='stable')
+        dates, values = dates[order], np.asarray(values, dtype=np.float64)[order]
+        kept = lttb(dates.astype('datetime64[D]').astype(np.int64), values, max_points)
+        trace = go.Scattergl if len(kept) > WEBGL_MIN_POINTS else go.Scatter
+        figure.add_trace(trace(
+            x=dates[kept],
+            y=values[kept],
+            name=name,
+            mode='lines' if len(kept) > 60 else 'lines+markers',
+            line={'color': TRACE_COLORS[i % len(TRACE_COLORS)], 'width': 2}
+        ))
+        sent += len(kept)
+        total += len(values)
+    
+    tick_formats = {'currency': '$,.2f', 'percentage': '.2f', 'ratio': '.2f', 'number': ',.0f'}
+    figure.update_layout(
+        height=380,
+        margin={'l': 10, 'r': 10, 't': 30, 'b': 10},
+        hovermode='x unified',
+        legend={'orientation': 'h', 'y': 1.1},
+        yaxis={'title': metric['name'], 'tickformat': tick_formats.get(metric['format'], '')},
+        plot_bgcolor='white'
+    )
+    figure.update_xaxes(showgrid=True, gridcolor='#f3f3f3')
+    figure.update_yaxes(showgrid=True, gridcolor='#f3f3f3')
+    return figure, sent, total
@@ -0,0 +1,220 @@
+import abc
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dashboard_core import (
+    DEFAULT_METRICS,
+    GRAPH_POOL_SIZE,
+    PLATFORM_NAMES,
+    FacebookAPI,
+    plan_insights_fields,
+    sum_daily_metrics
+)
+
+RAW_METRICS = [key for key, metric in DEFAULT_METRICS.items() if metric['type'] == 'raw']
+
+# JSON file mapping table keys to connector settings, e.g.
+# {"google": {"type": "file", "path": "google_daily.csv"}, "tiktok": {"type": "static", "daily": {"spend": 50}}}
+CONNECTOR_CONFIG = os.environ.get(
+    'DASHBOARD_CONNECTORS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'connectors.json')
+)
+
+REFRESH_MAX_WORKERS = GRAPH_POOL_SIZE
+
+class PlatformConnector(abc.ABC):
+    """A platform data source that returns the standard raw metric dict for a date range"""
+    name = 'Connector'
+    # data_source of the cells it fills: 'api' values are aged and refreshed, 'import' ones are not
+    source = 'api'
+    
+    @abc.abstractmethod
+    def fetch_range(self, start_date, end_date, metrics=None):
+        """Raw metrics summed over start_date..end_date (inclusive), shaped like get_empty_metrics"""
+    
+    def get_empty_metrics(self, raw_metrics=None):
+        return {key: 0 for key in RAW_METRICS if raw_metrics is None or key in raw_metrics}
+    
+    def requested_raw_metrics(self, metrics=None):
+        """Raw metrics needed for the requested (raw or calculated) metrics"""
+        return plan_insights_fields(metrics)['raw_metrics']
+    
+    def describe(self):
+        return self.name
+
+class FacebookConnector(PlatformConnector):
+    """Facebook Marketing API through FacebookAPI"""
+    name = 'Facebook API'
+    
+    def __init__(self, access_token, account_id, transport=None):
+        self.api = FacebookAPI(access_token, account_id, transport)
+    
+    def fetch_range(self, start_date, end_date, metrics=None):
+        plan = plan_insights_fields(metrics)
+        if not plan['fields']:
+            return {}
+        # Errors propagate so the refresh job can report them per column
+        rows = self.api.get_insight_rows(start_date, end_date, plan)
+        if not rows:
+            return self.get_empty_metrics(plan['raw_metrics'])
+        return self.api.process_facebook_data(rows, plan['raw_metrics'])
+    
+    def describe(self):
+        return f"{self.name} (act_{self.api.account_id})"
+
+class FileConnector(PlatformConnector):
+    """Daily rows from a local CSV or JSON file, reloaded when the file changes
+    
+    CSV needs a 'date' column plus raw metric columns. JSON is either
+    {date: {metric: value}} or a list of objects with a 'date' key.
+    """
+    name = 'File'
+    source = 'import'
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.loaded_mtime = None
+        self.daily_data = {}
+    
+    def load(self):
+        with self.lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self.loaded_mtime:
+                self.daily_data = self.read_daily_rows()
+                self.loaded_mtime = mtime
+            return self.daily_data
+    
+    def read_daily_rows(self):
+        """{date: raw metrics}; several rows for one date (e.g. one per campaign) are summed"""
+        if self.path.endswith('.json'):
+            with open(self.path) as f:
+                data = json.load(f)
+            rows = data if isinstance(data, list) else [dict(row, date=date) for date, row in data.items()]
+        else:
+            with open(self.path, newline='') as f:
+                rows = list(csv.DictReader(f))
+        daily_data = {}
+        for row in rows:
+            metrics = daily_data.setdefault(row['date'], dict.fromkeys(RAW_METRICS, 0.0))
+            for key in RAW_METRICS:
+                metrics[key] += float(row.get(key) or 0)
+        return daily_data
+    
+    def fetch_range(self, start_date, end_date, metrics=None):
+        return sum_daily_metrics(self.load(), start_date, end_date, self.requested_raw_metrics(metrics))
+    
+    def describe(self):
+        return f"{self.name} ({os.path.basename(self.path)})"
+
+class StaticConnector(PlatformConnector):
+    """Stand-in that returns fixed per-day values, optionally after a delay, for testing and demos"""
+    name = 'Stand-in'
+    source = 'import'
+    
+    def __init__(self, daily=None, delay=0):
+        self.daily = daily or {}
+        self.delay = delay
+    
+    def fetch_range(self, start_date, end_date, metrics=None):
+        if self.delay:
+            time.sleep(self.delay)
+        days = (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days + 1
+        metrics = self.get_empty_metrics(self.requested_raw_metrics(metrics))
+        for key in metrics:
+            metrics[key] = float(self.daily.get(key, 0)) * days
+        return metrics
+
+# Connector types available to the config file; register_connector_type adds more
+CONNECTOR_TYPES = {
+    'file': lambda settings: FileConnector(settings['path']),
+    'static': lambda settings: StaticConnector(settings.get('daily'), settings.get('delay', 0))
+}
+
+def register_connector_type(type_name, factory):
+    """Make a connector type usable from the config; factory takes the settings dict
+    
+    The factory returns a PlatformConnector; one without fetch_range fails
+    with TypeError as soon as the config creates it.
+    """
+    CONNECTOR_TYPES[type_name] = factory
+
+def load_configured_connectors(path=CONNECTOR_CONFIG):
+    """Build connectors from the config file (missing file means none); paths are relative to it"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        config = json.load(f)
+    
+    connectors = {}
+    for table_key, settings in config.items():
+        if table_key not in PLATFORM_NAMES:
+            raise ValueError(f"Unknown platform '{table_key}' in {path}")
+        settings = dict(settings)
+        if 'path' in settings:
+            settings['path'] = os.path.join(os.path.dirname(os.path.abspath(path)), settings['path'])
+        connectors[table_key] = CONNECTOR_TYPES[settings['type']](settings)
+    return connectors
+
+class PlatformRefreshJob:
+    """Fetch every column of every connected platform concurrently"""
+    def __init__(self, connectors, tables):
+        self.connectors = connectors
+        # Column and metric lists are copied so the session can keep editing
+        self.work = [
+            (table_key, dict(column), list(tables[table_key]['metrics'].keys()))
+            for table_key in connectors
+            for column in tables[table_key]['columns']
+        ]
+        self.cancel_event = threading.Event()
+        self.results = queue.Queue()
+        self.errors = []
+        self.completed = 0
+        self.applied = 0
+        self.total = len(self.work)
+        self.executor = ThreadPoolExecutor(max_workers=REFRESH_MAX_WORKERS)
+        self.futures = []
+    
+    def start(self):
+        self.futures = [self.executor.submit(self.fetch, *item) for item in self.work]
+        self.executor.shutdown(wait=False)
+        return self
+    
+    def fetch(self, table_key, column, metrics):
+        """Fetch one platform column"""
+        if self.cancel_event.is_set():
+            return
+        try:
+            api_data = self.connectors[table_key].fetch_range(column['start_date'], column['end_date'], metrics)
+        except Exception as e:
+            self.errors.append(f"{PLATFORM_NAMES[table_key]} {column['name']}: {str(e)}")
+            api_data = None
+        
+        if not self.cancel_event.is_set():
+            self.results.put((table_key, column, api_data))
+    
+    def cancel(self):
+        """Stop outstanding fetches; in-flight responses are discarded"""
+        self.cancel_event.set()
+        for future in self.futures:
+            future.cancel()
+    
+    def drain(self):
+        """Return the results that arrived since the last poll"""
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        self.completed += len(finished)
+        return finished
+    
+    def is_done(self):
+        """Whether every worker has finished and all results were drained"""
+        return all(future.done() for future in self.futures) and self.results.empty()
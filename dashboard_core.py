@@ -0,0 +1,1546 @@
+import streamlit as st
+from datetime import datetime, timedelta
+import contextlib
+import functools
+import hashlib
+import html
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sessions import SessionRegistry, estimate_size
+from snapshots import SnapshotHistory, diff_snapshots
+
+logger = logging.getLogger(__name__)
+
+# Shared by streamlit_app.py and new_dashboard.py. pandas and requests are
+# imported inside the functions that need them so a cold worker only pays
+# for them on first export / first API call.
+
+# Default metrics with calculation formulas
+DEFAULT_METRICS = {
+    # Raw metrics (from APIs or manual input)
+    'spend': {'name': 'Spend', 'type': 'raw', 'format': 'currency'},
+    'impressions': {'name': 'Impressions', 'type': 'raw', 'format': 'number'},
+    'clicks': {'name': 'Clicks', 'type': 'raw', 'format': 'number'},
+    'add_to_cart': {'name': 'Add to Cart', 'type': 'raw', 'format': 'number'},
+    'checkout': {'name': 'Checkout', 'type': 'raw', 'format': 'number'},
+    'purchase': {'name': 'Purchases', 'type': 'raw', 'format': 'number'},
+    'purchase_revenue': {'name': 'Purchase Revenue', 'type': 'raw', 'format': 'currency'},
+    
+    # Calculated metrics
+    'ctr': {'name': 'CTR', 'type': 'calculated', 'format': 'percentage'},
+    'cpm': {'name': 'CPM', 'type': 'calculated', 'format': 'currency'},
+    'cpc': {'name': 'CPC', 'type': 'calculated', 'format': 'currency'},
+    'atc_rate': {'name': 'Add to Cart Rate', 'type': 'calculated', 'format': 'percentage'},
+    'checkout_rate': {'name': 'Checkout Rate', 'type': 'calculated', 'format': 'percentage'},
+    'purchase_rate': {'name': 'Purchase Rate', 'type': 'calculated', 'format': 'percentage'},
+    'click_to_purchase': {'name': 'Click to Purchase Rate', 'type': 'calculated', 'format': 'percentage'},
+    'roas': {'name': 'ROAS', 'type': 'calculated', 'format': 'ratio'},
+    'cost_per_purchase': {'name': 'Cost per Purchase', 'type': 'calculated', 'format': 'currency'}
+}
+
+def format_value(value, format_type):
+    """Format value based on type"""
+    if value is None:
+        return 'N/A'
+    if isinstance(value, float) and math.isnan(value):
+        return 'N/A'
+    
+    try:
+        value = float(value)
+        if format_type == 'currency':
+            return f"${value:,.2f}"
+        elif format_type == 'percentage':
+            return f"{value:.2f}%"
+        elif format_type == 'ratio':
+            return f"{value:.2f}x"
+        elif format_type == 'number':
+            return f"{int(value):,}"
+        else:
+            return str(value)
+    except:
+        return 'N/A'
+
+def calculate_metric(metric_key, raw_data):
+    """Calculate metric based on raw data"""
+    try:
+        spend = float(raw_data.get('spend', 0))
+        impressions = float(raw_data.get('impressions', 0))
+        clicks = float(raw_data.get('clicks', 0))
+        add_to_cart = float(raw_data.get('add_to_cart', 0))
+        checkout = float(raw_data.get('checkout', 0))
+        purchase = float(raw_data.get('purchase', 0))
+        purchase_revenue = float(raw_data.get('purchase_revenue', 0))
+        
+        if metric_key == 'ctr':
+            return (clicks / impressions * 100) if impressions > 0 else 0
+        elif metric_key == 'cpm':
+            return (spend / impressions * 1000) if impressions > 0 else 0
+        elif metric_key == 'cpc':
+            return (spend / clicks) if clicks > 0 else 0
+        elif metric_key == 'atc_rate':
+            return (add_to_cart / clicks * 100) if clicks > 0 else 0
+        elif metric_key == 'checkout_rate':
+            return (checkout / add_to_cart * 100) if add_to_cart > 0 else 0
+        elif metric_key == 'purchase_rate':
+            return (purchase / checkout * 100) if checkout > 0 else 0
+        elif metric_key == 'click_to_purchase':
+            return (purchase / clicks * 100) if clicks > 0 else 0
+        elif metric_key == 'roas':
+            return (purchase_revenue / spend) if spend > 0 else 0
+        elif metric_key == 'cost_per_purchase':
+            return (spend / purchase) if purchase > 0 else 0
+        else:
+            return float(raw_data.get(metric_key, 0))
+    except:
+        return 0
+
+# Calculated metrics as numerator / denominator * scale (0 when the denominator is 0)
+METRIC_FORMULAS = {
+    'ctr': ('clicks', 'impressions', 100),
+    'cpm': ('spend', 'impressions', 1000),
+    'cpc': ('spend', 'clicks', 1),
+    'atc_rate': ('add_to_cart', 'clicks', 100),
+    'checkout_rate': ('checkout', 'add_to_cart', 100),
+    'purchase_rate': ('purchase', 'checkout', 100),
+    'click_to_purchase': ('purchase', 'clicks', 100),
+    'roas': ('purchase_revenue', 'spend', 1),
+    'cost_per_purchase': ('spend', 'purchase', 1)
+}
+
+# Raw metrics that calculated metrics are derived from
+METRIC_DEPENDENCIES = {
+    metric_key: [numerator, denominator]
+    for metric_key, (numerator, denominator, scale) in METRIC_FORMULAS.items()
+}
+
+# Where each raw metric lives in a Graph insights row: (field, action types)
+FACEBOOK_FIELD_MAP = {
+    'spend': ('spend', None),
+    'impressions': ('impressions', None),
+    'clicks': ('clicks', None),
+    'add_to_cart': ('actions', ['add_to_cart']),
+    'checkout': ('actions', ['initiate_checkout']),
+    'purchase': ('actions', ['purchase', 'complete_registration']),
+    'purchase_revenue': ('action_values', ['purchase', 'complete_registration'])
+}
+
+def plan_insights_fields(metric_keys=None):
+    """Work out the minimal Graph fields and action types for the given metrics"""
+    if metric_keys is None:
+        metric_keys = FACEBOOK_FIELD_MAP.keys()
+    
+    # Expand calculated metrics into the raw metrics they need
+    raw_metrics = []
+    for metric_key in metric_keys:
+        for dependency in METRIC_DEPENDENCIES.get(metric_key, [metric_key]):
+            if dependency in FACEBOOK_FIELD_MAP and dependency not in raw_metrics:
+                raw_metrics.append(dependency)
+    
+    fields = []
+    action_types = []
+    for metric_key in raw_metrics:
+        field, metric_action_types = FACEBOOK_FIELD_MAP[metric_key]
+        if field not in fields:
+            fields.append(field)
+        for action_type in metric_action_types or []:
+            if action_type not in action_types:
+                action_types.append(action_type)
+    
+    return {
+        'raw_metrics': raw_metrics,
+        'fields': fields,
+        'action_types': action_types
+    }
+
+# Shared-range rollups only pay off while the daily rows stay small
+ROLLUP_MAX_DAYS = 31
+
+def plan_fetch_granularity(columns, needs_daily=False):
+    """Decide whether columns are fetched as totals or rolled up from daily rows"""
+    if not columns:
+        return {'granularity': 'total', 'since': None, 'until': None}
+    
+    since = min(column['start_date'] for column in columns)
+    until = max(column['end_date'] for column in columns)
+    
+    # Overlapping columns can share one daily fetch instead of one request each
+    ranges = sorted((column['start_date'], column['end_date']) for column in columns)
+    overlapping = any(ranges[i + 1][0] <= ranges[i][1] for i in range(len(ranges) - 1))
+    span_days = (datetime.strptime(until, '%Y-%m-%d') - datetime.strptime(since, '%Y-%m-%d')).days + 1
+    
+    if needs_daily or (overlapping and span_days <= ROLLUP_MAX_DAYS):
+        granularity = 'daily'
+    else:
+        granularity = 'total'
+    
+    return {'granularity': granularity, 'since': since, 'until': until}
+
+def sum_daily_metrics(daily_data, start_date, end_date, raw_metrics):
+    """Roll daily raw metrics up into totals for a date range"""
+    totals = {metric: 0 for metric in raw_metrics}
+    for day, day_metrics in daily_data.items():
+        if start_date <= day <= end_date:
+            for metric in totals:
+                totals[metric] += day_metrics.get(metric, 0)
+    return totals
+
+# Graph API connect/read timeouts in seconds
+GRAPH_CONNECT_TIMEOUT = 5
+GRAPH_READ_TIMEOUT = 60
+GRAPH_POOL_SIZE = 10
+
+# Rows per page for daily/hourly insights and the hour-of-day breakdown
+INSIGHTS_PAGE_LIMIT = 500
+HOURLY_BREAKDOWN = 'hourly_stats_aggregated_by_advertiser_time_zone'
+
+class GraphTransport:
+    """Pooled keep-alive HTTP session for Graph API traffic"""
+    def __init__(self, connect_timeout=GRAPH_CONNECT_TIMEOUT, read_timeout=GRAPH_READ_TIMEOUT, pool_size=GRAPH_POOL_SIZE):
+        self.session = None
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'total_seconds': 0.0,
+            'last_seconds': 0.0,
+            'wire_bytes': 0,
+            'body_bytes': 0
+        }
+    
+    def get_session(self):
+        """Create the pooled session on first use"""
+        with self.lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+                self.session = session
+        return self.session
+    
+    def get(self, url, params=None):
+        """Send a GET request through the pooled session and record its cost"""
+        import requests
+        
+        started = time.perf_counter()
+        try:
+            response = self.get_session().get(url, params=params, timeout=self.timeout)
+            body_bytes = len(response.content)
+        except requests.exceptions.RequestException:
+            with self.lock:
+                self.stats['errors'] += 1
+            raise
+        elapsed = time.perf_counter() - started
+        
+        # Content-Length is the compressed size when the response was gzipped
+        wire_bytes = int(response.headers.get('Content-Length', body_bytes))
+        
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['total_seconds'] += elapsed
+            self.stats['last_seconds'] = elapsed
+            self.stats['wire_bytes'] += wire_bytes
+            self.stats['body_bytes'] += body_bytes
+        
+        return response
+    
+    def get_stats(self):
+        """Return a snapshot of the request counters"""
+        with self.lock:
+            stats = dict(self.stats)
+        stats['avg_seconds'] = stats['total_seconds'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+@st.cache_resource
+def get_graph_transport():
+    """Share one Graph transport across reruns and sessions"""
+    return GraphTransport()
+
+# Conversions keep landing on a day for Facebook's 7-day click window, so a
+# range only settles once its last day is this many days old...
+INSIGHTS_SETTLE_DAYS = 7
+
+# ...and until then its values are refetched once they are this old
+INSIGHTS_RECENT_TTL = 15 * 60
+
+# Settled ranges never go stale on screen; the shared cache keeps them this long
+INSIGHTS_SETTLED_CACHE_TTL = 7 * 24 * 60 * 60
+
+@st.cache_resource
+def get_insights_cache():
+    """Client for the host-wide insights cache daemon (cache_daemon.py), shared per process"""
+    from cache_daemon import CacheClient
+    
+    return CacheClient()
+
+# A token's access to an ad account is checked with Graph again after this long...
+ACCESS_CHECK_TTL = 10 * 60
+
+# ...or after this long when Graph refused it
+ACCESS_DENIED_TTL = 60
+
+# Access checks run on their own threads so page renders never wait on Graph
+ACCESS_CHECK_WORKERS = 4
+
+# FacebookAPI clients a session keeps, one per token and account pair
+FACEBOOK_API_SESSION_LIMIT = 4
+
+class AccountAccess:
+    """Which tokens Graph lets read which ad accounts, remembered for every session of the process
+    
+    Shared insights hold rows fetched with other sessions' tokens, so they are
+    only served for an account once the session's own token was checked
+    against it. Tokens are kept as hashes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=ACCESS_CHECK_WORKERS, thread_name_prefix='access-check')
+    
+    def allowed(self, api, wait=True):
+        """Whether api's token may read api's account, asking Graph when no recent answer is kept
+        
+        With wait=False the question goes to a background check and the answer
+        is False until it lands, so the script thread never blocks on Graph.
+        Concurrent callers share one check per token and account.
+        """
+        if not api.access_token or not api.account_id:
+            return False
+        key = (hashlib.sha256(api.access_token.encode()).hexdigest(), str(api.account_id))
+        with self.lock:
+            entry = self.checked.get(key)
+            if entry is not None and time.time() < entry[1]:
+                return entry[0]
+            future = self.pending.get(key)
+            if future is None:
+                future = self.executor.submit(self.check, key, api)
+                self.pending[key] = future
+        return future.result() if wait else False
+    
+    def check(self, key, api):
+        allowed = api.check_access()
+        now = time.time()
+        with self.lock:
+            # Drop answers that ran out so rotated tokens do not pile up
+            self.checked = {k: v for k, v in self.checked.items() if now < v[1]}
+            self.checked[key] = (allowed, now + (ACCESS_CHECK_TTL if allowed else ACCESS_DENIED_TTL))
+            del self.pending[key]
+        return allowed
+
+@st.cache_resource
+def get_account_access():
+    """Share the token/account access checks across sessions"""
+    return AccountAccess()
+
+def insights_cache_key(account_id, start_date, end_date, plan, granularity='total'):
+    """Cache key of one insights request: account, range, granularity and requested fields"""
+    fields = ','.join(sorted(plan['fields']))
+    action_types = ','.join(sorted(plan['action_types']))
+    return f"insights:{account_id}:{granularity}:{start_date}:{end_date}:{fields}:{action_types}"
+
+def range_settles_at(end_date):
+    """Epoch seconds from which insights of a range ending on end_date no longer change"""
+    return (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=INSIGHTS_SETTLE_DAYS + 1)).timestamp()
+
+def insights_refresh_due(end_date, fetched_at, now=None):
+    """Whether values of a range fetched at fetched_at (None when unknown) should be fetched again"""
+    if fetched_at is None:
+        return True
+    if fetched_at >= range_settles_at(end_date):
+        return False
+    return (now or time.time()) - fetched_at >= INSIGHTS_RECENT_TTL
+
+def insights_cache_ttl(end_date, now=None):
+    """Seconds the rows of a range ending on end_date stay in the shared cache"""
+    if (now or time.time()) >= range_settles_at(end_date):
+        return INSIGHTS_SETTLED_CACHE_TTL
+    return INSIGHTS_RECENT_TTL
+
+def format_age(fetched_at, now=None):
+    """Short age of a value fetched at epoch seconds fetched_at"""
+    seconds = max(0, (now or time.time()) - fetched_at)
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min ago"
+    if seconds < 86400:
+        return f"{seconds / 3600:.0f} h ago"
+    return f"{seconds / 86400:.0f} d ago"
+
+class FacebookAPI:
+    def __init__(self, access_token, account_id, transport=None, cache=None, access=None):
+        self.access_token = access_token
+        self.account_id = account_id
+        self.base_url = "https://graph.facebook.com/v18.0"
+        self.transport = transport or get_graph_transport()
+        self.cache = cache or get_insights_cache()
+        self.access = access or get_account_access()
+    
+    def check_access(self):
+        """Whether Graph lets the token read the ad account, asking for a single field"""
+        import requests
+        
+        try:
+            response = self.transport.get(
+                f"{self.base_url}/act_{self.account_id}", params={'access_token': self.access_token, 'fields': 'id'}
+            )
+        except requests.exceptions.RequestException:
+            return False
+        return response.ok
+    
+    def has_access(self, wait=True):
+        """Whether the token was checked against the account recently enough to serve shared rows
+        
+        Script-thread callers pass wait=False; see AccountAccess.allowed.
+        """
+        return self.access.allowed(self, wait)
+    
+    def get_cached_rows(self, ranges, plan, granularity='total'):
+        """{(start_date, end_date): {'rows', 'fetched_at'}} for ranges the shared cache holds fresh, in one round trip
+        
+        Entries the refresh policy already considers due are left out, so a
+        refresh never gets back the values it is replacing. Nothing is served
+        before the token was checked against the account.
+        """
+        if not self.has_access():
+            return {}
+        keys = {insights_cache_key(self.account_id, start, end, plan, granularity): (start, end) for start, end in ranges}
+        return {
+            keys[key]: entry for key, entry in self.cache.get_many(list(keys)).items()
+            if not insights_refresh_due(keys[key][1], entry['fetched_at'])
+        }
+    
+    def get_insight_rows(self, start_date, end_date, plan, granularity='total', use_cache=True):
+        """Request insights rows for a date range ('total', 'daily' or 'hourly'), following paging
+        
+        Rows come from the shared cache when another session or replica fetched
+        the same range recently; use_cache=False skips the lookup for callers that
+        already batched it through get_cached_rows. Fetched rows are always cached.
+        """
+        key = insights_cache_key(self.account_id, start_date, end_date, plan, granularity)
+        if use_cache:
+            cached = self.get_cached_rows([(start_date, end_date)], plan, granularity)
+            if cached:
+                return cached[(start_date, end_date)]['rows']
+        
+        params = {
+            'access_token': self.access_token,
+            'fields': ','.join(plan['fields']),
+            'time_range': json.dumps({
+                'since': start_date,
+                'until': end_date
+            }),
+            'level': 'account',
+            # 'all_days' returns a single aggregated row for the whole range
+            'time_increment': 'all_days' if granularity == 'total' else 1
+        }
+        
+        # Daily and hourly rows come back in pages; fewer, larger pages save round trips
+        if granularity != 'total':
+            params['limit'] = INSIGHTS_PAGE_LIMIT
+        if granularity == 'hourly':
+            params['breakdowns'] = HOURLY_BREAKDOWN
+        
+        # Restrict actions/action_values to the action types we aggregate
+        if plan['action_types']:
+            params['action_breakdowns'] = 'action_type'
+            params['filtering'] = json.dumps([{
+                'field': 'action_type',
+                'operator': 'IN',
+                'value': plan['action_types']
+            }])
+        
+        url = f"{self.base_url}/act_{self.account_id}/insights"
+        rows = []
+        
+        while url:
+            response = self.transport.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            rows.extend(data.get('data', []))
+            
+            # The next page URL already carries every query parameter
+            url = data.get('paging', {}).get('next')
+            params = None
+        
+        self.cache.set_many({key: {'rows': rows, 'fetched_at': time.time()}}, insights_cache_ttl(end_date))
+        return rows
+    
+    def get_insights(self, start_date, end_date, metrics=None):
+        """Fetch Facebook Ads insights for specific date range"""
+        
+        import requests
+        
+        # Only request the fields the shown metrics depend on
+        plan = plan_insights_fields(metrics)
+        if not plan['fields']:
+            return {}
+        
+        try:
+            rows = self.get_insight_rows(start_date, end_date, plan)
+            
+            if len(rows) > 0:
+                return self.process_facebook_data(rows, plan['raw_metrics'])
+            else:
+                return self.get_empty_metrics(plan['raw_metrics'])
+        
+        except requests.exceptions.RequestException as e:
+            st.error(f"Facebook API Error: {str(e)}")
+            return self.get_empty_metrics(plan['raw_metrics'])
+        except Exception as e:
+            st.error(f"Error processing Facebook data: {str(e)}")
+            return self.get_empty_metrics(plan['raw_metrics'])
+    
+    def process_facebook_data(self, raw_data, raw_metrics=None):
+        """Process Facebook API response into standardized format"""
+        metrics = self.get_empty_metrics(raw_metrics)
+        
+        # Map each action type to the metrics it feeds
+        action_targets = {'actions': {}, 'action_values': {}}
+        for metric_key in metrics:
+            field, action_types = FACEBOOK_FIELD_MAP[metric_key]
+            for action_type in action_types or []:
+                action_targets[field].setdefault(action_type, []).append(metric_key)
+        
+        # Aggregate data across all days in the period
+        for day_data in raw_data:
+            if 'spend' in metrics:
+                metrics['spend'] += float(day_data.get('spend', 0))
+            if 'impressions' in metrics:
+                metrics['impressions'] += int(day_data.get('impressions', 0))
+            if 'clicks' in metrics:
+                metrics['clicks'] += int(day_data.get('clicks', 0))
+            
+            # Process conversion actions
+            for action in day_data.get('actions', []):
+                for metric_key in action_targets['actions'].get(action.get('action_type'), []):
+                    metrics[metric_key] += int(action.get('value', 0))
+            
+            # Process revenue values
+            for action_value in day_data.get('action_values', []):
+                for metric_key in action_targets['action_values'].get(action_value.get('action_type'), []):
+                    metrics[metric_key] += float(action_value.get('value', 0))
+        
+        return metrics
+    
+    def process_daily_facebook_data(self, raw_data, raw_metrics=None):
+        """Process daily Facebook API rows into standardized metrics keyed by date"""
+        daily_data = {}
+        for day_data in raw_data:
+            daily_data[day_data.get('date_start')] = self.process_facebook_data([day_data], raw_metrics)
+        return daily_data
+    
+    def get_empty_metrics(self, raw_metrics=None):
+        """Return empty metrics structure"""
+        metrics = {
+            'spend': 0,
+            'impressions': 0,
+            'clicks': 0,
+            'add_to_cart': 0,
+            'checkout': 0,
+            'purchase': 0,
+            'purchase_revenue': 0
+        }
+        if raw_metrics is not None:
+            metrics = {k: v for k, v in metrics.items() if k in raw_metrics}
+        return metrics
+
+def get_facebook_api(access_token, account_id):
+    """The session's FacebookAPI for a token and account, built once per pair instead of per call"""
+    apis = st.session_state.setdefault('facebook_apis', {})
+    key = (access_token, str(account_id))
+    if key not in apis:
+        # Only the latest pairs are kept; a token change leaves the old client behind
+        while len(apis) >= FACEBOOK_API_SESSION_LIMIT:
+            del apis[next(iter(apis))]
+        apis[key] = FacebookAPI(access_token, account_id)
+    return apis[key]
+
+def fetch_facebook_data(start_date, end_date, metrics=None):
+    """Fetch data from Facebook API"""
+    creds = st.session_state.facebook_credentials
+    
+    if not creds['token'] or not creds['account_id']:
+        return None
+    
+    try:
+        fb_api = get_facebook_api(creds['token'], creds['account_id'])
+        return fb_api.get_insights(start_date, end_date, metrics)
+    except Exception as e:
+        st.error(f"Error fetching Facebook data: {str(e)}")
+        return None
+
+@st.cache_resource
+def get_insights_store():
+    """Share one memory-mapped Arrow store of daily insights per process"""
+    from arrow_store import InsightsStore
+    
+    return InsightsStore()
+
+@st.cache_resource
+def get_range_indexes():
+    """Share the per-account prefix-sum indexes over the Arrow store per process"""
+    from range_index import RangeIndexRegistry
+    
+    return RangeIndexRegistry(get_insights_store())
+
+def get_range_index(credentials):
+    """Prefix-sum index of the stored days of the credentials' account, or None when nothing is stored
+    
+    The store holds days other sessions fetched, so it is also None until the
+    token was checked against the account. The check runs in the background;
+    fetch jobs cover the columns in the meantime.
+    """
+    if not credentials['token'] or not credentials['account_id']:
+        return None
+    index = get_range_indexes().get(credentials['account_id'])
+    if not index.days or not get_facebook_api(credentials['token'], credentials['account_id']).has_access(wait=False):
+        return None
+    return index
+
+# Seconds between background fetch progress polls
+FETCH_POLL_SECONDS = 1
+FETCH_MAX_WORKERS = 4
+
+class FacebookFetchJob:
+    """Fetch every Facebook column on worker threads while the session polls for results
+    
+    Results are (column, raw metrics, fetched_at) with the time the values left
+    the Graph API. A background job is a refresh of stale columns: it leaves
+    cells the user typed a value into alone. A cancelled column comes back
+    without metrics.
+    """
+    def __init__(self, access_token, account_id, columns, metrics, needs_daily=False, background=False):
+        self.api = get_facebook_api(access_token, account_id)
+        self.background = background
+        self.columns = [dict(column) for column in columns]
+        self.plan = plan_insights_fields(metrics)
+        self.fetch_plan = plan_fetch_granularity(self.columns, needs_daily)
+        self.cancel_event = threading.Event()
+        self.skipped = set()
+        self.results = queue.Queue()
+        self.errors = []
+        self.daily_data = None
+        # Daily rows are written through to the shared Arrow store
+        self.store = get_insights_store() if self.fetch_plan['granularity'] == 'daily' else None
+        self.indexes = get_range_indexes() if self.store is not None else None
+        self.completed = 0
+        self.applied = 0
+        self.total = len(self.columns)
+        self.executor = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS)
+        self.futures = []
+        self.cache_lock = threading.Lock()
+        self.cached = None
+    
+    def start(self):
+        """Submit the column fetches; the first worker looks every request up in the shared cache"""
+        if self.fetch_plan['granularity'] == 'daily':
+            self.futures = [self.executor.submit(self.fetch_daily)]
+        else:
+            self.futures = [self.executor.submit(self.fetch_column, column) for column in self.columns]
+        self.executor.shutdown(wait=False)
+        return self
+    
+    def lookup_cached(self):
+        """Shared cache entries for every request, fetched in one batch by whichever worker asks first
+        
+        The lookup checks the token against the account with Graph, so it runs
+        here instead of on the script thread that started the job.
+        """
+        with self.cache_lock:
+            if self.cached is None:
+                if self.fetch_plan['granularity'] == 'daily':
+                    ranges = [(self.fetch_plan['since'], self.fetch_plan['until'])]
+                else:
+                    ranges = [(column['start_date'], column['end_date']) for column in self.columns]
+                self.cached = self.api.get_cached_rows(ranges, self.plan, self.fetch_plan['granularity'])
+            return self.cached
+    
+    def fetch_column(self, column):
+        """Fetch aggregate totals for one column"""
+        if self.cancel_event.is_set():
+            return
+        if column['name'] in self.skipped:
+            self.results.put((column, None, None))
+            return
+        try:
+            cached = self.lookup_cached().get((column['start_date'], column['end_date']))
+            if cached is None:
+                fetched_at = time.time()
+                rows = self.api.get_insight_rows(column['start_date'], column['end_date'], self.plan, use_cache=False)
+            else:
+                rows, fetched_at = cached['rows'], cached['fetched_at']
+            if rows:
+                api_data = self.api.process_facebook_data(rows, self.plan['raw_metrics'])
+            else:
+                api_data = self.api.get_empty_metrics(self.plan['raw_metrics'])
+        except Exception as e:
+            self.errors.append(f"{column['name']}: {str(e)}")
+            api_data = fetched_at = None
+        
+        if not self.cancel_event.is_set():
+            if column['name'] in self.skipped:
+                api_data = None
+            self.results.put((column, api_data, fetched_at))
+    
+    def fetch_daily(self):
+        """Fetch daily rows once and roll them up into every column"""
+        try:
+            since, until = self.fetch_plan['since'], self.fetch_plan['until']
+            cached = self.lookup_cached().get((since, until))
+            if cached is None:
+                fetched_at = time.time()
+                rows = self.api.get_insight_rows(since, until, self.plan, granularity='daily', use_cache=False)
+            else:
+                rows, fetched_at = cached['rows'], cached['fetched_at']
+            self.daily_data = self.api.process_daily_facebook_data(rows, self.plan['raw_metrics'])
+        except Exception as e:
+            self.errors.append(str(e))
+            for column in self.columns:
+                self.results.put((column, None, None))
+            return
+        
+        # Partial metric sets would overwrite stored days with zeros
+        if len(self.plan['raw_metrics']) == len(FACEBOOK_FIELD_MAP):
+            try:
+                version = self.store.append_days(self.api.account_id, self.daily_data, since, until, fetched_at)
+                self.indexes.add_days(self.api.account_id, self.daily_data, since, until, version, fetched_at)
+            except OSError as e:
+                self.errors.append(f"daily store: {str(e)}")
+        
+        for column in self.columns:
+            if self.cancel_event.is_set():
+                return
+            if column['name'] in self.skipped:
+                self.results.put((column, None, None))
+                continue
+            api_data = sum_daily_metrics(
+                self.daily_data, column['start_date'], column['end_date'], self.plan['raw_metrics']
+            )
+            self.results.put((column, api_data, fetched_at))
+    
+    def cancel(self):
+        """Stop outstanding requests; in-flight responses are discarded"""
+        self.cancel_event.set()
+        for future in self.futures:
+            future.cancel()
+    
+    def cancel_column(self, name):
+        """Drop one column's result, skipping its request if it has not started"""
+        self.skipped.add(name)
+    
+    def drain(self):
+        """Return the column results that arrived since the last poll"""
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        self.completed += len(finished)
+        return finished
+    
+    def is_done(self):
+        """Whether every worker has finished and all results were drained"""
+        return all(future.done() for future in self.futures) and self.results.empty()
+
+def apply_fetched_column(table_key, column, api_data, source='api', fetched_at=None, keep_manual=False):
+    """Write one fetched column into a platform table; False if it was removed or re-dated mid-fetch
+    
+    API cells are stamped with fetched_at (None when their age is unknown).
+    keep_manual leaves cells someone typed a non-zero value into as they are.
+    """
+    table = st.session_state.tables[table_key]
+    current = next((c for c in table['columns'] if c['name'] == column['name']), None)
+    if current is None or (current['start_date'], current['end_date']) != (column['start_date'], column['end_date']):
+        return False
+    
+    fetched = table.setdefault('fetched_at', {})
+    for metric in api_data:
+        if metric in table['data']:
+            if keep_manual and table['data_source'][metric][column['name']] != 'api' and table['data'][metric][column['name']]:
+                continue
+            table['data'][metric][column['name']] = api_data[metric]
+            table['data_source'][metric][column['name']] = source
+            if source == 'api' and fetched_at is not None:
+                fetched.setdefault(metric, {})[column['name']] = fetched_at
+            else:
+                fetched.get(metric, {}).pop(column['name'], None)
+            # Drop the widget state so the editor picks up the fetched value
+            st.session_state.pop(f"input_{metric}_{column['name']}_{table_key}", None)
+    return True
+
+def apply_facebook_fetch_results(job):
+    """Copy finished column results from a fetch job into the Facebook table; returns their names"""
+    applied = []
+    
+    for column, api_data, fetched_at in job.drain():
+        if api_data and apply_fetched_column('facebook', column, api_data, fetched_at=fetched_at, keep_manual=job.background):
+            applied.append(column['name'])
+    
+    job.applied += len(applied)
+    if applied:
+        record_table_version('facebook')
+    return applied
+
+def apply_indexed_totals(table_key, credentials, columns=None, fresh_only=False):
+    """Fill columns whose whole range is in the account's stored days, with no API call
+    
+    Each column costs two prefix-sum lookups however long its range is.
+    fresh_only skips ranges whose stored days are due for a refresh, and
+    leaves typed-in values alone. Returns the names of the columns filled.
+    """
+    index = get_range_index(credentials)
+    if index is None:
+        return []
+    
+    table = st.session_state.tables[table_key]
+    filled = []
+    for column in columns if columns is not None else table['columns']:
+        totals = index.range_totals(column['start_date'], column['end_date'])
+        if totals is None:
+            continue
+        fetched_at = index.range_fetched_at(column['start_date'], column['end_date'])
+        if fresh_only and insights_refresh_due(column['end_date'], fetched_at):
+            continue
+        if apply_fetched_column(table_key, column, totals, fetched_at=fetched_at, keep_manual=fresh_only):
+            filled.append(column['name'])
+    
+    if filled:
+        record_table_version(table_key)
+    return filled
+
+def apply_hourly_totals(hourly_store):
+    """Fill Facebook columns covered by a stored hourly range without calling the API"""
+    facebook_table = st.session_state.tables['facebook']
+    applied = 0
+    
+    for column in facebook_table['columns']:
+        totals = hourly_store.range_totals(column['start_date'], column['end_date'])
+        if totals is None:
+            continue
+        
+        apply_fetched_column('facebook', column, totals, fetched_at=hourly_store.fetched_at)
+        applied += 1
+    
+    if applied:
+        record_table_version('facebook')
+    return applied
+
+def apply_imported_daily(table_key, imported):
+    """Fill every column whose date range the imported days cover; returns (filled, skipped) column names"""
+    daily_data = imported['daily']
+    table = st.session_state.tables[table_key]
+    filled = []
+    skipped = []
+    
+    # Exports leave out days without delivery, so gaps inside the range count as zero
+    first_date = min(daily_data, default=None)
+    last_date = max(daily_data, default=None)
+    for column in table['columns']:
+        if first_date is None or column['start_date'] < first_date or column['end_date'] > last_date:
+            skipped.append(column['name'])
+            continue
+        totals = sum_daily_metrics(daily_data, column['start_date'], column['end_date'], imported['metrics'])
+        apply_fetched_column(table_key, column, totals, source='import')
+        filled.append(column['name'])
+    
+    if filled:
+        record_table_version(table_key)
+    return filled, skipped
+
+def create_initial_table(platform):
+    """Create initial table structure"""
+    today = datetime.now()
+    weeks = []
+    
+    # Generate last 4 weeks
+    for i in range(3, -1, -1):
+        week_end = today - timedelta(days=i*7)
+        week_start = week_end - timedelta(days=6)
+        
+        weeks.append({
+            'name': f'Week {4-i}',
+            'start_date': week_start.strftime('%Y-%m-%d'),
+            'end_date': week_end.strftime('%Y-%m-%d'),
+            'display_name': f"{week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}"
+        })
+    
+    # Initialize data structure
+    data = {}
+    data_source = {}  # Track whether data came from API or manual input
+    
+    for metric_key in DEFAULT_METRICS.keys():
+        data[metric_key] = {}
+        data_source[metric_key] = {}
+        for week in weeks:
+            data[metric_key][week['name']] = 0.0
+            data_source[metric_key][week['name']] = 'manual'  # default to manual
+    
+    return {
+        'platform': platform,
+        'columns': weeks,
+        'metrics': DEFAULT_METRICS.copy(),
+        'data': data,
+        'data_source': data_source,
+        'fetched_at': {},  # When API cells left the Graph API, {metric: {column: epoch seconds}}
+        'summary': f"{platform} performance summary will appear here. This section can be customized with insights, recommendations, and key takeaways."
+    }
+
+PLATFORMS = ['Facebook', 'Google', 'LinkedIn', 'TikTok', 'Microsoft', 'Summary']
+PLATFORM_NAMES = {platform.lower(): platform for platform in PLATFORMS}
+
+class PlatformTables(dict):
+    """Platform tables, each created on first visit instead of all six upfront"""
+    def __missing__(self, table_key):
+        # An evicted session gets its spilled tables back before anything is recreated
+        if touch_session() and table_key in self:
+            return self[table_key]
+        table = create_initial_table(PLATFORM_NAMES[table_key])
+        self[table_key] = table
+        return table
+
+@st.cache_resource
+def get_session_registry():
+    """Share one session memory registry across sessions"""
+    return SessionRegistry()
+
+def touch_session():
+    """Register this session's tables and histories, reloading them if they were spilled"""
+    if 'session_key' not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex
+    stores = {'tables': st.session_state.tables, 'table_history': st.session_state.table_history}
+    return get_session_registry().touch(st.session_state.session_key, stores)
+
+@contextlib.contextmanager
+def session_activity():
+    """Count a fragment run as activity and keep the session from being spilled until it ends"""
+    touch_session()
+    registry = get_session_registry()
+    session_key = st.session_state.session_key
+    registry.hold(session_key)
+    try:
+        yield
+    finally:
+        registry.release(session_key)
+
+def session_fragment(func=None, *, run_every=None):
+    """st.fragment whose runs keep the session live, like full runs do via initialize_tables
+    
+    Fragment reruns never reach initialize_tables, so without this a session
+    used only through fragments looks idle and can be spilled mid-edit.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            with session_activity():
+                return func(*args, **kwargs)
+        return st.fragment(run, run_every=run_every)
+    return decorate(func) if func is not None else decorate
+
+def initialize_tables():
+    """Set up lazily created platform tables and account for this session's memory"""
+    if not isinstance(st.session_state.tables, PlatformTables):
+        st.session_state.tables = PlatformTables(st.session_state.tables)
+    if 'table_history' not in st.session_state:
+        st.session_state.table_history = {}
+    
+    touch_session()
+    get_session_registry().enforce(current_key=st.session_state.session_key)
+    
+    # A new session picks up the workspace in its link before anything renders
+    if 'workspace_name' not in st.session_state:
+        st.session_state.workspace_name = None
+        st.session_state.workspace_conflicts = []
+        name = st.query_params.get(WORKSPACE_QUERY_PARAM)
+        if name and not open_session_workspace(name):
+            del st.query_params[WORKSPACE_QUERY_PARAM]
+    elif st.session_state.workspace_name is not None:
+        sync_session_workspace()
+
+# ?workspace=<name> opens a named workspace shared by every session using it;
+# sessions without one keep private tables that are not saved
+WORKSPACE_QUERY_PARAM = 'workspace'
+
+# SQLite database shared by every session and server process; unset keeps journal files per process
+WORKSPACE_DB = os.environ.get('DASHBOARD_WORKSPACE_DB')
+
+@st.cache_resource
+def get_workspaces():
+    """Share open workspaces across sessions: the SQLite store when configured, else journal files"""
+    if WORKSPACE_DB:
+        from shared_workspace import SharedWorkspaceStore
+        
+        return SharedWorkspaceStore(WORKSPACE_DB)
+    
+    from workspace import WorkspaceRegistry
+    
+    return WorkspaceRegistry()
+
+def open_session_workspace(name):
+    """Replace this session's tables with a workspace's saved tables; False for an invalid name"""
+    from workspace import copy_tables
+    
+    try:
+        workspace = get_workspaces().get(name)
+    except ValueError:
+        return False
+    
+    tables, versions = workspace.checkout()
+    baseline = copy_tables(tables)
+    # A new workspace opened from a private session starts with its tables; the next save writes them
+    if not tables and st.session_state.get('workspace_name') is None:
+        tables = copy_tables(st.session_state.tables)
+    for table_key in list(st.session_state.tables.keys()):
+        clear_table_widget_state(table_key)
+    # Refilled in place: the session registry holds references to these dicts
+    st.session_state.tables.clear()
+    st.session_state.tables.update(tables)
+    st.session_state.table_history.clear()
+    st.session_state.workspace_baseline = baseline
+    st.session_state.workspace_versions = versions
+    st.session_state.workspace_conflicts = []
+    st.session_state.workspace_name = workspace.name
+    st.query_params[WORKSPACE_QUERY_PARAM] = workspace.name
+    return True
+
+def apply_workspace_entries(entries):
+    """Bring this session's tables up to what other sessions saved; True if anything changed
+    
+    Editors showing a replaced value are dropped so they re-read the table.
+    """
+    from workspace import apply_entry, copy_tables
+    
+    tables = st.session_state.tables
+    changed = False
+    for entry in entries:
+        table_key = entry['table']
+        table = tables.get(table_key)
+        if entry['op'] == 'cells' and table is not None:
+            # The session's own writes come back too; only cells that differ are applied
+            fetched = table.get('fetched_at', {})
+            cells = [
+                cell for cell in entry['value']
+                if (
+                    table['data'].get(cell[0], {}).get(cell[1]),
+                    table['data_source'].get(cell[0], {}).get(cell[1]),
+                    fetched.get(cell[0], {}).get(cell[1])
+                ) != (cell[2], cell[3], cell[4] if len(cell) > 4 else None)
+            ]
+            if not cells:
+                continue
+            entry = dict(entry, value=cells)
+            for metric_key, column_name, value, *_ in cells:
+                edited = st.session_state.pop(f"input_{metric_key}_{column_name}_{table_key}", None)
+                # An edit made this run, not saved yet, loses to the value saved first
+                if edited is not None and edited not in (table['data'][metric_key].get(column_name), value):
+                    st.session_state.workspace_conflicts.append({
+                        'table': table_key,
+                        'part': 'cell',
+                        'metric': metric_key,
+                        'column': column_name,
+                        'yours': edited,
+                        'theirs': value
+                    })
+        elif entry['op'] == 'summary' and table is not None:
+            if table['summary'] == entry['value']:
+                continue
+            st.session_state.pop(f"summary_{table_key}", None)
+        else:
+            if table == entry['value']:
+                continue
+            clear_table_widget_state(table_key)
+        apply_entry(tables, entry)
+        apply_entry(st.session_state.workspace_baseline, copy_tables(entry))
+        changed = True
+    return changed
+
+def sync_session_workspace():
+    """Pull what other sessions saved to this session's workspace since it last synced"""
+    workspace = get_workspaces().get(st.session_state.workspace_name)
+    entries, st.session_state.workspace_versions = workspace.changes_since(st.session_state.workspace_versions)
+    apply_workspace_entries(entries)
+
+def save_session_workspace():
+    """Save the cells, columns, metrics and summaries this session changed since its last save
+    
+    Returns True when the save brought back other sessions' changes (or the
+    values that won a conflict), which the page has not shown yet.
+    """
+    from workspace import copy_tables, diff_table
+    
+    name = st.session_state.get('workspace_name')
+    if name is None:
+        return False
+    baseline = st.session_state.workspace_baseline
+    changes = {}
+    for table_key, table in st.session_state.tables.items():
+        ops = diff_table(baseline.get(table_key), table)
+        if ops:
+            changes[table_key] = ops
+    if not changes:
+        return False
+    
+    versions, entries, conflicts = get_workspaces().get(name).commit(changes, st.session_state.workspace_versions)
+    for table_key in changes:
+        baseline[table_key] = copy_tables(st.session_state.tables[table_key])
+    st.session_state.workspace_versions = versions
+    st.session_state.workspace_conflicts.extend(conflicts)
+    return apply_workspace_entries(entries)
+
+def save_fragment_edits():
+    """Save what a fragment run changed right away; full runs save in run_main
+    
+    A fragment rerun never reaches run_main, so its edits would otherwise wait
+    for the next full run and be lost if the browser closed first.
+    """
+    if save_session_workspace():
+        st.rerun()
+
+def update_session_size():
+    """Re-estimate this session's memory (tables, histories and widget state) after a run"""
+    if 'session_key' in st.session_state:
+        get_session_registry().update_size(st.session_state.session_key, estimate_size(st.session_state.to_dict()))
+
+# Local read-only JSON API for other tools (BI, bots); 0 disables it
+REPORT_API_PORT = int(os.environ.get('DASHBOARD_API_PORT', 8765))
+
+@st.cache_resource
+def get_report_publisher():
+    """Share one report publisher across sessions, served on the local JSON API; None when it can't be served"""
+    from report_api import ReportPublisher, start_report_api
+    
+    if not REPORT_API_PORT:
+        return None
+    publisher = ReportPublisher()
+    try:
+        start_report_api(publisher, REPORT_API_PORT)
+    except OSError as e:
+        # Usually another server process on this host already serves the port;
+        # publishing here would only fill a publisher nobody reads
+        logger.warning("Report API not started on port %s (%s); this process will not publish tables", REPORT_API_PORT, e)
+        return None
+    return publisher
+
+def publish_table(table_key, snapshot):
+    """Publish a table version under the session's workspace; private sessions publish nothing"""
+    # Resolved either way so the API is up once any session records a version
+    publisher = get_report_publisher()
+    name = st.session_state.get('workspace_name')
+    if publisher is not None and name is not None:
+        publisher.publish(name, table_key, snapshot)
+
+def get_table_history(table_key):
+    """Snapshot history for a table, started from its current state"""
+    # Touch the table first so a spilled session reloads its histories too
+    table = st.session_state.tables[table_key]
+    history = st.session_state.table_history.get(table_key)
+    if history is None:
+        history = SnapshotHistory(table)
+        st.session_state.table_history[table_key] = history
+        publish_table(table_key, history.head)
+    return history
+
+def record_table_version(table_key, label='', sent=False):
+    """Commit the live table as a new snapshot if it changed and publish it to the report API"""
+    touch_session()
+    snapshot = get_table_history(table_key).commit(st.session_state.tables[table_key], label, sent)
+    publish_table(table_key, snapshot)
+    return snapshot
+
+def clear_table_widget_state(table_key):
+    """Drop editor widget state so inputs re-read the table"""
+    suffix = f"_{table_key}"
+    for key in list(st.session_state.keys()):
+        if isinstance(key, str) and key.endswith(suffix) and key.startswith(('input_', 'start_', 'end_', 'summary_')):
+            del st.session_state[key]
+
+def restore_table_version(table_key, snapshot):
+    """Replace the live table with a thawed snapshot"""
+    st.session_state.tables[table_key] = snapshot.to_table()
+    clear_table_widget_state(table_key)
+    publish_table(table_key, snapshot)
+
+def diff_against_last_sent(table_key):
+    """Cells changed since the last snapshot marked as sent, or None if nothing was sent"""
+    history = get_table_history(table_key)
+    last_sent = history.last_sent()
+    if last_sent is None:
+        return None
+    current = record_table_version(table_key)
+    return diff_snapshots(last_sent, current)
+
+def update_facebook_data_from_api(needs_daily=False):
+    """Start a background fetch of the Facebook table from the API"""
+    if st.session_state.active_table != 'facebook':
+        return
+    
+    job = st.session_state.get('facebook_fetch_job')
+    if job is not None and not job.is_done():
+        return job
+    
+    creds = st.session_state.facebook_credentials
+    facebook_table = st.session_state.tables['facebook']
+    
+    job = FacebookFetchJob(
+        creds['token'],
+        creds['account_id'],
+        facebook_table['columns'],
+        list(facebook_table['metrics'].keys()),
+        needs_daily
+    )
+    st.session_state.facebook_fetch_job = job.start()
+    st.session_state.facebook_fetch_summary = None
+    return job
+
+# A refresh that could not bring every stale column up to date is retried after this long
+REFRESH_RETRY_SECONDS = 60
+
+# A re-dated column is fetched once its dates have not changed for this long
+REDATE_DEBOUNCE_SECONDS = 1.5
+
+def stale_columns(table, now=None):
+    """Columns with an API value due for a refresh, or holding nothing but zero placeholders"""
+    fetched = table.get('fetched_at', {})
+    raw_metrics = [metric_key for metric_key, metric in table['metrics'].items() if metric['type'] == 'raw']
+    stale = []
+    for column in table['columns']:
+        name = column['name']
+        sources = [table['data_source'][metric_key][name] for metric_key in raw_metrics]
+        if 'api' in sources:
+            due = any(
+                insights_refresh_due(column['end_date'], fetched.get(metric_key, {}).get(name), now)
+                for metric_key in raw_metrics if table['data_source'][metric_key][name] == 'api'
+            )
+        else:
+            due = set(sources) == {'manual'} and not any(table['data'][metric_key][name] for metric_key in raw_metrics)
+        if due:
+            stale.append(column)
+    return stale
+
+def refresh_stale_facebook_data():
+    """Stale-while-revalidate for the Facebook table, called on every run
+    
+    Whatever the table holds stays on screen with its age. Columns due for a
+    refresh are re-summed from stored days that are still fresh, and the rest
+    are refetched by a background job whose results land in place.
+    """
+    collect_facebook_fetch_results()
+    creds = st.session_state.facebook_credentials
+    if creds['token'] and creds['account_id']:
+        # Warm the access check off-thread so stored days can serve the next date edit
+        get_facebook_api(creds['token'], creds['account_id']).has_access(wait=False)
+    job = start_redated_fetch()
+    if job is not None:
+        return job
+    if not creds['token'] or not creds['account_id'] or st.session_state.get('facebook_fetch_job') is not None:
+        return None
+    if time.time() < st.session_state.get('facebook_refresh_after', 0):
+        return None
+    
+    table = st.session_state.tables['facebook']
+    # Re-dated columns wait for their own fetch
+    redated = st.session_state.get('facebook_redated', {})
+    stale = [column for column in stale_columns(table) if column['name'] not in redated]
+    if not stale:
+        return None
+    filled = apply_indexed_totals('facebook', creds, stale, fresh_only=True)
+    stale = [column for column in stale if column['name'] not in filled]
+    st.session_state.facebook_refresh_after = time.time() + REFRESH_RETRY_SECONDS
+    if not stale:
+        return None
+    
+    job = FacebookFetchJob(creds['token'], creds['account_id'], stale, list(table['metrics'].keys()), background=True)
+    st.session_state.facebook_fetch_job = job.start()
+    st.session_state.facebook_fetch_summary = None
+    return job
+
+def redate_facebook_columns(columns):
+    """Bring re-dated Facebook columns up to date; returns the names filled from stored days
+    
+    Columns whose new range is not in the stored days are fetched on their
+    own REDATE_DEBOUNCE_SECONDS after their last date edit, so stepping
+    through a date picker costs one request. A fetch still running for a
+    column's earlier dates is cancelled.
+    """
+    job = st.session_state.get('facebook_fetch_job')
+    if job is not None:
+        for column in columns:
+            job.cancel_column(column['name'])
+        # A job that only fetched these columns has nothing left to do
+        if all(column['name'] in job.skipped for column in job.columns):
+            job.cancel()
+            st.session_state.facebook_fetch_job = None
+    
+    creds = st.session_state.facebook_credentials
+    filled = apply_indexed_totals('facebook', creds, columns)
+    if not creds['token'] or not creds['account_id']:
+        return filled
+    redated = st.session_state.setdefault('facebook_redated', {})
+    due = time.time() + REDATE_DEBOUNCE_SECONDS
+    for column in columns:
+        if column['name'] in filled:
+            redated.pop(column['name'], None)
+        else:
+            redated[column['name']] = due
+    return filled
+
+def start_redated_fetch():
+    """Fetch the re-dated columns whose dates settled, unless another fetch is running"""
+    redated = st.session_state.get('facebook_redated')
+    creds = st.session_state.facebook_credentials
+    if not redated or st.session_state.get('facebook_fetch_job') is not None:
+        return None
+    if not creds['token'] or not creds['account_id']:
+        # Nothing can be fetched without credentials, so stop waiting
+        redated.clear()
+        return None
+    
+    table = st.session_state.tables['facebook']
+    now = time.time()
+    columns = [column for column in table['columns'] if redated.get(column['name'], now + 1) <= now]
+    # Columns removed or renamed since their dates changed are forgotten
+    names = {column['name'] for column in table['columns']}
+    for name in [name for name in redated if name not in names]:
+        del redated[name]
+    if not columns:
+        return None
+    for column in columns:
+        del redated[column['name']]
+    
+    job = FacebookFetchJob(creds['token'], creds['account_id'], columns, list(table['metrics'].keys()))
+    st.session_state.facebook_fetch_job = job.start()
+    st.session_state.facebook_fetch_summary = None
+    return job
+
+def finish_facebook_fetch(job):
+    """Clear a finished fetch job and record its summary"""
+    st.session_state.facebook_fetch_job = None
+    # Daily rows live in the shared Arrow store; the session only keeps the range
+    if job.daily_data:
+        st.session_state.facebook_daily_range = {
+            'account_id': job.api.account_id,
+            'start_date': job.fetch_plan['since'],
+            'end_date': job.fetch_plan['until']
+        }
+    # A background refresh only reports when something went wrong
+    if not job.background or job.errors:
+        st.session_state.facebook_fetch_summary = {
+            'completed': job.completed,
+            'updated': job.applied,
+            'total': job.total,
+            'errors': list(job.errors),
+            'cancelled': job.cancel_event.is_set()
+        }
+
+def collect_facebook_fetch_results():
+    """Apply columns that arrived since the last run, ahead of the page that shows them
+    
+    A full run collects results itself, so the progress fragment only reruns
+    the page when it polls on its own and never discards a widget click that
+    started the run.
+    """
+    job = st.session_state.get('facebook_fetch_job')
+    if job is None:
+        return
+    apply_facebook_fetch_results(job)
+    if job.is_done():
+        finish_facebook_fetch(job)
+
+def render_facebook_fetch_progress(cancel_label="Cancel Fetch", redraw=None):
+    """Fetch progress and cancel, polled only while a fetch runs or re-dated columns wait
+    
+    redraw(table_key, names) shows the columns that arrived without a full
+    run where it can; pages without one rerun in full instead.
+    """
+    if st.session_state.get('facebook_fetch_job') is not None or st.session_state.get('facebook_redated'):
+        poll_facebook_fetch(cancel_label, redraw)
+
+@session_fragment(run_every=FETCH_POLL_SECONDS)
+def poll_facebook_fetch(cancel_label, redraw):
+    """Poll the running fetch job, fill in arrived columns and offer cancel"""
+    job = st.session_state.get('facebook_fetch_job')
+    if job is None:
+        # Re-dated columns start fetching here once their dates settle
+        job = start_redated_fetch()
+        if job is None:
+            if not st.session_state.get('facebook_redated'):
+                # Nothing left to wait for; the next full run stops polling
+                st.rerun()
+            return
+    
+    applied = apply_facebook_fetch_results(job)
+    done = job.is_done()
+    
+    if job.background:
+        st.caption(f"Refreshing {job.total - job.completed} stale columns in the background...")
+    else:
+        st.progress(job.completed / job.total if job.total else 1.0, text=f"Fetched {job.completed} of {job.total} columns")
+    
+    if not done and st.button(cancel_label, key="cancel_facebook_fetch"):
+        job.cancel()
+        done = True
+    
+    if done:
+        finish_facebook_fetch(job)
+        # One full run shows the summary and stops polling
+        st.rerun()
+    if applied:
+        if redraw is None:
+            st.rerun()
+        redraw('facebook', applied)
+
+def build_export_csv(current_table, api_indicator=" (API)", import_indicator=" (Import)"):
+    """Build the CSV export for a table"""
+    import pandas as pd
+    
+    export_data = []
+    for metric_key, metric in current_table['metrics'].items():
+        row = {'Metric': metric['name']}
+        for column in current_table['columns']:
+            if metric['type'] == 'calculated':
+                raw_data = {k: current_table['data'][k][column['name']] 
+                          for k in current_table['data'].keys()}
+                value = calculate_metric(metric_key, raw_data)
+            else:
+                value = current_table['data'][metric_key][column['name']]
+            
+            # Add data source indicator
+            source = current_table.get('data_source', {}).get(metric_key, {}).get(column['name'], 'manual')
+            source_indicator = {'api': api_indicator, 'import': import_indicator}.get(source, "")
+            
+            row[f"{column['name']} ({column['display_name']})"] = format_value(value, metric['format']) + source_indicator
+        export_data.append(row)
+    
+    df_export = pd.DataFrame(export_data)
+    return df_export.to_csv(index=False)
+
+def build_export_workbook(tables, daily_store=None, daily_range=None, hourly_store=None):
+    """Build the all-platform workbook export (one sheet per platform, summary and raw daily rows)"""
+    from workbook import build_workbook_bytes, iter_daily_rows, platform_tables
+    
+    facebook_daily_data = daily_store.get_daily(**daily_range) if daily_store and daily_range else None
+    return build_workbook_bytes(platform_tables(tables), iter_daily_rows(facebook_daily_data, hourly_store))
+
+# ?profile=1 profiles one rerun, same as the sidebar button
+PROFILE_QUERY_PARAM = 'profile'
+
+def request_profile():
+    """Arm the profiler for the next full rerun"""
+    st.session_state.profile_next_rerun = True
+
+# Session state keys of jobs that keep working on their own threads after a run
+BACKGROUND_JOB_KEYS = ('facebook_fetch_job', 'platform_refresh_job', 'portfolio_job')
+
+def run_main(main, label):
+    """Run the script body, under the profiler when the next rerun was requested"""
+    armed = st.session_state.pop('profile_next_rerun', False)
+    if PROFILE_QUERY_PARAM in st.query_params:
+        del st.query_params[PROFILE_QUERY_PARAM]
+        armed = True
+    
+    running = {key: st.session_state.get(key) for key in BACKGROUND_JOB_KEYS}
+    
+    def started_futures():
+        """Workers of the jobs this run started; the profile's stack sampling covers them too"""
+        jobs = [st.session_state.get(key) for key in BACKGROUND_JOB_KEYS]
+        return [
+            future for job, previous in zip(jobs, running.values())
+            if job is not None and job is not previous for future in job.futures
+        ]
+    
+    synced = False
+    try:
+        if not armed:
+            main()
+        else:
+            from profiler import profile_call
+            
+            label = f"{label}-{st.session_state.get('active_table', 'start')}"
+            try:
+                _, st.session_state.last_profile = profile_call(main, label, started_futures)
+            except BaseException as e:
+                # st.rerun()/st.stop() end the run early; keep the profile for the next run
+                st.session_state.last_profile = getattr(e, 'profile_summary', None)
+                raise
+    finally:
+        # Edits are saved even when st.rerun() ends the run early
+        synced = save_session_workspace()
+    if synced:
+        # Show what other sessions saved and the values that won any conflict
+        st.rerun()
+    
+    update_session_size()
+    render_profile_summary()
+    render_session_admin()
+
+def render_profile_summary():
+    """Show the most recent rerun profile in a sidebar expander"""
+    profile = st.session_state.get('last_profile')
+    if not profile:
+        return
+    
+    with st.sidebar.expander(f"Last Profile ({profile['wall_seconds'] * 1000:.0f} ms)"):
+        if profile['sampling']:
+            sampled = "Sampling stacks until the fetch started by this run finishes..."
+        else:
+            sampled = f"{profile['samples']} stack samples"
+            if profile['background_seconds'] is not None:
+                sampled += f", including {profile['background_seconds'] * 1000:.0f} ms of background fetch after the run"
+        st.caption(f"{profile['stats_path']}\n\n{profile['collapsed_path']}\n\n{sampled}")
+        table_html = "<table class='sf-table'><tr><th>Function</th><th>Calls</th><th>Own ms</th><th>Cumulative ms</th></tr>"
+        for row in profile['top_functions']:
+            table_html += (
+                f"<tr><td>{html.escape(row['function'])}</td><td>{row['calls']}</td>"
+                f"<td>{row['own_seconds'] * 1000:.1f}</td><td>{row['cumulative_seconds'] * 1000:.1f}</td></tr>"
+            )
+        table_html += "</table>"
+        st.markdown(table_html, unsafe_allow_html=True)
+
+# ?admin=1 shows per-session memory in the sidebar
+ADMIN_QUERY_PARAM = 'admin'
+
+def render_session_admin():
+    """Per-session memory estimates and eviction state for operators"""
+    if ADMIN_QUERY_PARAM not in st.query_params:
+        return
+    
+    stats = get_session_registry().get_stats()
+    with st.sidebar.expander(f"Session Memory ({stats['total_bytes'] / 1024 / 1024:.1f} of {stats['cap_bytes'] / 1024 / 1024:.0f} MB)"):
+        st.caption(f"{len(stats['sessions'])} sessions · {stats['evictions']} evictions")
+        table_html = "<table class='sf-table'><tr><th>Session</th><th>Size</th><th>Idle</th><th>State</th></tr>"
+        for row in stats['sessions']:
+            current = " (you)" if row['session'] == st.session_state.get('session_key') else ""
+            table_html += (
+                f"<tr><td>{row['session'][:8]}{current}</td><td>{row['size_bytes'] / 1024:.0f} KB</td>"
+                f"<td>{row['idle_seconds'] / 60:.0f} min</td><td>{'spilled' if row['spilled'] else 'live'}</td></tr>"
+            )
+        table_html += "</table>"
+        st.markdown(table_html, unsafe_allow_html=True)
+    
+    cache_stats = get_insights_cache().get_stats()
+    daemon = cache_stats['daemon']
+    with st.sidebar.expander(f"Insights Cache ({cache_stats['hit_rate']:.0%} hit rate here)"):
+        st.caption(f"This process: {cache_stats['hits']} hits · {cache_stats['misses']} misses · {cache_stats['errors']} errors")
+        if daemon is None:
+            st.caption("Cache daemon not reachable; start it with `python cache_daemon.py`")
+        else:
+            st.caption(
+                f"All replicas: {daemon['hit_rate']:.0%} hit rate · {daemon['entries']} entries · "
+                f"{daemon['bytes'] / 1024 / 1024:.1f} of {daemon['max_bytes'] / 1024 / 1024:.0f} MB · "
+                f"{daemon['evictions']} evicted · {daemon['expired']} expired"
+            )
@@ -0,0 +1,130 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from dashboard_core import (
+    DEFAULT_METRICS,
+    GRAPH_POOL_SIZE,
+    HOURLY_BREAKDOWN,
+    METRIC_FORMULAS,
+    plan_insights_fields
+)
+
+RAW_METRICS = [key for key, metric in DEFAULT_METRICS.items() if metric['type'] == 'raw']
+
+# Four full weeks, so every weekday appears equally often in the heatmap
+HOURLY_DAYS = 28
+
+# Hourly ranges are fetched in week-sized chunks in parallel
+HOURLY_CHUNK_DAYS = 7
+
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def apply_formula(metric_key, raw_sums):
+    """Calculate a metric from summed raw arrays (dict of equally shaped arrays)"""
+    if metric_key not in METRIC_FORMULAS:
+        return raw_sums[metric_key]
+    numerator, denominator, scale = METRIC_FORMULAS[metric_key]
+    result = np.zeros_like(raw_sums[denominator], dtype=np.float64)
+    np.divide(raw_sums[numerator] * scale, raw_sums[denominator], out=result, where=raw_sums[denominator] > 0)
+    return result
+
+class HourlyStore:
+    """Hourly raw metrics for one account in a dense days x 24 x metrics float array"""
+    def __init__(self, start_date, end_date, metrics=None):
+        self.start_date = parse_date(start_date)
+        self.end_date = parse_date(end_date)
+        self.metrics = list(metrics or RAW_METRICS)
+        self.metric_index = {metric_key: i for i, metric_key in enumerate(self.metrics)}
+        self.days = (self.end_date - self.start_date).days + 1
+        self.values = np.zeros((self.days, 24, len(self.metrics)), dtype=np.float64)
+        # When the oldest of the rows left the Graph API
+        self.fetched_at = None
+    
+    def add_rows(self, rows, api):
+        """Write Graph hourly breakdown rows into the array"""
+        for row in rows:
+            day = (parse_date(row['date_start']) - self.start_date).days
+            if not 0 <= day < self.days:
+                continue
+            # The breakdown value looks like "13:00:00 - 13:59:59"
+            hour = int(row.get(HOURLY_BREAKDOWN, '00')[:2])
+            metrics = api.process_facebook_data([row], self.metrics)
+            self.values[day, hour] += [metrics[metric_key] for metric_key in self.metrics]
+    
+    def day_dates(self):
+        return [self.start_date + timedelta(days=i) for i in range(self.days)]
+    
+    def raw_sums(self, array):
+        """Split the trailing metrics axis into a dict of arrays"""
+        return {metric_key: array[..., i] for metric_key, i in self.metric_index.items()}
+    
+    def daily_totals(self):
+        """Raw metrics per day as a days x metrics array (no API calls)"""
+        return self.values.sum(axis=1)
+    
+    def range_totals(self, start_date, end_date):
+        """Raw metric totals for a date range inside the store, or None if it isn't covered"""
+        first = (parse_date(start_date) - self.start_date).days
+        last = (parse_date(end_date) - self.start_date).days
+        if first < 0 or last >= self.days or first > last:
+            return None
+        totals = self.values[first:last + 1].sum(axis=(0, 1))
+        return {metric_key: float(totals[i]) for metric_key, i in self.metric_index.items()}
+    
+    def dow_hour_heatmap(self, metric_key):
+        """Day-of-week x hour grid (7 x 24) of a raw or calculated metric"""
+        weekdays = np.array([date.weekday() for date in self.day_dates()])
+        grid = np.zeros((7, 24, len(self.metrics)), dtype=np.float64)
+        np.add.at(grid, weekdays, self.values)
+        return apply_formula(metric_key, self.raw_sums(grid))
+    
+    def intraday_pacing(self, metric_key, day=None, trailing_days=28):
+        """Cumulative hourly curve for a day against the average curve of the trailing days
+        
+        Returns (actual, expected) arrays of length 24. expected is the trailing
+        average cumulative value, so actual / expected shows pacing hour by hour.
+        """
+        day_index = self.days - 1 if day is None else (parse_date(day) - self.start_date).days
+        cumulative = np.cumsum(self.values, axis=1)
+        
+        first = max(0, day_index - trailing_days)
+        history = cumulative[first:day_index]
+        actual = apply_formula(metric_key, self.raw_sums(cumulative[day_index]))
+        if len(history) == 0:
+            return actual, np.zeros(24, dtype=np.float64)
+        expected = apply_formula(metric_key, self.raw_sums(history.mean(axis=0)))
+        return actual, expected
+
+def fetch_hourly_store(api, start_date, end_date, metrics=None):
+    """Fetch hourly rows for a range in parallel week chunks into an HourlyStore"""
+    store = HourlyStore(start_date, end_date, metrics)
+    plan = plan_insights_fields(store.metrics)
+    
+    chunks = []
+    chunk_start = store.start_date
+    while chunk_start <= store.end_date:
+        chunk_end = min(chunk_start + timedelta(days=HOURLY_CHUNK_DAYS - 1), store.end_date)
+        chunks.append((chunk_start.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d')))
+        chunk_start = chunk_end + timedelta(days=1)
+    
+    # Chunks another session fetched recently come from the shared cache in one lookup
+    cached = api.get_cached_rows(chunks, plan, 'hourly')
+    store.fetched_at = min([entry['fetched_at'] for entry in cached.values()] + [time.time()])
+    
+    with ThreadPoolExecutor(max_workers=min(GRAPH_POOL_SIZE, len(chunks))) as executor:
+        chunk_rows = executor.map(
+            lambda chunk: cached[chunk]['rows'] if chunk in cached else api.get_insight_rows(
+                chunk[0], chunk[1], plan, granularity='hourly', use_cache=False
+            ),
+            chunks
+        )
+        for rows in chunk_rows:
+            store.add_rows(rows, api)
+    
+    return store
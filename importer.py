@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+import os
+
+from dashboard_core import DEFAULT_METRICS
+
+RAW_METRICS = [key for key, metric in DEFAULT_METRICS.items() if metric['type'] == 'raw']
+
+# Rows parsed per chunk; memory stays bounded by this, not by the file size
+IMPORT_CHUNK_ROWS = 100000
+
+# Header rows are searched for in this many leading lines (exports often start with a title)
+HEADER_SEARCH_LINES = 20
+
+# Export column per raw metric; an empty or missing entry leaves that metric untouched
+IMPORT_COLUMN_MAPPINGS = {
+    'google': {
+        'date': 'Day',
+        'spend': 'Cost',
+        'impressions': 'Impr.',
+        'clicks': 'Clicks',
+        'add_to_cart': 'Add to cart',
+        'checkout': 'Begin checkout',
+        'purchase': 'Conversions',
+        'purchase_revenue': 'Conv. value'
+    },
+    'linkedin': {
+        'date': 'Start Date (in UTC)',
+        'spend': 'Total Spent',
+        'impressions': 'Impressions',
+        'clicks': 'Clicks',
+        'purchase': 'Conversions',
+        'purchase_revenue': 'Total Conversion Value'
+    },
+    'tiktok': {
+        'date': 'By Day',
+        'spend': 'Cost',
+        'impressions': 'Impressions',
+        'clicks': 'Clicks (Destination)',
+        'add_to_cart': 'Adds to Cart',
+        'checkout': 'Checkouts Initiated',
+        'purchase': 'Purchases',
+        'purchase_revenue': 'Purchase Value'
+    },
+    'microsoft': {
+        'date': 'TimePeriod',
+        'spend': 'Spend',
+        'impressions': 'Impressions',
+        'clicks': 'Clicks',
+        'purchase': 'Conversions',
+        'purchase_revenue': 'Revenue'
+    }
+}
+
+# JSON file overriding the default mappings, e.g. {"google": {"spend": "Cost (USD)"}}
+IMPORT_MAPPINGS_FILE = os.environ.get('DASHBOARD_IMPORT_MAPPINGS')
+
+def load_column_mappings(path=IMPORT_MAPPINGS_FILE):
+    """Default mappings with any per-platform overrides from the mappings file"""
+    mappings = {table_key: dict(mapping) for table_key, mapping in IMPORT_COLUMN_MAPPINGS.items()}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for table_key, overrides in json.load(f).items():
+                mappings.setdefault(table_key, {}).update(overrides)
+    return mappings
+
+def open_text(source):
+    """A text stream over a file path or a binary file object such as an upload"""
+    if isinstance(source, str):
+        return open(source, newline='', encoding='utf-8-sig')
+    source.seek(0)
+    return io.TextIOWrapper(source, newline='', encoding='utf-8-sig')
+
+def parse_header(line):
+    return next(csv.reader([line]), [])
+
+def find_header_row(lines, date_column):
+    """Index of the first line naming the date column, skipping report titles above it"""
+    for index, line in enumerate(lines):
+        if index >= HEADER_SEARCH_LINES:
+            break
+        if date_column in parse_header(line):
+            return index
+    raise ValueError(f"No header row with a '{date_column}' column in the first {HEADER_SEARCH_LINES} lines")
+
+def to_numbers(series):
+    """Parse export numbers such as '1,234.50', '$12.00', '3.1%' or '--' into floats"""
+    import pandas as pd
+    
+    if not pd.api.types.is_numeric_dtype(series):
+        series = series.astype(str).str.replace(r'[^0-9.\-eE]', '', regex=True)
+    return pd.to_numeric(series, errors='coerce').fillna(0.0)
+
+def aggregate_daily(source, mapping, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Stream a platform CSV export in chunks and sum it into per-day raw metrics
+    
+    Only the mapped columns are parsed and each chunk is reduced to one row
+    per day before the next is read, so ad-level exports with millions of
+    rows never sit in memory at once. Rows whose date does not parse (total
+    and footer lines) are counted as skipped.
+    """
+    import pandas as pd
+    
+    metrics = [key for key in RAW_METRICS if mapping.get(key)]
+    if not mapping.get('date') or not metrics:
+        raise ValueError("Map the date column and at least one metric")
+    
+    stream = open_text(source)
+    try:
+        header_lines = [stream.readline() for _ in range(HEADER_SEARCH_LINES)]
+        header_row = find_header_row(header_lines, mapping['date'])
+        header = parse_header(header_lines[header_row])
+        missing = [mapping[key] for key in ['date'] + metrics if mapping[key] not in header]
+        if missing:
+            raise ValueError(f"Columns not found in the export: {', '.join(missing)}")
+        
+        stream.seek(0)
+        reader = pd.read_csv(
+            stream,
+            skiprows=header_row,
+            usecols=[mapping[key] for key in ['date'] + metrics],
+            thousands=',',
+            # Infer each column's type over the whole chunk, not a slice of it
+            low_memory=False,
+            chunksize=chunk_rows
+        )
+        totals = None
+        rows = 0
+        skipped = 0
+        for chunk in reader:
+            dates = pd.to_datetime(chunk[mapping['date']], errors='coerce')
+            frame = pd.DataFrame({key: to_numbers(chunk[mapping[key]]) for key in metrics})
+            frame['date'] = dates.dt.strftime('%Y-%m-%d')
+            valid = dates.notna()
+            rows += int(valid.sum())
+            skipped += int((~valid).sum())
+            daily = frame[valid].groupby('date').sum()
+            totals = daily if totals is None else totals.add(daily, fill_value=0.0)
+    finally:
+        # Leave an uploaded file open for the caller
+        if isinstance(source, str):
+            stream.close()
+        else:
+            stream.detach()
+    
+    daily_data = {} if totals is None else {
+        date: {key: float(value) for key, value in values.items()}
+        for date, values in totals.sort_index().to_dict('index').items()
+    }
+    return {'daily': daily_data, 'metrics': metrics, 'rows': rows, 'skipped': skipped}
@@ -1,8 +1,21 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime, timedelta
-import requests
-import json
+from datetime import datetime
+
+from dashboard_core import (
+    PLATFORM_NAMES,
+    build_export_csv,
+    calculate_metric,
+    create_initial_table,
+    fetch_facebook_data,
+    format_age,
+    format_value,
+    get_graph_transport,
+    initialize_tables,
+    refresh_stale_facebook_data,
+    render_facebook_fetch_progress,
+    run_main,
+    update_facebook_data_from_api
+)
 
 # Page config
 st.set_page_config(
@@ -19,265 +32,6 @@ if 'active_table' not in st.session_state:
 if 'facebook_credentials' not in st.session_state:
     st.session_state.facebook_credentials = {'token': '', 'account_id': ''}
 
-# Default metrics with calculation formulas
-DEFAULT_METRICS = {
-    # Raw metrics (from APIs or manual input)
-    'spend': {'name': 'Spend', 'type': 'raw', 'format': 'currency'},
-    'impressions': {'name': 'Impressions', 'type': 'raw', 'format': 'number'},
-    'clicks': {'name': 'Clicks', 'type': 'raw', 'format': 'number'},
-    'add_to_cart': {'name': 'Add to Cart', 'type': 'raw', 'format': 'number'},
-    'checkout': {'name': 'Checkout', 'type': 'raw', 'format': 'number'},
-    'purchase': {'name': 'Purchases', 'type': 'raw', 'format': 'number'},
-    'purchase_revenue': {'name': 'Purchase Revenue', 'type': 'raw', 'format': 'currency'},
-    
-    # Calculated metrics
-    'ctr': {'name': 'CTR', 'type': 'calculated', 'format': 'percentage'},
-    'cpm': {'name': 'CPM', 'type': 'calculated', 'format': 'currency'},
-    'cpc': {'name': 'CPC', 'type': 'calculated', 'format': 'currency'},
-    'atc_rate': {'name': 'Add to Cart Rate', 'type': 'calculated', 'format': 'percentage'},
-    'checkout_rate': {'name': 'Checkout Rate', 'type': 'calculated', 'format': 'percentage'},
-    'purchase_rate': {'name': 'Purchase Rate', 'type': 'calculated', 'format': 'percentage'},
-    'click_to_purchase': {'name': 'Click to Purchase Rate', 'type': 'calculated', 'format': 'percentage'},
-    'roas': {'name': 'ROAS', 'type': 'calculated', 'format': 'ratio'},
-    'cost_per_purchase': {'name': 'Cost per Purchase', 'type': 'calculated', 'format': 'currency'}
-}
-
-def format_value(value, format_type):
-    """Format value based on type"""
-    if value is None or pd.isna(value):
-        return 'N/A'
-    
-    try:
-        value = float(value)
-        if format_type == 'currency':
-            return f"${value:,.2f}"
-        elif format_type == 'percentage':
-            return f"{value:.2f}%"
-        elif format_type == 'ratio':
-            return f"{value:.2f}x"
-        elif format_type == 'number':
-            return f"{int(value):,}"
-        else:
-            return str(value)
-    except:
-        return 'N/A'
-
-def calculate_metric(metric_key, raw_data):
-    """Calculate metric based on raw data"""
-    try:
-        spend = float(raw_data.get('spend', 0))
-        impressions = float(raw_data.get('impressions', 0))
-        clicks = float(raw_data.get('clicks', 0))
-        add_to_cart = float(raw_data.get('add_to_cart', 0))
-        checkout = float(raw_data.get('checkout', 0))
-        purchase = float(raw_data.get('purchase', 0))
-        purchase_revenue = float(raw_data.get('purchase_revenue', 0))
-        
-        if metric_key == 'ctr':
-            return (clicks / impressions * 100) if impressions > 0 else 0
-        elif metric_key == 'cpm':
-            return (spend / impressions * 1000) if impressions > 0 else 0
-        elif metric_key == 'cpc':
-            return (spend / clicks) if clicks > 0 else 0
-        elif metric_key == 'atc_rate':
-            return (add_to_cart / clicks * 100) if clicks > 0 else 0
-        elif metric_key == 'checkout_rate':
-            return (checkout / add_to_cart * 100) if add_to_cart > 0 else 0
-        elif metric_key == 'purchase_rate':
-            return (purchase / checkout * 100) if checkout > 0 else 0
-        elif metric_key == 'click_to_purchase':
-            return (purchase / clicks * 100) if clicks > 0 else 0
-        elif metric_key == 'roas':
-            return (purchase_revenue / spend) if spend > 0 else 0
-        elif metric_key == 'cost_per_purchase':
-            return (spend / purchase) if purchase > 0 else 0
-        else:
-            return float(raw_data.get(metric_key, 0))
-    except:
-        return 0
-
-class FacebookAPI:
-    def __init__(self, access_token, account_id):
-        self.access_token = access_token
-        self.account_id = account_id
-        self.base_url = "https://graph.facebook.com/v18.0"
-    
-    def get_insights(self, start_date, end_date):
-        """Fetch Facebook Ads insights for specific date range"""
-        
-        # Define the fields we want
-        fields = [
-            'spend',
-            'impressions', 
-            'clicks',
-            'cpm',
-            'cpc', 
-            'ctr',
-            'actions',
-            'action_values'
-        ]
-        
-        params = {
-            'access_token': self.access_token,
-            'fields': ','.join(fields),
-            'time_range': json.dumps({
-                'since': start_date,
-                'until': end_date
-            }),
-            'level': 'account',
-            'time_increment': 1
-        }
-        
-        url = f"{self.base_url}/act_{self.account_id}/insights"
-        
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'data' in data and len(data['data']) > 0:
-                return self.process_facebook_data(data['data'])
-            else:
-                return self.get_empty_metrics()
-                
-        except requests.exceptions.RequestException as e:
-            st.error(f"Facebook API Error: {str(e)}")
-            return self.get_empty_metrics()
-        except Exception as e:
-            st.error(f"Error processing Facebook data: {str(e)}")
-            return self.get_empty_metrics()
-    
-    def process_facebook_data(self, raw_data):
-        """Process Facebook API response into standardized format"""
-        metrics = self.get_empty_metrics()
-        
-        # Aggregate data across all days in the period
-        for day_data in raw_data:
-            metrics['spend'] += float(day_data.get('spend', 0))
-            metrics['impressions'] += int(day_data.get('impressions', 0))
-            metrics['clicks'] += int(day_data.get('clicks', 0))
-            
-            # Process conversion actions
-            actions = day_data.get('actions', [])
-            action_values = day_data.get('action_values', [])
-            
-            for action in actions:
-                action_type = action.get('action_type')
-                value = int(action.get('value', 0))
-                
-                if action_type == 'add_to_cart':
-                    metrics['add_to_cart'] += value
-                elif action_type == 'initiate_checkout':
-                    metrics['checkout'] += value
-                elif action_type in ['purchase', 'complete_registration']:
-                    metrics['purchase'] += value
-            
-            # Process revenue values
-            for action_value in action_values:
-                action_type = action_value.get('action_type')
-                value = float(action_value.get('value', 0))
-                
-                if action_type in ['purchase', 'complete_registration']:
-                    metrics['purchase_revenue'] += value
-        
-        return metrics
-    
-    def get_empty_metrics(self):
-        """Return empty metrics structure"""
-        return {
-            'spend': 0,
-            'impressions': 0,
-            'clicks': 0,
-            'add_to_cart': 0,
-            'checkout': 0,
-            'purchase': 0,
-            'purchase_revenue': 0
-        }
-
-def fetch_facebook_data(start_date, end_date):
-    """Fetch data from Facebook API"""
-    creds = st.session_state.facebook_credentials
-    
-    if not creds['token'] or not creds['account_id']:
-        return None
-    
-    try:
-        fb_api = FacebookAPI(creds['token'], creds['account_id'])
-        return fb_api.get_insights(start_date, end_date)
-    except Exception as e:
-        st.error(f"Error fetching Facebook data: {str(e)}")
-        return None
-
-def create_initial_table(platform):
-    """Create initial table structure"""
-    today = datetime.now()
-    weeks = []
-    
-    # Generate last 4 weeks
-    for i in range(3, -1, -1):
-        week_end = today - timedelta(days=i*7)
-        week_start = week_end - timedelta(days=6)
-        
-        weeks.append({
-            'name': f'Week {4-i}',
-            'start_date': week_start.strftime('%Y-%m-%d'),
-            'end_date': week_end.strftime('%Y-%m-%d'),
-            'display_name': f"{week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}"
-        })
-    
-    # Initialize data structure
-    data = {}
-    data_source = {}  # Track whether data came from API or manual input
-    
-    for metric_key in DEFAULT_METRICS.keys():
-        data[metric_key] = {}
-        data_source[metric_key] = {}
-        for week in weeks:
-            data[metric_key][week['name']] = 0.0
-            data_source[metric_key][week['name']] = 'manual'  # default to manual
-    
-    return {
-        'platform': platform,
-        'columns': weeks,
-        'metrics': DEFAULT_METRICS.copy(),
-        'data': data,
-        'data_source': data_source,
-        'summary': f"{platform} performance summary will appear here. This section can be customized with insights, recommendations, and key takeaways."
-    }
-
-def initialize_tables():
-    """Initialize all platform tables"""
-    if not st.session_state.tables:
-        platforms = ['Facebook', 'Google', 'LinkedIn', 'TikTok', 'Microsoft', 'Summary']
-        st.session_state.tables = {
-            platform.lower(): create_initial_table(platform)
-            for platform in platforms
-        }
-
-def update_facebook_data_from_api():
-    """Update Facebook table with API data"""
-    if st.session_state.active_table != 'facebook':
-        return
-    
-    facebook_table = st.session_state.tables['facebook']
-    
-    for column in facebook_table['columns']:
-        with st.spinner(f"Fetching Facebook data for {column['display_name']}..."):
-            api_data = fetch_facebook_data(column['start_date'], column['end_date'])
-            
-            if api_data:
-                # Update raw metrics with API data
-                raw_metrics = ['spend', 'impressions', 'clicks', 'add_to_cart', 'checkout', 'purchase', 'purchase_revenue']
-                
-                for metric in raw_metrics:
-                    if metric in api_data:
-                        facebook_table['data'][metric][column['name']] = api_data[metric]
-                        facebook_table['data_source'][metric][column['name']] = 'api'
-                
-                st.success(f"✅ Updated {column['name']} with Facebook API data")
-            else:
-                st.warning(f"⚠️ Could not fetch data for {column['name']}")
-
 def main():
     # Initialize tables
     initialize_tables()
@@ -319,20 +73,46 @@ def main():
             else:
                 st.warning("⚠️ Please enter both token and account ID")
         
+        # Graph transport counters
+        transport_stats = get_graph_transport().get_stats()
+        if transport_stats['requests'] or transport_stats['errors']:
+            st.caption(
+                f"Graph API: {transport_stats['requests']} requests, "
+                f"{transport_stats['errors']} errors, "
+                f"avg {transport_stats['avg_seconds'] * 1000:.0f} ms, "
+                f"{transport_stats['wire_bytes'] / 1024:.1f} KB received"
+            )
+        
         st.markdown("---")
         
+        # Cached values stay on screen while stale columns refetch in the background
+        refresh_stale_facebook_data()
+        
         # Facebook Auto-Pull
         if st.session_state.active_table == 'facebook':
             st.subheader("📡 Auto-Pull Facebook Data")
-            if st.button("🔄 Fetch All Facebook Data", type="primary"):
+            fetch_running = st.session_state.get('facebook_fetch_job') is not None
+            if st.button("🔄 Fetch All Facebook Data", type="primary", disabled=fetch_running):
                 if fb_token and fb_account_id:
                     update_facebook_data_from_api()
                 else:
                     st.error("❌ Please configure Facebook credentials first")
+        
+        # Background fetch progress stays visible on every platform tab
+        render_facebook_fetch_progress("⛔ Cancel Fetch")
+        
+        summary = st.session_state.get('facebook_fetch_summary')
+        if summary:
+            if summary['cancelled']:
+                st.warning(f"⚠️ Fetch cancelled after {summary['completed']} of {summary['total']} columns")
+            else:
+                st.success(f"✅ Updated {summary['updated']} of {summary['total']} columns with Facebook API data")
+            for error in summary['errors']:
+                st.warning(f"⚠️ Could not fetch data for {error}")
     
     # Platform selection
-    platforms = list(st.session_state.tables.keys())
-    platform_display_names = [st.session_state.tables[p]['platform'] for p in platforms]
+    platforms = list(PLATFORM_NAMES.keys())
+    platform_display_names = list(PLATFORM_NAMES.values())
     
     # Platform selector
     col1, col2 = st.columns([2, 4])
@@ -376,33 +156,13 @@ def main():
             st.rerun()
     
     with col4:
-        # Export functionality
-        export_data = []
-        for metric_key, metric in current_table['metrics'].items():
-            row = {'Metric': metric['name']}
-            for column in current_table['columns']:
-                if metric['type'] == 'calculated':
-                    raw_data = {k: current_table['data'][k][column['name']] 
-                              for k in current_table['data'].keys()}
-                    value = calculate_metric(metric_key, raw_data)
-                else:
-                    value = current_table['data'][metric_key][column['name']]
-                
-                # Add data source indicator
-                source = current_table.get('data_source', {}).get(metric_key, {}).get(column['name'], 'manual')
-                source_indicator = " 🤖" if source == 'api' else ""
-                
-                row[f"{column['name']} ({column['display_name']})"] = format_value(value, metric['format']) + source_indicator
-            export_data.append(row)
-        
-        df_export = pd.DataFrame(export_data)
-        csv = df_export.to_csv(index=False)
-        
+        # Export is generated on click, which also keeps pandas off the startup path
         st.download_button(
             label="💾 Export CSV",
-            data=csv,
+            data=lambda: build_export_csv(current_table, " 🤖"),
             file_name=f"{st.session_state.active_table}_report_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
+            mime="text/csv",
+            on_click="ignore"
         )
     
     # Add metric functionality
@@ -499,6 +259,9 @@ def main():
                 source = current_table.get('data_source', {}).get(metric_key, {}).get(column['name'], 'manual')
                 api_indicator = " 🤖" if source == 'api' else ""
                 cell_bg = "#e8f5e8" if source == 'api' else "#ffffff"
+                fetched_at = current_table.get('fetched_at', {}).get(metric_key, {}).get(column['name'])
+                if source == 'api' and fetched_at:
+                    api_indicator += f"<br><small style='color: #706e6b;'>{format_age(fetched_at)}</small>"
                 
                 table_html += f"<td style='text-align: center; padding: 12px; border-right: 1px solid #ddd; background-color: {cell_bg};'>{formatted_value}{api_indicator}</td>"
         
@@ -540,6 +303,9 @@ def main():
                 
                 # Show different styling for API vs manual data
                 help_text = "🤖 API data (you can override)" if source == 'api' else "Manual input"
+                fetched_at = current_table.get('fetched_at', {}).get(metric_key, {}).get(column['name'])
+                if source == 'api' and fetched_at:
+                    help_text = f"🤖 API data fetched {format_age(fetched_at)} (you can override)"
                 
                 new_value = cols[i].number_input(
                     f"{metric['name']} - {column['name']}",
@@ -611,4 +377,4 @@ def main():
         """)
 
 if __name__ == "__main__":
-    main()
+    run_main(main, 'new_dashboard')
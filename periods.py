@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+
+# Generator choices shown in the UI: kind -> label
+PERIOD_KINDS = {
+    'weeks': 'Trailing weeks',
+    'months': 'Calendar months',
+    'quarters': 'Calendar quarters'
+}
+
+MAX_GENERATED_PERIODS = 260
+
+def make_column(name, start, end):
+    """Column dict in the shape create_initial_table uses"""
+    display_format = '%m/%d' if start.year == end.year == date.today().year else '%m/%d/%y'
+    return {
+        'name': name,
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': end.strftime('%Y-%m-%d'),
+        'display_name': f"{start.strftime(display_format)} - {end.strftime(display_format)}"
+    }
+
+def month_start(day, months_back=0):
+    month_index = day.year * 12 + day.month - 1 - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def trailing_weeks(count, end):
+    """7-day windows ending on `end`, oldest first (the same weeks create_initial_table builds)"""
+    periods = []
+    for i in range(count - 1, -1, -1):
+        week_end = end - timedelta(days=7 * i)
+        week_start = week_end - timedelta(days=6)
+        periods.append((f"Wk {week_start.strftime('%Y-%m-%d')}", week_start, week_end))
+    return periods
+
+def calendar_months(count, end):
+    """Calendar months up to the one containing `end` (cut at `end`), oldest first"""
+    periods = []
+    for i in range(count - 1, -1, -1):
+        start = month_start(end, i)
+        last = month_start(end, i - 1) - timedelta(days=1)
+        periods.append((start.strftime('%b %Y'), start, min(last, end)))
+    return periods
+
+def calendar_quarters(count, end):
+    """Calendar quarters up to the one containing `end` (cut at `end`), oldest first"""
+    current = month_start(end, (end.month - 1) % 3)
+    periods = []
+    for i in range(count - 1, -1, -1):
+        start = month_start(current, 3 * i)
+        last = month_start(current, 3 * i - 3) - timedelta(days=1)
+        periods.append((f"Q{(start.month - 1) // 3 + 1} {start.year}", start, min(last, end)))
+    return periods
+
+def year_earlier(day):
+    """Same calendar day a year before (Feb 29 maps to Feb 28)"""
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        return day.replace(year=day.year - 1, day=28)
+
+GENERATORS = {
+    'weeks': trailing_weeks,
+    'months': calendar_months,
+    'quarters': calendar_quarters
+}
+
+def generate_periods(kind, count, year_over_year=False, end=None):
+    """Columns for the last `count` periods of a kind, oldest first
+    
+    With year_over_year each period is preceded by the same period a year
+    earlier, so adjacent columns compare like with like. Trailing weeks shift
+    by 52 weeks to keep their weekdays aligned. A period that already appears
+    (a prior period inside the generated range) is only added once.
+    """
+    end = end or date.today()
+    count = max(1, min(int(count), MAX_GENERATED_PERIODS))
+    columns = {}
+    for name, start, last in GENERATORS[kind](count, end):
+        if year_over_year:
+            if kind == 'weeks':
+                prior_start, prior_end = start - timedelta(weeks=52), last - timedelta(weeks=52)
+                prior_name = f"Wk {prior_start.strftime('%Y-%m-%d')}"
+            else:
+                prior_start, prior_end = year_earlier(start), year_earlier(last)
+                prior_name = name.replace(str(start.year), str(prior_start.year))
+            columns.setdefault(prior_name, make_column(prior_name, prior_start, prior_end))
+        columns.setdefault(name, make_column(name, start, last))
+    return list(columns.values())
+
+def replace_columns(table, columns):
+    """Swap in new columns, keeping the values of any column that keeps its name and dates"""
+    old_columns = {column['name']: column for column in table['columns']}
+    data = {}
+    data_source = {}
+    for metric_key in table['data']:
+        data[metric_key] = {}
+        data_source[metric_key] = {}
+        for column in columns:
+            old = old_columns.get(column['name'])
+            kept = old is not None and (old['start_date'], old['end_date']) == (column['start_date'], column['end_date'])
+            data[metric_key][column['name']] = table['data'][metric_key][column['name']] if kept else 0.0
+            data_source[metric_key][column['name']] = (
+                table['data_source'][metric_key].get(column['name'], 'manual') if kept else 'manual'
+            )
+    fetched = table.get('fetched_at', {})
+    kept_names = [
+        column['name'] for column in columns
+        if column['name'] in old_columns
+        and (old_columns[column['name']]['start_date'], old_columns[column['name']]['end_date']) == (column['start_date'], column['end_date'])
+    ]
+    table['columns'] = columns
+    table['data'] = data
+    table['data_source'] = data_source
+    table['fetched_at'] = {
+        metric_key: {name: row[name] for name in kept_names if name in row} for metric_key, row in fetched.items()
+    }
+    return table
@@ -0,0 +1,229 @@
+import heapq
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from dashboard_core import (
+    DEFAULT_METRICS,
+    GRAPH_POOL_SIZE,
+    METRIC_FORMULAS,
+    FacebookAPI,
+    get_account_access,
+    get_graph_transport,
+    get_insights_cache,
+    insights_cache_key,
+    insights_refresh_due,
+    plan_insights_fields
+)
+
+# One worker per pooled connection so threads never wait on the pool
+PORTFOLIO_MAX_WORKERS = GRAPH_POOL_SIZE
+
+RAW_METRICS = [key for key, metric in DEFAULT_METRICS.items() if metric['type'] == 'raw']
+
+def portfolio_periods(today=None):
+    """Current and previous trailing 7-day periods, matching the table's weekly columns"""
+    today = today or datetime.now()
+    periods = []
+    for name, weeks_back in [('previous', 1), ('current', 0)]:
+        period_end = today - timedelta(days=weeks_back * 7)
+        period_start = period_end - timedelta(days=6)
+        periods.append({
+            'name': name,
+            'start_date': period_start.strftime('%Y-%m-%d'),
+            'end_date': period_end.strftime('%Y-%m-%d'),
+            'display_name': f"{period_start.strftime('%m/%d')} - {period_end.strftime('%m/%d')}"
+        })
+    return periods
+
+def parse_account_ids(text):
+    """Split a comma/newline separated list of account IDs, dropping 'act_' prefixes and duplicates"""
+    account_ids = []
+    for token in text.replace(',', '\n').split():
+        account_id = token.strip()
+        if account_id.startswith('act_'):
+            account_id = account_id[4:]
+        if account_id and account_id not in account_ids:
+            account_ids.append(account_id)
+    return account_ids
+
+class PortfolioRefreshJob:
+    """Fetch both periods for many ad accounts on a thread pool"""
+    def __init__(self, access_token, account_ids, periods):
+        self.access_token = access_token
+        self.account_ids = list(account_ids)
+        self.periods = periods
+        self.plan = plan_insights_fields(RAW_METRICS)
+        self.cancel_event = threading.Event()
+        self.results = queue.Queue()
+        self.errors = {}
+        self.completed = 0
+        self.total = len(self.account_ids)
+        self.executor = ThreadPoolExecutor(max_workers=PORTFOLIO_MAX_WORKERS)
+        self.futures = []
+    
+    def start(self):
+        """Look every account up in the shared cache in one batch, then submit one fetch per account
+        
+        Each worker checks the token against its account before using what the
+        lookup found, so the checks run in parallel too.
+        """
+        # Resolve the shared transport and cache on the calling thread
+        transport = get_graph_transport()
+        cache = get_insights_cache()
+        access = get_account_access()
+        
+        # The periods never overlap, so one totals request per period is always cheapest
+        ranges = [(period['start_date'], period['end_date']) for period in self.periods]
+        keys = {
+            insights_cache_key(account_id, start, end, self.plan): (account_id, start, end)
+            for account_id in self.account_ids for start, end in ranges
+        }
+        cached = {account_id: {} for account_id in self.account_ids}
+        for key, entry in cache.get_many(list(keys)).items():
+            account_id, start, end = keys[key]
+            if not insights_refresh_due(end, entry['fetched_at']):
+                cached[account_id][(start, end)] = entry
+        
+        self.futures = [
+            self.executor.submit(
+                self.fetch_account, FacebookAPI(self.access_token, account_id, transport, cache, access), cached[account_id]
+            )
+            for account_id in self.account_ids
+        ]
+        self.executor.shutdown(wait=False)
+        return self
+    
+    def fetch_account(self, api, cached):
+        """Fetch the raw metrics of every period for one account; cached holds the shared cache's entries for its ranges"""
+        if self.cancel_event.is_set():
+            return
+        try:
+            # Rows another token fetched are only used once this token was checked against the account
+            if cached and not api.has_access():
+                cached = {}
+            account_data = {}
+            for period in self.periods:
+                entry = cached.get((period['start_date'], period['end_date']))
+                if entry is None:
+                    rows = api.get_insight_rows(period['start_date'], period['end_date'], self.plan, use_cache=False)
+                else:
+                    rows = entry['rows']
+                account_data[period['name']] = api.process_facebook_data(rows, self.plan['raw_metrics'])
+        except Exception as e:
+            self.errors[api.account_id] = str(e)
+            account_data = None
+        
+        if not self.cancel_event.is_set():
+            self.results.put((api.account_id, account_data))
+    
+    def cancel(self):
+        """Stop outstanding requests; in-flight responses are discarded"""
+        self.cancel_event.set()
+        for future in self.futures:
+            future.cancel()
+    
+    def drain(self):
+        """Return the account results that arrived since the last poll"""
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        self.completed += len(finished)
+        return finished
+    
+    def is_done(self):
+        """Whether every worker has finished and all results were drained"""
+        return all(future.done() for future in self.futures) and self.results.empty()
+
+def build_raw_matrix(account_data, period_name):
+    """Stack one period's raw metrics for every account into column arrays"""
+    account_ids = [account_id for account_id, data in account_data.items() if data]
+    raw = {}
+    for metric_key in RAW_METRICS:
+        raw[metric_key] = np.fromiter(
+            (float(account_data[account_id][period_name].get(metric_key, 0)) for account_id in account_ids),
+            dtype=np.float64,
+            count=len(account_ids)
+        )
+    return account_ids, raw
+
+def compute_all_metrics(raw):
+    """Compute every calculated metric for all accounts in one vectorized pass
+    
+    Returns values and a validity mask per metric; calculated metrics are only
+    valid where their denominator is positive, matching calculate_metric's 0.
+    """
+    size = len(next(iter(raw.values()))) if raw else 0
+    values = {}
+    valid = {}
+    for metric_key in DEFAULT_METRICS:
+        if metric_key in METRIC_FORMULAS:
+            numerator, denominator, scale = METRIC_FORMULAS[metric_key]
+            mask = raw[denominator] > 0
+            result = np.zeros(size, dtype=np.float64)
+            np.divide(raw[numerator] * scale, raw[denominator], out=result, where=mask)
+            values[metric_key] = result
+            valid[metric_key] = mask
+        else:
+            values[metric_key] = raw[metric_key]
+            valid[metric_key] = np.ones(size, dtype=bool)
+    return values, valid
+
+def compute_portfolio(account_data):
+    """Current values, previous values and week-over-week changes for every account and metric"""
+    account_ids, current_raw = build_raw_matrix(account_data, 'current')
+    _, previous_raw = build_raw_matrix(account_data, 'previous')
+    
+    current, current_valid = compute_all_metrics(current_raw)
+    previous, previous_valid = compute_all_metrics(previous_raw)
+    
+    change = {}
+    pct_change = {}
+    change_valid = {}
+    for metric_key in current:
+        both_valid = current_valid[metric_key] & previous_valid[metric_key]
+        change[metric_key] = current[metric_key] - previous[metric_key]
+        pct = np.zeros(len(account_ids), dtype=np.float64)
+        np.divide(change[metric_key] * 100, np.abs(previous[metric_key]), out=pct, where=both_valid & (previous[metric_key] != 0))
+        pct_change[metric_key] = pct
+        change_valid[metric_key] = both_valid
+    
+    return {
+        'account_ids': account_ids,
+        'current': current,
+        'current_valid': current_valid,
+        'previous': previous,
+        'change': change,
+        'pct_change': pct_change,
+        'change_valid': change_valid
+    }
+
+def rank_accounts(portfolio, metric_key, n=10, measure='current', largest=True):
+    """Top-N (or bottom-N) accounts for a metric using heap selection
+    
+    measure is 'current' for the value itself or 'change' / 'pct_change' for
+    week-over-week movement. Accounts where the metric is undefined are skipped.
+    """
+    values = portfolio[measure][metric_key]
+    mask = portfolio['current_valid' if measure == 'current' else 'change_valid'][metric_key]
+    candidates = np.flatnonzero(mask)
+    
+    select = heapq.nlargest if largest else heapq.nsmallest
+    chosen = select(n, candidates.tolist(), key=values.__getitem__)
+    
+    return [
+        {
+            'account_id': portfolio['account_ids'][i],
+            'current': float(portfolio['current'][metric_key][i]),
+            'previous': float(portfolio['previous'][metric_key][i]),
+            'change': float(portfolio['change'][metric_key][i]),
+            'pct_change': float(portfolio['pct_change'][metric_key][i])
+        }
+        for i in chosen
+    ]
@@ -0,0 +1,143 @@
+import cProfile
+import concurrent.futures
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Profiles are written here as <stamp>-<label>.prof (cProfile) and .collapsed (flame graph input)
+PROFILE_DIR = os.environ.get('DASHBOARD_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+
+# Threads only switch every sys.getswitchinterval() (5 ms) anyway, so sampling faster adds nothing
+SAMPLE_INTERVAL_SECONDS = 0.005
+PROFILE_TOP_FUNCTIONS = 20
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Sample the stacks of every running thread on a timer for collapsed-stack output"""
+    def __init__(self, interval=SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+    
+    def start(self):
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+    
+    def run(self):
+        sampler_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                # Root the stack at the thread so fetch workers show up beside the script thread
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+    
+    def write_collapsed(self, path):
+        """Write 'frame;frame;frame count' lines as consumed by flamegraph.pl and speedscope"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def summarize_stats(profile, limit=PROFILE_TOP_FUNCTIONS):
+    """Top functions by cumulative time as a list of dicts"""
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (calls, _, own_seconds, cumulative_seconds, _) in stats.stats.items():
+        rows.append({
+            'function': f"{name} ({os.path.basename(filename)}:{line})",
+            'calls': calls,
+            'own_seconds': own_seconds,
+            'cumulative_seconds': cumulative_seconds
+        })
+    rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+    return rows[:limit]
+
+def profile_call(func, label='rerun', background=None):
+    """Run func under cProfile and the stack sampler and save both outputs
+    
+    Returns (result, summary). The files are saved even if func raises, which
+    is how Streamlit ends a rerun that calls st.rerun() or st.stop(); the
+    exception is re-raised after saving, and summary is attached to it as
+    `profile_summary`.
+    
+    background, when given, is called once func is done and returns the
+    futures of work func started on other threads, such as a fetch job's
+    workers. The sampler keeps running until they finish, so the flame graph
+    covers them, and the .collapsed file is written then. cProfile only sees
+    the calling thread.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{label}")
+    
+    profile = cProfile.Profile()
+    sampler = StackSampler().start()
+    started = time.perf_counter()
+    result = None
+    try:
+        profile.enable()
+        try:
+            result = func()
+        finally:
+            profile.disable()
+    except BaseException as e:
+        e.profile_summary = save_profile(profile, sampler, base, time.perf_counter() - started, background)
+        raise
+    
+    return result, save_profile(profile, sampler, base, time.perf_counter() - started, background)
+
+def save_profile(profile, sampler, base, wall_seconds, background=None):
+    """Write the .prof file and summarize; the sampler's output follows once background work is done
+    
+    The summary is updated in place when the .collapsed file is written:
+    'background_seconds' is then set and 'sampling' turns False.
+    """
+    profile.dump_stats(base + '.prof')
+    summary = {
+        'stats_path': base + '.prof',
+        'collapsed_path': base + '.collapsed',
+        'wall_seconds': wall_seconds,
+        'background_seconds': None,
+        'sampling': True,
+        'samples': 0,
+        'top_functions': summarize_stats(profile)
+    }
+    futures = background() if background is not None else []
+    if futures:
+        threading.Thread(
+            target=finish_sampling, args=(sampler, base, summary, futures), name='profile-finisher', daemon=True
+        ).start()
+    else:
+        finish_sampling(sampler, base, summary, futures)
+    return summary
+
+def finish_sampling(sampler, base, summary, futures):
+    """Wait for background work, then stop the sampler and write the collapsed stacks"""
+    started = time.perf_counter()
+    concurrent.futures.wait(futures)
+    if futures:
+        summary['background_seconds'] = time.perf_counter() - started
+    sampler.stop()
+    sampler.write_collapsed(base + '.collapsed')
+    summary['samples'] = sampler.samples
+    summary['sampling'] = False
@@ -0,0 +1,204 @@
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from dashboard_core import DEFAULT_METRICS
+
+RAW_METRICS = [key for key, metric in DEFAULT_METRICS.items() if metric['type'] == 'raw']
+
+# Initial day capacity; arrays double when a new day falls past the end
+INITIAL_CAPACITY_DAYS = 64
+
+def parse_date(value):
+    # fromisoformat is several times faster than strptime on this hot path
+    return date.fromisoformat(value)
+
+class PrefixSumIndex:
+    """Cumulative daily raw metrics for one account, so any date range sums in O(1)
+    
+    Days are stored by offset from the earliest loaded day. sums[i] holds the
+    totals of days [0, i) and known[i] how many of those days were loaded, so a
+    range is covered when every one of its days is known. New days only
+    recompute the running sums from the earliest day that changed. fetched[i]
+    is when day i left the Graph API, 0 when unknown.
+    """
+    def __init__(self, metrics=None):
+        self.metrics = list(metrics or RAW_METRICS)
+        self.origin = None
+        self.days = 0
+        self.values = np.zeros((INITIAL_CAPACITY_DAYS, len(self.metrics)), dtype=np.float64)
+        self.present = np.zeros(INITIAL_CAPACITY_DAYS, dtype=bool)
+        self.sums = np.zeros((INITIAL_CAPACITY_DAYS + 1, len(self.metrics)), dtype=np.float64)
+        self.known = np.zeros(INITIAL_CAPACITY_DAYS + 1, dtype=np.int64)
+        self.fetched = np.zeros(INITIAL_CAPACITY_DAYS, dtype=np.float64)
+        self.version = None
+        self.lock = threading.Lock()
+    
+    def offset(self, day):
+        return (parse_date(day) - self.origin).days
+    
+    def grow(self, days, shift=0):
+        """Make room for days offsets, moving existing days right by shift"""
+        capacity = len(self.present)
+        if days <= capacity and not shift:
+            return
+        while capacity < days:
+            capacity *= 2
+        values = np.zeros((capacity, len(self.metrics)), dtype=np.float64)
+        present = np.zeros(capacity, dtype=bool)
+        sums = np.zeros((capacity + 1, len(self.metrics)), dtype=np.float64)
+        known = np.zeros(capacity + 1, dtype=np.int64)
+        fetched = np.zeros(capacity, dtype=np.float64)
+        values[shift:shift + self.days] = self.values[:self.days]
+        present[shift:shift + self.days] = self.present[:self.days]
+        fetched[shift:shift + self.days] = self.fetched[:self.days]
+        if not shift:
+            # Shifted sums are recomputed from the start by the caller
+            sums[:self.days + 1] = self.sums[:self.days + 1]
+            known[:self.days + 1] = self.known[:self.days + 1]
+        self.values = values
+        self.present = present
+        self.sums = sums
+        self.known = known
+        self.fetched = fetched
+    
+    def add_days(self, daily_data, start_date=None, end_date=None, fetched_at=None):
+        """Load {date: raw metrics}; days in start_date..end_date missing from it count as zero
+        
+        fetched_at stamps the loaded days; without it their stamps are left as they were.
+        """
+        dates = sorted(daily_data)
+        first = min(dates[:1] + ([start_date] if start_date else []), default=None)
+        last = max(dates[-1:] + ([end_date] if end_date else []), default=None)
+        if first is None:
+            return
+        
+        with self.lock:
+            dirty = 0
+            if self.origin is None:
+                self.origin = parse_date(first)
+            elif parse_date(first) < self.origin:
+                # Earlier days move every offset, so the sums are rebuilt from the start
+                shift = (self.origin - parse_date(first)).days
+                self.grow(self.days + shift, shift)
+                self.origin = parse_date(first)
+                self.days += shift
+            else:
+                # Days past the current end leave a gap that needs running sums too
+                dirty = min(self.offset(first), self.days)
+            
+            days = max(self.days, self.offset(last) + 1)
+            self.grow(days)
+            self.days = days
+            
+            if start_date and end_date:
+                span = slice(self.offset(start_date), self.offset(end_date) + 1)
+                self.values[span] = 0.0
+                self.present[span] = True
+                if fetched_at is not None:
+                    self.fetched[span] = fetched_at
+            for day in dates:
+                offset = self.offset(day)
+                self.values[offset] = [float(daily_data[day].get(metric_key, 0)) for metric_key in self.metrics]
+                self.present[offset] = True
+                if fetched_at is not None:
+                    self.fetched[offset] = fetched_at
+            
+            if dirty == 0:
+                self.sums[0] = 0.0
+                self.known[0] = 0
+            np.cumsum(self.values[dirty:self.days], axis=0, out=self.sums[dirty + 1:self.days + 1])
+            self.sums[dirty + 1:self.days + 1] += self.sums[dirty]
+            np.cumsum(self.present[dirty:self.days], out=self.known[dirty + 1:self.days + 1])
+            self.known[dirty + 1:self.days + 1] += self.known[dirty]
+    
+    def range_totals(self, start_date, end_date):
+        """Raw totals for an inclusive date range, or None unless every day is loaded"""
+        with self.lock:
+            if self.origin is None:
+                return None
+            start = self.offset(start_date)
+            end = self.offset(end_date) + 1
+            if start < 0 or end > self.days or start >= end:
+                return None
+            if self.known[end] - self.known[start] != end - start:
+                return None
+            return dict(zip(self.metrics, (self.sums[end] - self.sums[start]).tolist()))
+    
+    def range_fetched_at(self, start_date, end_date):
+        """When the oldest day of a fully loaded range was fetched, or None if unknown"""
+        with self.lock:
+            if self.origin is None:
+                return None
+            start = max(self.offset(start_date), 0)
+            end = min(self.offset(end_date) + 1, self.days)
+            if start >= end:
+                return None
+            oldest = float(self.fetched[start:end].min())
+            return oldest or None
+    
+    def daily_matrix(self):
+        """Dates (datetime64[D]) of every loaded day and a days x metrics array of their values"""
+        with self.lock:
+            if self.origin is None:
+                return np.array([], dtype='datetime64[D]'), np.zeros((0, len(self.metrics)))
+            loaded = np.flatnonzero(self.present[:self.days])
+            return np.datetime64(self.origin, 'D') + loaded, self.values[loaded].copy()
+    
+    def coverage(self):
+        """(first, last) loaded date, or None when empty"""
+        if self.origin is None:
+            return None
+        loaded = np.flatnonzero(self.present[:self.days])
+        return (
+            (self.origin + timedelta(days=int(loaded[0]))).strftime('%Y-%m-%d'),
+            (self.origin + timedelta(days=int(loaded[-1]))).strftime('%Y-%m-%d')
+        )
+
+class RangeIndexRegistry:
+    """One prefix-sum index per account, built from the Arrow store and kept current
+    
+    Fetches in this process add their days incrementally. When another
+    process appended to the store in between, the manifest version no longer
+    follows on and the account's index is rebuilt from the store on next use.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.indexes = {}
+    
+    def build(self, account_id):
+        """Load every stored day of an account, marking each segment's fetched span as known"""
+        index = PrefixSumIndex()
+        manifest = self.store.read_manifest(account_id)
+        if manifest['segments']:
+            first = min(segment['min_date'] for segment in manifest['segments'])
+            last = max(segment['max_date'] for segment in manifest['segments'])
+            # Newer segments stamp their span over older ones
+            for segment in manifest['segments']:
+                index.add_days({}, segment['min_date'], segment['max_date'], segment.get('fetched_at'))
+            index.add_days(self.store.get_daily(account_id, first, last))
+        index.version = manifest['version']
+        return index
+    
+    def get(self, account_id):
+        account_id = str(account_id)
+        version = self.store.read_manifest(account_id)['version']
+        with self.lock:
+            index = self.indexes.get(account_id)
+            if index is None or index.version != version:
+                index = self.build(account_id)
+                self.indexes[account_id] = index
+            return index
+    
+    def add_days(self, account_id, daily_data, start_date, end_date, version, fetched_at=None):
+        """Fold a fetch that was just appended to the store as manifest version `version`"""
+        account_id = str(account_id)
+        with self.lock:
+            index = self.indexes.get(account_id)
+            if index is None or version is None or index.version != version - 1:
+                # Not loaded yet or another writer got in between; get() rebuilds
+                return
+            index.add_days(daily_data, start_date, end_date, fetched_at)
+            index.version = version
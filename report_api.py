@@ -0,0 +1,179 @@
+import json
+import threading
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dashboard_core import PLATFORM_NAMES, calculate_metric
+
+# Local only: other tools on this host poll it, nothing outside should reach it
+REPORT_API_HOST = '127.0.0.1'
+
+def table_payload(workspace, table_key, snapshot, sequence):
+    """Raw and calculated metrics for one snapshot, calculated the same way as the dashboard"""
+    columns = [dict(column) for column in snapshot.columns]
+    metrics = {}
+    for metric_key, metric in snapshot.metrics.items():
+        values = {}
+        for column in columns:
+            if metric['type'] == 'calculated':
+                raw_data = {key: row[column['name']] for key, row in snapshot.data.items()}
+                values[column['name']] = calculate_metric(metric_key, raw_data)
+            else:
+                values[column['name']] = snapshot.data[metric_key][column['name']]
+        metrics[metric_key] = {
+            'name': metric['name'],
+            'type': metric['type'],
+            'format': metric['format'],
+            'values': values,
+            'sources': dict(snapshot.data_source.get(metric_key, {}))
+        }
+    return {
+        'workspace': workspace,
+        'table': table_key,
+        'platform': snapshot.platform,
+        'version': sequence,
+        'last_modified': snapshot.created_at.isoformat(),
+        'columns': columns,
+        'metrics': metrics,
+        'summary': snapshot.summary
+    }
+
+class ReportPublisher:
+    """Latest published snapshot per workspace table, readable from server threads without blocking writers
+    
+    Snapshots are immutable, so publishing is a reference swap under a short
+    lock and readers encode the JSON outside it. Each publish bumps a global
+    sequence number; the ETag pairs it with a nonce drawn per process, so a
+    tag kept from before a restart never matches new data.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.instance = uuid.uuid4().hex[:12]
+        self.sequence = 0
+        self.tables = {}
+        self.encoded = {}
+    
+    def publish(self, workspace, table_key, snapshot):
+        with self.lock:
+            current = self.tables.get((workspace, table_key))
+            if current is not None and current[0] is snapshot:
+                return current[1]
+            self.sequence += 1
+            self.tables[(workspace, table_key)] = (snapshot, self.sequence)
+            return self.sequence
+    
+    def get(self, workspace, table_key):
+        """(snapshot, sequence) for a workspace's table, or None"""
+        with self.lock:
+            return self.tables.get((workspace, table_key))
+    
+    def etag(self, sequence):
+        return f'"{self.instance}-{sequence}"'
+    
+    def workspaces(self):
+        with self.lock:
+            return sorted({workspace for workspace, _ in self.tables})
+    
+    def listing(self, workspace):
+        """Published tables of a workspace, or None when it published none"""
+        with self.lock:
+            published = {table_key: entry for (name, table_key), entry in self.tables.items() if name == workspace}
+        if not published:
+            return None
+        return {
+            table_key: {
+                'platform': snapshot.platform,
+                'version': sequence,
+                'etag': self.etag(sequence),
+                'last_modified': snapshot.created_at.isoformat()
+            }
+            for table_key, (snapshot, sequence) in published.items()
+        }
+    
+    def encode(self, workspace, table_key, snapshot, sequence):
+        """JSON body for a published version, encoded once and reused by every poller"""
+        with self.lock:
+            cached = self.encoded.get((workspace, table_key))
+        if cached is not None and cached[0] == sequence:
+            return cached[1]
+        body = json.dumps(table_payload(workspace, table_key, snapshot, sequence)).encode()
+        with self.lock:
+            # A slower encoder of an older version must not replace a newer body
+            current = self.encoded.get((workspace, table_key))
+            if current is None or current[0] < sequence:
+                self.encoded[(workspace, table_key)] = (sequence, body)
+        return body
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """GET /workspaces, /workspaces/<name>/tables and /workspaces/<name>/tables/<key>
+    
+    Only sessions that opened a workspace publish; a table reads as the last
+    version any of its sessions recorded. Tables answer ETag /
+    Last-Modified revalidation.
+    """
+    publisher = None
+    
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['workspaces']:
+            self.send_json(json.dumps({'workspaces': self.publisher.workspaces()}).encode())
+        elif len(parts) == 3 and parts[0] == 'workspaces' and parts[2] == 'tables':
+            listing = self.publisher.listing(parts[1])
+            if listing is None:
+                self.send_error(404, "Workspace has not published any tables")
+                return
+            self.send_json(json.dumps({'workspace': parts[1], 'tables': listing}).encode())
+        elif len(parts) == 4 and parts[0] == 'workspaces' and parts[2] == 'tables' and parts[3] in PLATFORM_NAMES:
+            published = self.publisher.get(parts[1], parts[3])
+            if published is None:
+                self.send_error(404, "Table has not been published yet")
+                return
+            snapshot, sequence = published
+            etag = self.publisher.etag(sequence)
+            last_modified = formatdate(snapshot.created_at.timestamp(), usegmt=True)
+            if self.not_modified(etag, snapshot.created_at.timestamp()):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                return
+            body = self.publisher.encode(parts[1], parts[3], snapshot, sequence)
+            self.send_json(body, {'ETag': etag, 'Last-Modified': last_modified})
+        else:
+            self.send_error(404)
+    
+    def not_modified(self, etag, modified_timestamp):
+        """Whether the client's cached copy is still current"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                # HTTP dates have one-second resolution
+                return int(modified_timestamp) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+    
+    def send_json(self, body, headers=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_report_api(publisher, port):
+    """Serve the publisher on a daemon thread; returns the server"""
+    handler = type('BoundReportRequestHandler', (ReportRequestHandler,), {'publisher': publisher})
+    server = ThreadingHTTPServer((REPORT_API_HOST, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='report-api', daemon=True).start()
+    return server
@@ -0,0 +1,185 @@
+import os
+import pickle
+import sys
+import threading
+import time
+from types import MappingProxyType
+
+from snapshots import freeze_mapping
+
+# Spill files for evicted sessions: <session_key>.pkl
+SPILL_DIR = os.environ.get('DASHBOARD_SPILL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'session_spill'))
+
+# Total estimated session memory before idle sessions are spilled early
+SESSION_MEMORY_CAP_MB = float(os.environ.get('DASHBOARD_SESSION_CAP_MB', 256))
+
+# Sessions idle this long are always spilled
+SESSION_IDLE_SECONDS = int(os.environ.get('DASHBOARD_SESSION_IDLE_SECONDS', 30 * 60))
+
+# Under memory pressure, sessions idle at least this long may be spilled
+SESSION_MIN_IDLE_SECONDS = 60
+
+# Spilled sessions that never come back are forgotten after a day
+SPILL_RETENTION_SECONDS = 24 * 60 * 60
+
+# Objects from these modules are walked attribute by attribute when sizing
+APP_MODULES = ('dashboard_core', 'snapshots', 'hourly', 'portfolio', 'sessions')
+
+def estimate_size(obj, seen=None):
+    """Approximate deep size in bytes, counting shared objects once
+    
+    Only containers and objects defined by this app are walked; anything else
+    (executors, sessions, locks) is counted shallowly since it is usually shared.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (dict, MappingProxyType)):
+        for key, value in obj.items():
+            size += estimate_size(key, seen) + estimate_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += estimate_size(item, seen)
+    elif type(obj).__module__ in APP_MODULES:
+        if hasattr(obj, '__dict__'):
+            size += estimate_size(vars(obj), seen)
+        for name in getattr(type(obj), '__slots__', ()):
+            size += estimate_size(getattr(obj, name, None), seen)
+    return size
+
+class SpillPickler(pickle.Pickler):
+    """Pickle frozen snapshot rows as plain dicts while keeping shared rows shared"""
+    def reducer_override(self, obj):
+        if type(obj) is MappingProxyType:
+            return freeze_mapping, (dict(obj),)
+        return NotImplemented
+
+class SessionRegistry:
+    """Process-wide record of each session's heavy state, size and last activity"""
+    def __init__(self, cap_mb=SESSION_MEMORY_CAP_MB, idle_seconds=SESSION_IDLE_SECONDS):
+        self.cap_bytes = int(cap_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.evictions = 0
+    
+    def touch(self, session_key, stores):
+        """Mark a session active, reloading its stores first if they were spilled; True if reloaded
+        
+        stores is a dict of name -> dict owned by the session (tables, histories).
+        They are spilled and reloaded in place, so the session keeps its references.
+        """
+        with self.lock:
+            entry = self.sessions.get(session_key)
+            reloaded = False
+            if entry is not None and entry['spilled']:
+                self.reload(session_key, entry)
+                reloaded = True
+            
+            self.sessions[session_key] = {
+                'stores': stores,
+                'size_bytes': entry['size_bytes'] if entry is not None else 0,
+                'last_seen': time.time(),
+                'spilled': False,
+                'busy': entry['busy'] if entry is not None else 0
+            }
+            return reloaded
+    
+    def hold(self, session_key):
+        """Keep a session from being spilled while one of its runs or fragments is working"""
+        with self.lock:
+            entry = self.sessions.get(session_key)
+            if entry is not None:
+                entry['busy'] += 1
+    
+    def release(self, session_key):
+        with self.lock:
+            entry = self.sessions.get(session_key)
+            if entry is not None and entry['busy']:
+                entry['busy'] -= 1
+                entry['last_seen'] = time.time()
+    
+    def update_size(self, session_key, size_bytes):
+        with self.lock:
+            entry = self.sessions.get(session_key)
+            if entry is not None:
+                entry['size_bytes'] = size_bytes
+    
+    def spill_path(self, session_key):
+        return os.path.join(SPILL_DIR, f"{session_key}.pkl")
+    
+    def spill(self, session_key, entry):
+        """Write a session's stores to disk and empty them in place"""
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        with open(self.spill_path(session_key), 'wb') as f:
+            SpillPickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(
+                {name: dict(store) for name, store in entry['stores'].items()}
+            )
+        for store in entry['stores'].values():
+            store.clear()
+        entry['spilled'] = True
+        entry['size_bytes'] = 0
+        self.evictions += 1
+    
+    def reload(self, session_key, entry):
+        """Refill a spilled session's stores from disk"""
+        path = self.spill_path(session_key)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        for name, store in entry['stores'].items():
+            store.update(saved.get(name, {}))
+        os.remove(path)
+    
+    def enforce(self, current_key=None):
+        """Spill idle sessions, oldest first, until under the cap; forget abandoned spills"""
+        now = time.time()
+        with self.lock:
+            for session_key, entry in list(self.sessions.items()):
+                idle = now - entry['last_seen']
+                if entry['spilled'] and idle >= SPILL_RETENTION_SECONDS:
+                    path = self.spill_path(session_key)
+                    if os.path.exists(path):
+                        os.remove(path)
+                    del self.sessions[session_key]
+                elif not entry['spilled'] and not entry['busy'] and session_key != current_key and idle >= self.idle_seconds:
+                    self.spill(session_key, entry)
+            
+            total = sum(entry['size_bytes'] for entry in self.sessions.values())
+            candidates = sorted(
+                (entry['last_seen'], session_key) for session_key, entry in self.sessions.items()
+                if not entry['spilled'] and not entry['busy'] and session_key != current_key
+                and now - entry['last_seen'] >= SESSION_MIN_IDLE_SECONDS
+            )
+            for _, session_key in candidates:
+                if total <= self.cap_bytes:
+                    break
+                entry = self.sessions[session_key]
+                total -= entry['size_bytes']
+                self.spill(session_key, entry)
+    
+    def get_stats(self):
+        """Per-session sizes and states for the admin view"""
+        now = time.time()
+        with self.lock:
+            rows = [
+                {
+                    'session': session_key,
+                    'size_bytes': entry['size_bytes'],
+                    'idle_seconds': now - entry['last_seen'],
+                    'spilled': entry['spilled']
+                }
+                for session_key, entry in self.sessions.items()
+            ]
+        rows.sort(key=lambda row: row['size_bytes'], reverse=True)
+        return {
+            'sessions': rows,
+            'total_bytes': sum(row['size_bytes'] for row in rows),
+            'cap_bytes': self.cap_bytes,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,349 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from workspace import TABLE_FIELDS, WORKSPACE_NAME_PATTERN, apply_entry
+
+# Idle connections kept for reuse; busier moments open extra short-lived ones
+POOL_SIZE = 16
+
+# A writer waits this long for another writer's transaction before failing
+BUSY_TIMEOUT_SECONDS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspace_tables (
+    workspace TEXT NOT NULL,
+    table_key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    platform TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    metrics TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    extra TEXT NOT NULL,
+    layout_version INTEGER NOT NULL,
+    summary_version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (workspace, table_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS workspace_cells (
+    workspace TEXT NOT NULL,
+    table_key TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    value NOT NULL,
+    source TEXT NOT NULL,
+    fetched_at REAL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (workspace, table_key, metric, column_name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS workspace_cells_version ON workspace_cells (workspace, table_key, version);
+"""
+
+TABLE_COLUMNS = 'version, platform, columns, metrics, summary, extra, layout_version, summary_version, updated_at'
+
+def load_table_row(row):
+    """workspace_tables row -> dict with its JSON fields decoded"""
+    version, platform, columns, metrics, summary, extra, layout_version, summary_version, updated_at = row
+    return {
+        'version': version,
+        'platform': platform,
+        'columns': json.loads(columns),
+        'metrics': json.loads(metrics),
+        'summary': summary,
+        'extra': json.loads(extra),
+        'layout_version': layout_version,
+        'summary_version': summary_version,
+        'updated_at': updated_at
+    }
+
+def read_table(conn, workspace, table_key, state):
+    """Assemble a full table from its row state and cells"""
+    names = [column['name'] for column in state['columns']]
+    table = dict(
+        state['extra'],
+        platform=state['platform'],
+        columns=state['columns'],
+        metrics=state['metrics'],
+        data={metric_key: {name: 0.0 for name in names} for metric_key in state['metrics']},
+        data_source={metric_key: {name: 'manual' for name in names} for metric_key in state['metrics']},
+        summary=state['summary']
+    )
+    table['fetched_at'] = {}
+    cells = conn.execute(
+        'SELECT metric, column_name, value, source, fetched_at FROM workspace_cells WHERE workspace = ? AND table_key = ?',
+        (workspace, table_key)
+    )
+    for metric_key, column_name, value, source, fetched_at in cells:
+        if column_name in table['data'].get(metric_key, {}):
+            table['data'][metric_key][column_name] = value
+            table['data_source'][metric_key][column_name] = source
+            if fetched_at is not None:
+                table['fetched_at'].setdefault(metric_key, {})[column_name] = fetched_at
+    return table
+
+def read_changes(conn, workspace, versions):
+    """Entries bringing tables at versions ({table_key: version}) up to date, and the new versions
+    
+    A table the caller has not seen, or whose columns or metrics changed,
+    comes back whole; otherwise only the summary and cells written since.
+    """
+    entries = []
+    current = {}
+    rows = conn.execute(
+        'SELECT table_key, version, layout_version, summary_version FROM workspace_tables WHERE workspace = ?', (workspace,)
+    )
+    for table_key, version, layout_version, summary_version in rows.fetchall():
+        since = versions.get(table_key, 0)
+        current[table_key] = version
+        if version <= since:
+            continue
+        if since == 0 or layout_version > since:
+            row = conn.execute(
+                f'SELECT {TABLE_COLUMNS} FROM workspace_tables WHERE workspace = ? AND table_key = ?', (workspace, table_key)
+            ).fetchone()
+            entries.append({'table': table_key, 'op': 'table', 'value': read_table(conn, workspace, table_key, load_table_row(row))})
+            continue
+        if summary_version > since:
+            summary = conn.execute(
+                'SELECT summary FROM workspace_tables WHERE workspace = ? AND table_key = ?', (workspace, table_key)
+            ).fetchone()[0]
+            entries.append({'table': table_key, 'op': 'summary', 'value': summary})
+        cells = conn.execute(
+            'SELECT metric, column_name, value, source, fetched_at FROM workspace_cells '
+            'WHERE workspace = ? AND table_key = ? AND version > ?',
+            (workspace, table_key, since)
+        ).fetchall()
+        if cells:
+            entries.append({'table': table_key, 'op': 'cells', 'value': [list(cell) for cell in cells]})
+    return entries, current
+
+def write_cells(conn, workspace, table_key, cells, version):
+    conn.executemany(
+        'INSERT INTO workspace_cells (workspace, table_key, metric, column_name, value, source, fetched_at, version) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (workspace, table_key, metric, column_name) '
+        'DO UPDATE SET value = excluded.value, source = excluded.source, fetched_at = excluded.fetched_at, version = excluded.version',
+        [(workspace, table_key, metric_key, column_name, value, source, fetched_at, version) for metric_key, column_name, value, source, fetched_at in cells]
+    )
+
+def table_cells(table):
+    fetched = table.get('fetched_at', {})
+    return [
+        [
+            metric_key, column_name, value, table['data_source'].get(metric_key, {}).get(column_name, 'manual'),
+            fetched.get(metric_key, {}).get(column_name)
+        ]
+        for metric_key, row in table['data'].items()
+        for column_name, value in row.items()
+    ]
+
+def write_table_ops(conn, workspace, table_key, ops, since):
+    """Apply one table's ops from a session that last saw it at version since; returns conflicts
+    
+    A cell, summary or layout that another session wrote after since is left
+    as they wrote it unless this session wrote the same thing.
+    """
+    row = conn.execute(
+        f'SELECT {TABLE_COLUMNS} FROM workspace_tables WHERE workspace = ? AND table_key = ?', (workspace, table_key)
+    ).fetchone()
+    state = load_table_row(row) if row else None
+    version = (state['version'] if state else 0) + 1
+    conflicts = []
+    wrote = False
+    for op, value in ops:
+        if op in ('create', 'table'):
+            if state is not None and (op == 'create' or state['version'] > since):
+                # A table someone else created first comes back to the session as theirs
+                if op == 'table':
+                    conflicts.append({'table': table_key, 'part': 'table'})
+                continue
+            state = {
+                'version': version,
+                'platform': value['platform'],
+                'columns': value['columns'],
+                'metrics': value['metrics'],
+                'summary': value['summary'],
+                'extra': {key: item for key, item in value.items() if key not in TABLE_FIELDS},
+                'layout_version': version,
+                'summary_version': version
+            }
+            conn.execute('DELETE FROM workspace_cells WHERE workspace = ? AND table_key = ?', (workspace, table_key))
+            write_cells(conn, workspace, table_key, table_cells(value), version)
+            wrote = True
+        elif state is None:
+            continue
+        elif op in ('columns', 'metrics', 'summary'):
+            part_version = state['summary_version' if op == 'summary' else 'layout_version']
+            if part_version > since and state[op] != value:
+                conflicts.append({'table': table_key, 'part': op})
+                continue
+            state[op] = value
+            state['summary_version' if op == 'summary' else 'layout_version'] = version
+            if op != 'summary':
+                # Cells of removed columns or metrics go with them
+                names = [column['name'] for column in state['columns']]
+                conn.execute(
+                    f"DELETE FROM workspace_cells WHERE workspace = ? AND table_key = ? "
+                    f"AND (column_name NOT IN ({','.join('?' * len(names))}) "
+                    f"OR metric NOT IN ({','.join('?' * len(state['metrics']))}))",
+                    [workspace, table_key] + names + list(state['metrics'])
+                )
+            wrote = True
+        elif op == 'cells':
+            names = {column['name'] for column in state['columns']}
+            written = []
+            for metric_key, column_name, cell, source, *stamp in value:
+                fetched_at = stamp[0] if stamp else None
+                # Cells of a column or metric whose layout change conflicted are dropped
+                if metric_key not in state['metrics'] or column_name not in names:
+                    continue
+                current = conn.execute(
+                    'SELECT value, source, version, fetched_at FROM workspace_cells '
+                    'WHERE workspace = ? AND table_key = ? AND metric = ? AND column_name = ?',
+                    (workspace, table_key, metric_key, column_name)
+                ).fetchone()
+                if current is not None and current[2] > since and source == current[1] == 'api':
+                    # Two refreshes of the same cell: the later fetch wins, nobody's edit is lost
+                    if (current[3] or 0) >= (fetched_at or 0):
+                        continue
+                elif current is not None and current[2] > since and (current[0], current[1]) != (cell, source):
+                    conflicts.append({
+                        'table': table_key,
+                        'part': 'cell',
+                        'metric': metric_key,
+                        'column': column_name,
+                        'yours': cell,
+                        'theirs': current[0]
+                    })
+                    continue
+                written.append([metric_key, column_name, cell, source, fetched_at])
+            if written:
+                write_cells(conn, workspace, table_key, written, version)
+                wrote = True
+    
+    if wrote:
+        conn.execute(
+            'INSERT OR REPLACE INTO workspace_tables (workspace, table_key, version, platform, columns, metrics, '
+            'summary, extra, layout_version, summary_version, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                workspace, table_key, version, state['platform'], json.dumps(state['columns']),
+                json.dumps(state['metrics']), state['summary'], json.dumps(state['extra']),
+                state['layout_version'], state['summary_version'], time.time()
+            )
+        )
+    return conflicts
+
+class SharedWorkspaceStore:
+    """Workspaces in one SQLite database in WAL mode, shared by every session and server process
+    
+    Readers never block the writer, and each save is one short IMMEDIATE
+    transaction. Every table row carries a version; cells, summaries and
+    layouts record the version that last wrote them, so a session's save only
+    conflicts where someone else changed the same thing since it last synced.
+    synchronous=NORMAL drops the fsync per commit: an app crash loses nothing,
+    a power cut at most the writes since the last WAL checkpoint.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.pool = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.workspaces = {}
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            # Databases created before cells carried their fetch time
+            if 'fetched_at' not in [column[1] for column in conn.execute('PRAGMA table_info(workspace_cells)')]:
+                conn.execute('ALTER TABLE workspace_cells ADD COLUMN fetched_at REAL')
+    
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        finally:
+            if self.pool.qsize() < POOL_SIZE:
+                self.pool.put(conn)
+            else:
+                conn.close()
+    
+    @contextmanager
+    def transaction(self, write=False):
+        """One transaction on a pooled connection; write takes the write lock up front
+        
+        Writers in this process queue on a thread lock, so SQLite's busy
+        backoff (which sleeps) only comes into play between processes.
+        """
+        with self.write_lock if write else nullcontext():
+            with self.connection() as conn:
+                conn.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+    
+    def get(self, name):
+        if not WORKSPACE_NAME_PATTERN.match(name):
+            raise ValueError("Workspace names use letters, digits, '-' and '_' only (up to 64)")
+        with self.lock:
+            workspace = self.workspaces.get(name)
+            if workspace is None:
+                workspace = SharedWorkspace(self, name)
+                self.workspaces[name] = workspace
+            return workspace
+
+class SharedWorkspace:
+    """Session-facing view of one workspace in the shared store"""
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+    
+    def checkout(self):
+        """All of the workspace's tables and their versions"""
+        with self.store.transaction() as conn:
+            entries, versions = read_changes(conn, self.name, {})
+        tables = {}
+        for entry in entries:
+            apply_entry(tables, entry)
+        return tables, versions
+    
+    def commit(self, changes, versions):
+        """Save {table_key: ops} from a session whose tables are at versions
+        
+        Returns (versions, entries, conflicts): the session's new versions,
+        entries bringing its tables up to date with everyone's writes
+        (including the values that won its conflicts), and the conflicts.
+        """
+        with self.store.transaction(write=True) as conn:
+            conflicts = []
+            for table_key, ops in changes.items():
+                conflicts += write_table_ops(conn, self.name, table_key, ops, versions.get(table_key, 0))
+            entries, versions = read_changes(conn, self.name, versions)
+        return versions, entries, conflicts
+    
+    def changes_since(self, versions):
+        """Entries for what other sessions saved since versions, and the new versions"""
+        with self.store.transaction() as conn:
+            return read_changes(conn, self.name, versions)
+    
+    def describe(self):
+        return "shared with every session using this workspace"
+    
+    def get_stats(self):
+        with self.store.connection() as conn:
+            tables, saved_at = conn.execute(
+                'SELECT COUNT(*), MAX(updated_at) FROM workspace_tables WHERE workspace = ?', (self.name,)
+            ).fetchone()
+        return {'tables': tables, 'pending': 0, 'saved_at': saved_at}
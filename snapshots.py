@@ -0,0 +1,172 @@
+from datetime import datetime
+from types import MappingProxyType
+
+# Undo depth kept per table; labelled snapshots are never pruned
+MAX_UNDO_VERSIONS = 100
+
+_MISSING = object()
+
+def freeze_mapping(mapping, parent=None):
+    """Return an immutable copy of a flat dict, reusing the parent's copy when nothing changed"""
+    if parent is not None and len(parent) == len(mapping):
+        if all(parent.get(key, _MISSING) == value for key, value in mapping.items()):
+            return parent
+    return MappingProxyType(dict(mapping))
+
+def freeze_nested(mapping, parent=None):
+    """Freeze a dict of flat dicts row by row so unchanged rows are shared"""
+    rows = parent if parent is not None else {}
+    frozen = {key: freeze_mapping(row, rows.get(key)) for key, row in mapping.items()}
+    # Keep the parent container itself when every row was shared
+    if parent is not None and len(frozen) == len(parent) and all(frozen[key] is parent[key] for key in frozen):
+        return parent
+    return MappingProxyType(frozen)
+
+class TableSnapshot:
+    """Immutable version of a platform table that shares unchanged rows with its parent"""
+    __slots__ = ('version', 'label', 'sent', 'created_at', 'platform', 'columns',
+                 'metrics', 'data', 'data_source', 'fetched_at', 'summary')
+    
+    def __init__(self, table, version, parent=None, label='', sent=False):
+        parent_columns = {column['name']: column for column in parent.columns} if parent else {}
+        
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'label', label)
+        object.__setattr__(self, 'sent', sent)
+        object.__setattr__(self, 'created_at', datetime.now())
+        object.__setattr__(self, 'platform', table['platform'])
+        object.__setattr__(self, 'columns', tuple(
+            freeze_mapping(column, parent_columns.get(column['name'])) for column in table['columns']
+        ))
+        object.__setattr__(self, 'metrics', freeze_nested(table['metrics'], parent.metrics if parent else None))
+        object.__setattr__(self, 'data', freeze_nested(table['data'], parent.data if parent else None))
+        object.__setattr__(self, 'data_source', freeze_nested(table['data_source'], parent.data_source if parent else None))
+        object.__setattr__(self, 'fetched_at', freeze_nested(table.get('fetched_at', {}), parent.fetched_at if parent else None))
+        object.__setattr__(self, 'summary', table['summary'])
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("TableSnapshot is immutable")
+    
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    def __setstate__(self, state):
+        # Unpickling (session spill reload) bypasses the immutability guard
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+    
+    def same_content(self, other):
+        """Whether two snapshots hold the same table, using shared rows as a shortcut
+        
+        A refetch that only moved fetch times is not a new version.
+        """
+        return (
+            other is not None
+            and self.summary == other.summary
+            and self.columns == other.columns
+            and self.metrics is other.metrics
+            and self.data is other.data
+            and self.data_source is other.data_source
+        )
+    
+    def to_table(self):
+        """Thaw the snapshot into a mutable table dict (one shallow copy per row)"""
+        return {
+            'platform': self.platform,
+            'columns': [dict(column) for column in self.columns],
+            'metrics': {key: dict(metric) for key, metric in self.metrics.items()},
+            'data': {key: dict(row) for key, row in self.data.items()},
+            'data_source': {key: dict(row) for key, row in self.data_source.items()},
+            'fetched_at': {key: dict(row) for key, row in self.fetched_at.items()},
+            'summary': self.summary
+        }
+
+def diff_snapshots(old, new):
+    """List the cells whose values differ between two snapshots"""
+    changes = []
+    for metric_key in list(new.data.keys()) + [k for k in old.data.keys() if k not in new.data]:
+        new_row = new.data.get(metric_key, {})
+        old_row = old.data.get(metric_key, {})
+        # Shared rows are unchanged by construction
+        if new_row is old_row:
+            continue
+        for column_name in list(new_row.keys()) + [c for c in old_row.keys() if c not in new_row]:
+            old_value = old_row.get(column_name)
+            new_value = new_row.get(column_name)
+            if old_value != new_value:
+                changes.append({
+                    'metric': metric_key,
+                    'column': column_name,
+                    'old': old_value,
+                    'new': new_value,
+                    'source': new.data_source.get(metric_key, {}).get(column_name)
+                })
+    return changes
+
+class SnapshotHistory:
+    """Versioned snapshot chain for one table with undo/redo and sent-report markers"""
+    def __init__(self, table):
+        self.next_version = 0
+        self.versions = []
+        self.undo_stack = []
+        self.cursor = -1
+        self.commit(table, label='Initial')
+    
+    @property
+    def head(self):
+        return self.undo_stack[self.cursor] if self.cursor >= 0 else None
+    
+    def commit(self, table, label='', sent=False):
+        """Record the table as a new version if it changed; returns the head snapshot"""
+        head = self.head
+        snapshot = TableSnapshot(table, self.next_version, head, label, sent)
+        if snapshot.same_content(head) and not label and not sent:
+            return head
+        
+        self.next_version += 1
+        self.versions.append(snapshot)
+        
+        # A new edit after undo drops the redo branch
+        del self.undo_stack[self.cursor + 1:]
+        self.undo_stack.append(snapshot)
+        self.cursor = len(self.undo_stack) - 1
+        self.prune()
+        return snapshot
+    
+    def prune(self):
+        """Bound the undo depth, keeping labelled snapshots"""
+        if len(self.undo_stack) > MAX_UNDO_VERSIONS:
+            dropped = len(self.undo_stack) - MAX_UNDO_VERSIONS
+            del self.undo_stack[:dropped]
+            self.cursor -= dropped
+        
+        reachable = {id(snapshot) for snapshot in self.undo_stack}
+        self.versions = [
+            snapshot for snapshot in self.versions
+            if snapshot.label or snapshot.sent or id(snapshot) in reachable
+        ]
+    
+    def can_undo(self):
+        return self.cursor > 0
+    
+    def can_redo(self):
+        return self.cursor < len(self.undo_stack) - 1
+    
+    def undo(self):
+        """Step back one version and return it"""
+        if self.can_undo():
+            self.cursor -= 1
+        return self.head
+    
+    def redo(self):
+        """Step forward one version and return it"""
+        if self.can_redo():
+            self.cursor += 1
+        return self.head
+    
+    def last_sent(self):
+        """Most recent snapshot marked as sent"""
+        for snapshot in reversed(self.versions):
+            if snapshot.sent:
+                return snapshot
+        return None
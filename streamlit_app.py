@@ -1,8 +1,46 @@
 import streamlit as st
-import pandas as pd
+import math
+import os
+import time
 from datetime import datetime, timedelta
-import requests
-import json
+
+from dashboard_core import (
+    DEFAULT_METRICS,
+    FETCH_POLL_SECONDS,
+    PLATFORM_NAMES,
+    apply_fetched_column,
+    apply_hourly_totals,
+    apply_imported_daily,
+    apply_indexed_totals,
+    build_export_csv,
+    build_export_workbook,
+    calculate_metric,
+    clear_table_widget_state,
+    create_initial_table,
+    diff_against_last_sent,
+    fetch_facebook_data,
+    format_age,
+    format_value,
+    get_graph_transport,
+    get_insights_store,
+    get_range_index,
+    get_table_history,
+    get_facebook_api,
+    get_workspaces,
+    initialize_tables,
+    insights_refresh_due,
+    open_session_workspace,
+    record_table_version,
+    redate_facebook_columns,
+    refresh_stale_facebook_data,
+    render_facebook_fetch_progress,
+    request_profile,
+    restore_table_version,
+    run_main,
+    save_fragment_edits,
+    session_fragment,
+    update_facebook_data_from_api
+)
 
 # Page config with Salesforce-inspired styling
 st.set_page_config(
@@ -186,6 +224,11 @@ st.markdown("""
         position: relative;
     }
     
+    .sf-table-import {
+        background: #f3ecfb !important;
+        position: relative;
+    }
+    
     /* Sidebar styling */
     .css-1d391kg {
         background-color: #f8f9fa;
@@ -242,6 +285,18 @@ st.markdown("""
         font-weight: 500;
     }
     
+    .status-import {
+        display: inline-flex;
+        align-items: center;
+        gap: 0.25rem;
+        background: #f3ecfb;
+        color: #7526e3;
+        padding: 0.25rem 0.5rem;
+        border-radius: 12px;
+        font-size: 0.75rem;
+        font-weight: 500;
+    }
+    
     .status-manual {
         display: inline-flex;
         align-items: center;
@@ -332,6 +387,43 @@ st.markdown("""
         gap: 0.5rem;
     }
     
+    /* Period changes and anomaly flags */
+    .trend-good {
+        color: #2e844a;
+        font-weight: 500;
+    }
+    
+    .trend-bad {
+        color: #c23934;
+        font-weight: 500;
+    }
+    
+    .trend-flat {
+        color: #706e6b;
+    }
+    
+    .anomaly-flag {
+        display: inline-block;
+        background: #fef1ee;
+        color: #c23934;
+        border: 1px solid #c23934;
+        padding: 0 0.35rem;
+        border-radius: 10px;
+        font-size: 0.65rem;
+        font-weight: 700;
+    }
+    
+    /* Age of API values; stale ones are being refetched */
+    .cell-age {
+        display: block;
+        color: #706e6b;
+        font-size: 0.65rem;
+    }
+    
+    .cell-age-stale {
+        color: #b8860b;
+    }
+    
     /* Success/Error messages */
     .success-message {
         background: #e8f7ea;
@@ -401,264 +493,923 @@ if 'active_table' not in st.session_state:
 if 'facebook_credentials' not in st.session_state:
     st.session_state.facebook_credentials = {'token': '', 'account_id': ''}
 
-# Default metrics with calculation formulas
-DEFAULT_METRICS = {
-    # Raw metrics (from APIs or manual input)
-    'spend': {'name': 'Spend', 'type': 'raw', 'format': 'currency'},
-    'impressions': {'name': 'Impressions', 'type': 'raw', 'format': 'number'},
-    'clicks': {'name': 'Clicks', 'type': 'raw', 'format': 'number'},
-    'add_to_cart': {'name': 'Add to Cart', 'type': 'raw', 'format': 'number'},
-    'checkout': {'name': 'Checkout', 'type': 'raw', 'format': 'number'},
-    'purchase': {'name': 'Purchases', 'type': 'raw', 'format': 'number'},
-    'purchase_revenue': {'name': 'Purchase Revenue', 'type': 'raw', 'format': 'currency'},
-    
-    # Calculated metrics
-    'ctr': {'name': 'CTR', 'type': 'calculated', 'format': 'percentage'},
-    'cpm': {'name': 'CPM', 'type': 'calculated', 'format': 'currency'},
-    'cpc': {'name': 'CPC', 'type': 'calculated', 'format': 'currency'},
-    'atc_rate': {'name': 'Add to Cart Rate', 'type': 'calculated', 'format': 'percentage'},
-    'checkout_rate': {'name': 'Checkout Rate', 'type': 'calculated', 'format': 'percentage'},
-    'purchase_rate': {'name': 'Purchase Rate', 'type': 'calculated', 'format': 'percentage'},
-    'click_to_purchase': {'name': 'Click to Purchase Rate', 'type': 'calculated', 'format': 'percentage'},
-    'roas': {'name': 'ROAS', 'type': 'calculated', 'format': 'ratio'},
-    'cost_per_purchase': {'name': 'Cost per Purchase', 'type': 'calculated', 'format': 'currency'}
-}
+def toggle_section(section):
+    """Flip the visibility of a dashboard section"""
+    st.session_state.section_visibility[section] = not st.session_state.section_visibility[section]
 
-def format_value(value, format_type):
-    """Format value based on type"""
-    if value is None or pd.isna(value):
-        return 'N/A'
-    
-    try:
-        value = float(value)
-        if format_type == 'currency':
-            return f"${value:,.2f}"
-        elif format_type == 'percentage':
-            return f"{value:.2f}%"
-        elif format_type == 'ratio':
-            return f"{value:.2f}x"
-        elif format_type == 'number':
-            return f"{int(value):,}"
-        else:
-            return str(value)
-    except:
-        return 'N/A'
+def render_section_header(title, section):
+    """Render a section title with its Show/Hide toggle"""
+    col1, col2 = st.columns([6, 1])
+    with col1:
+        st.markdown(f"### {title}")
+    with col2:
+        st.button("Show/Hide", key=f"toggle_{section}", on_click=toggle_section, args=(section,))
 
-def calculate_metric(metric_key, raw_data):
-    """Calculate metric based on raw data"""
-    try:
-        spend = float(raw_data.get('spend', 0))
-        impressions = float(raw_data.get('impressions', 0))
-        clicks = float(raw_data.get('clicks', 0))
-        add_to_cart = float(raw_data.get('add_to_cart', 0))
-        checkout = float(raw_data.get('checkout', 0))
-        purchase = float(raw_data.get('purchase', 0))
-        purchase_revenue = float(raw_data.get('purchase_revenue', 0))
-        
-        if metric_key == 'ctr':
-            return (clicks / impressions * 100) if impressions > 0 else 0
-        elif metric_key == 'cpm':
-            return (spend / impressions * 1000) if impressions > 0 else 0
-        elif metric_key == 'cpc':
-            return (spend / clicks) if clicks > 0 else 0
-        elif metric_key == 'atc_rate':
-            return (add_to_cart / clicks * 100) if clicks > 0 else 0
-        elif metric_key == 'checkout_rate':
-            return (checkout / add_to_cart * 100) if add_to_cart > 0 else 0
-        elif metric_key == 'purchase_rate':
-            return (purchase / checkout * 100) if checkout > 0 else 0
-        elif metric_key == 'click_to_purchase':
-            return (purchase / clicks * 100) if clicks > 0 else 0
-        elif metric_key == 'roas':
-            return (purchase_revenue / spend) if spend > 0 else 0
-        elif metric_key == 'cost_per_purchase':
-            return (spend / purchase) if purchase > 0 else 0
-        else:
-            return float(raw_data.get(metric_key, 0))
-    except:
-        return 0
+# Columns and metrics drawn at once; the window controls page through the rest
+TABLE_PAGE_COLUMNS = 8
+TABLE_PAGE_METRICS = 20
 
-class FacebookAPI:
-    def __init__(self, access_token, account_id):
-        self.access_token = access_token
-        self.account_id = account_id
-        self.base_url = "https://graph.facebook.com/v18.0"
-    
-    def get_insights(self, start_date, end_date):
-        """Fetch Facebook Ads insights for specific date range"""
-        
-        # Define the fields we want
-        fields = [
-            'spend',
-            'impressions', 
-            'clicks',
-            'cpm',
-            'cpc', 
-            'ctr',
-            'actions',
-            'action_values'
-        ]
-        
-        params = {
-            'access_token': self.access_token,
-            'fields': ','.join(fields),
-            'time_range': json.dumps({
-                'since': start_date,
-                'until': end_date
-            }),
-            'level': 'account',
-            'time_increment': 1
-        }
+def window_start(total, page_size, state_key, from_end):
+    """First visible index (0-based); a fresh window shows the last page of columns or the first of metrics"""
+    last_start = max(total - page_size, 0)
+    first = st.session_state.get(state_key)
+    if first is None:
+        return last_start if from_end else 0
+    return min(max(first - 1, 0), last_start)
+
+def column_window(table_key):
+    """(start, stop) of the visible columns"""
+    total = len(st.session_state.tables[table_key]['columns'])
+    start = window_start(total, TABLE_PAGE_COLUMNS, f"column_window_{table_key}", True)
+    return start, min(start + TABLE_PAGE_COLUMNS, total)
+
+def metric_window(table_key):
+    """(start, stop) of the visible metrics"""
+    total = len(st.session_state.tables[table_key]['metrics'])
+    start = window_start(total, TABLE_PAGE_METRICS, f"metric_window_{table_key}", False)
+    return start, min(start + TABLE_PAGE_METRICS, total)
+
+def render_window_slider(label, total, page_size, state_key, from_end):
+    """Slider over the first visible item, shown only when everything does not fit on one page"""
+    if total <= page_size:
+        st.session_state.pop(state_key, None)
+        return
+    last_first = total - page_size + 1
+    # Seed a fresh window and keep a stored one valid after columns or metrics were removed
+    st.session_state[state_key] = window_start(total, page_size, state_key, from_end) + 1
+    st.slider(
+        label,
+        min_value=1,
+        max_value=last_first,
+        key=state_key,
+        help=f"Showing {page_size} of {total}; slide to page through the rest"
+    )
+
+def render_table_window_controls(table_key):
+    """Paging sliders for tables with more columns or metrics than fit on one page"""
+    current_table = st.session_state.tables[table_key]
+    if len(current_table['columns']) <= TABLE_PAGE_COLUMNS and len(current_table['metrics']) <= TABLE_PAGE_METRICS:
+        return
+    col1, col2 = st.columns(2)
+    with col1:
+        render_window_slider(
+            "First visible period", len(current_table['columns']), TABLE_PAGE_COLUMNS, f"column_window_{table_key}", True
+        )
+    with col2:
+        render_window_slider(
+            "First visible metric", len(current_table['metrics']), TABLE_PAGE_METRICS, f"metric_window_{table_key}", False
+        )
+
+def build_trend_html(trends, row, col, format_type):
+    """Change against the previous column plus an anomaly badge for one cell"""
+    from trends import ANOMALY_WINDOW
+    
+    trend_html = ""
+    delta = float(trends['delta'][row, col])
+    if not math.isnan(delta):
+        pct = float(trends['pct'][row, col])
+        css_class = {1: 'trend-good', -1: 'trend-bad'}.get(int(trends['direction'][row, col]), 'trend-flat')
+        arrow = "▲" if delta > 0 else "▼" if delta < 0 else "="
+        sign = "+" if delta > 0 else "-" if delta < 0 else ""
+        text = f"{arrow} {sign}{format_value(abs(delta), format_type)}"
+        if not math.isnan(pct):
+            text += f" ({pct:+.1f}%)"
+        trend_html += f"<br><small class='{css_class}'>{text}</small>"
+    if trends['flags'][row, col]:
+        score = float(trends['score'][row, col])
+        trend_html += f" <span class='anomaly-flag' title='z = {score:+.1f} against the previous {ANOMALY_WINDOW} periods'>ANOMALY</span>"
+    return trend_html
+
+def build_table_html(current_table, trends=None, column_range=None, metric_range=None):
+    """Build the HTML for the performance data table, with per-cell changes when trends are given
+    
+    column_range and metric_range are (start, stop) windows; only those
+    cells are rendered so wide tables cost the same as a page of them.
+    """
+    column_start, column_stop = column_range or (0, len(current_table['columns']))
+    metric_start, metric_stop = metric_range or (0, len(current_table['metrics']))
+    columns = current_table['columns'][column_start:column_stop]
+    metrics = list(current_table['metrics'].items())[metric_start:metric_stop]
+    fetched = current_table.get('fetched_at', {})
+    now = time.time()
+    table_html = "<table class='sf-table'>"
+    
+    # Header row
+    table_html += "<tr>"
+    table_html += "<th style='text-align: left; min-width: 200px;'>Metric</th>"
+    
+    for column in columns:
+        table_html += f"<th style='text-align: center; min-width: 150px;'>"
+        table_html += f"<strong>{column['name']}</strong><br>"
+        table_html += f"<small style='color: #706e6b; font-weight: normal;'>{column['display_name']}</small></th>"
+    
+    table_html += "</tr>"
+    
+    # Data rows
+    for row, (metric_key, metric) in enumerate(metrics, start=metric_start):
+        if metric['type'] == 'calculated':
+            row_class = "sf-table-calculated"
+            metric_icon = " (Calc)"
+        else:
+            row_class = ""
+            metric_icon = ""
         
-        url = f"{self.base_url}/act_{self.account_id}/insights"
+        table_html += f"<tr class='{row_class}'>"
+        table_html += f"<td class='sf-table-metric'>{metric['name']}{metric_icon}</td>"
         
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'data' in data and len(data['data']) > 0:
-                return self.process_facebook_data(data['data'])
+        for col, column in enumerate(columns, start=column_start):
+            trend_html = build_trend_html(trends, row, col, metric['format']) if trends else ""
+            if metric['type'] == 'calculated':
+                raw_data = {k: current_table['data'][k][column['name']] for k in current_table['data'].keys()}
+                value = calculate_metric(metric_key, raw_data)
+                formatted_value = format_value(value, metric['format'])
+                table_html += f"<td style='text-align: center;'>"
+                table_html += f"<span class='status-calculated'>CALC {formatted_value}</span>{trend_html}</td>"
             else:
-                return self.get_empty_metrics()
+                value = current_table['data'][metric_key][column['name']]
+                formatted_value = format_value(value, metric['format'])
                 
-        except requests.exceptions.RequestException as e:
-            st.error(f"Facebook API Error: {str(e)}")
-            return self.get_empty_metrics()
-        except Exception as e:
-            st.error(f"Error processing Facebook data: {str(e)}")
-            return self.get_empty_metrics()
-    
-    def process_facebook_data(self, raw_data):
-        """Process Facebook API response into standardized format"""
-        metrics = self.get_empty_metrics()
-        
-        # Aggregate data across all days in the period
-        for day_data in raw_data:
-            metrics['spend'] += float(day_data.get('spend', 0))
-            metrics['impressions'] += int(day_data.get('impressions', 0))
-            metrics['clicks'] += int(day_data.get('clicks', 0))
-            
-            # Process conversion actions
-            actions = day_data.get('actions', [])
-            action_values = day_data.get('action_values', [])
+                # Add data source indicator
+                source = current_table.get('data_source', {}).get(metric_key, {}).get(column['name'], 'manual')
+                
+                if source == 'api':
+                    cell_class = "sf-table-api"
+                    fetched_at = fetched.get(metric_key, {}).get(column['name'])
+                    age_class = "cell-age cell-age-stale" if insights_refresh_due(column['end_date'], fetched_at, now) else "cell-age"
+                    age = format_age(fetched_at, now) if fetched_at else "age unknown"
+                    status_html = f"<span class='status-api'>API {formatted_value}</span><span class='{age_class}'>{age}</span>"
+                elif source == 'import':
+                    cell_class = "sf-table-import"
+                    status_html = f"<span class='status-import'>IMPORT {formatted_value}</span>"
+                else:
+                    cell_class = ""
+                    status_html = f"<span class='status-manual'>MANUAL {formatted_value}</span>"
+                
+                table_html += f"<td class='{cell_class}' style='text-align: center;'>{status_html}{trend_html}</td>"
+        
+        table_html += "</tr>"
+    
+    table_html += "</table>"
+    return table_html
+
+def render_data_table(table_key, slot):
+    """Draw the data table into its placeholder"""
+    if not st.session_state.section_visibility['data_table']:
+        slot.empty()
+        return
+    
+    current_table = st.session_state.tables[table_key]
+    with slot.container():
+        # Legend
+        st.markdown("""
+        <div class="legend">
+            <div class="legend-item">
+                <span class="status-calculated">CALC Auto-calculated</span>
+            </div>
+            <div class="legend-item">
+                <span class="status-api">API From Facebook API</span> <small>with its age; amber ones are being refreshed</small>
+            </div>
+            <div class="legend-item">
+                <span class="status-import">IMPORT From a CSV export</span>
+            </div>
+            <div class="legend-item">
+                <span class="status-manual">MANUAL Manual input</span>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Changes and anomaly scores come from one pass over the whole table
+        trends = None
+        if st.session_state.get('show_trends'):
+            from trends import compute_trends
             
-            for action in actions:
-                action_type = action.get('action_type')
-                value = int(action.get('value', 0))
+            trends = compute_trends(current_table)
+        
+        # Display the HTML table
+        st.markdown(
+            build_table_html(current_table, trends, column_window(table_key), metric_window(table_key)),
+            unsafe_allow_html=True
+        )
+
+def render_quick_stats(table_key, slot):
+    """Draw the current week stat cards into their placeholder"""
+    current_table = st.session_state.tables[table_key]
+    if not st.session_state.section_visibility['quick_stats'] or not current_table['columns']:
+        slot.empty()
+        return
+    
+    current_week = current_table['columns'][-1]['name']  # Most recent week
+    week_data = {k: current_table['data'][k][current_week] for k in current_table['data'].keys()}
+    
+    with slot.container():
+        st.markdown("""
+        <div class="sf-card">
+            <div class="sf-card-header">
+                <h3 class="sf-card-title">Quick Stats (Current Week)</h3>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Create metrics cards
+        st.markdown('<div class="metrics-grid">', unsafe_allow_html=True)
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            spend = week_data.get('spend', 0)
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{format_value(spend, 'currency')}</div>
+                <div class="metric-label">Total Spend</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            clicks = week_data.get('clicks', 0)
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{format_value(clicks, 'number')}</div>
+                <div class="metric-label">Total Clicks</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col3:
+            ctr = calculate_metric('ctr', week_data)
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{format_value(ctr, 'percentage')}</div>
+                <div class="metric-label">CTR</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col4:
+            roas = calculate_metric('roas', week_data)
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{format_value(roas, 'ratio')}</div>
+                <div class="metric-label">ROAS</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+
+def render_sent_diff(table_key, slot):
+    """Draw the changes since the last sent report into their placeholder"""
+    if slot is None:
+        return
+    
+    changes = diff_against_last_sent(table_key)
+    if changes is None:
+        slot.empty()
+        return
+    
+    current_table = st.session_state.tables[table_key]
+    last_sent = get_table_history(table_key).last_sent()
+    with slot.container():
+        with st.expander(f"Changes since {last_sent.label} ({len(changes)})"):
+            if changes:
+                for change in changes:
+                    metric = current_table['metrics'].get(change['metric'], {'name': change['metric'], 'format': 'number'})
+                    st.markdown(
+                        f"**{metric['name']}** · {change['column']}: "
+                        f"{format_value(change['old'], metric['format'])} → {format_value(change['new'], metric['format'])}"
+                    )
+            else:
+                st.markdown("No changes since this report was sent.")
+
+# Each section below is a fragment: its widgets rerun only that section and
+# redraw the table/stats placeholders that depend on it, not the whole page.
+
+@session_fragment
+def render_summary_section(table_key):
+    """Summary text area with its toggle"""
+    current_table = st.session_state.tables[table_key]
+    render_section_header(f"{current_table['platform']} Summary", 'summary')
+    
+    if st.session_state.section_visibility['summary']:
+        st.markdown(f"""
+        <div class="sf-card">
+            <div class="sf-card-header">
+                <h3 class="sf-card-title">{current_table['platform']} Summary</h3>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        summary_text = st.text_area(
+            "Platform Summary:",
+            value=current_table['summary'],
+            height=100,
+            key=f"summary_{table_key}",
+            label_visibility="collapsed"
+        )
+        if summary_text != current_table['summary']:
+            current_table['summary'] = summary_text
+            save_fragment_edits()
+
+@session_fragment
+def render_date_config_section(table_key, slots):
+    """Per-column date pickers with their toggle"""
+    current_table = st.session_state.tables[table_key]
+    render_section_header("Date Range Configuration", 'date_config')
+    
+    if st.session_state.section_visibility['date_config']:
+        start, stop = column_window(table_key)
+        date_cols = st.columns(len(current_table['columns'][start:stop]))
+        changed = []
+        
+        for i, column in enumerate(current_table['columns'][start:stop], start=start):
+            with date_cols[i - start]:
+                st.markdown(f"""
+                <div class="date-picker-container">
+                    <div class="date-range-label">{column['name']}</div>
+                </div>
+                """, unsafe_allow_html=True)
+                
+                # Parse current dates
+                current_start = datetime.strptime(column['start_date'], '%Y-%m-%d').date()
+                current_end = datetime.strptime(column['end_date'], '%Y-%m-%d').date()
+                
+                # Date inputs
+                new_start = st.date_input(
+                    f"Start",
+                    value=current_start,
+                    key=f"start_{column['name']}_{table_key}",
+                    label_visibility="collapsed"
+                )
+                
+                new_end = st.date_input(
+                    f"End",
+                    value=current_end,
+                    key=f"end_{column['name']}_{table_key}",
+                    label_visibility="collapsed"
+                )
                 
-                if action_type == 'add_to_cart':
-                    metrics['add_to_cart'] += value
-                elif action_type == 'initiate_checkout':
-                    metrics['checkout'] += value
-                elif action_type in ['purchase', 'complete_registration']:
-                    metrics['purchase'] += value
+                # Update dates if changed
+                if new_start != current_start or new_end != current_end:
+                    current_table['columns'][i]['start_date'] = new_start.strftime('%Y-%m-%d')
+                    current_table['columns'][i]['end_date'] = new_end.strftime('%Y-%m-%d')
+                    current_table['columns'][i]['display_name'] = f"{new_start.strftime('%m/%d')} - {new_end.strftime('%m/%d')}"
+                    changed.append(current_table['columns'][i])
+        
+        # Re-dated Facebook columns are re-summed from stored days, or refetched once their dates settle
+        rerun = False
+        if changed and table_key == 'facebook':
+            filled = redate_facebook_columns(changed)
+            # Queued columns need the fetch poller, which only a full run mounts
+            queued = st.session_state.get('facebook_redated', {})
+            rerun = bool(filled) or any(column['name'] in queued for column in changed)
+        
+        # Column headers show the new display names
+        if changed:
+            record_table_version(table_key)
+            save_fragment_edits()
+            if rerun:
+                st.rerun()
+            render_data_table(table_key, slots['data_table'])
+
+@session_fragment
+def render_data_table_section(table_key, slots):
+    """Data table toggle; the table itself is drawn into its placeholder"""
+    render_section_header("Performance Data Table", 'data_table')
+    st.toggle(
+        "Show period changes and anomalies",
+        key='show_trends',
+        help="Change against the previous column, with cells flagged when they sit far outside the previous periods"
+    )
+    render_data_table(table_key, slots['data_table'])
+
+def redraw_table_slots(table_key, slots):
+    """Redraw the table, stat cards and sent diff placeholders after a fragment changed the table"""
+    # The placeholders show the active table; other tables redraw when opened
+    if table_key != st.session_state.active_table:
+        return
+    render_data_table(table_key, slots['data_table'])
+    render_quick_stats(table_key, slots['quick_stats'])
+    render_sent_diff(table_key, slots['sent_diff'])
+
+def redraw_arrived_columns(table_key, names, slots):
+    """Show columns a background job filled in, rerunning the page only when it must
+    
+    The raw metric inputs belong to their own fragment, and the browser would
+    send back the old values of any it still shows, so the page reruns when
+    they show one of the columns; otherwise only the placeholders are redrawn.
+    """
+    if table_key != st.session_state.active_table:
+        return
+    if st.session_state.section_visibility['edit_metrics']:
+        start, stop = column_window(table_key)
+        if any(column['name'] in names for column in st.session_state.tables[table_key]['columns'][start:stop]):
+            st.rerun()
+    redraw_table_slots(table_key, slots)
+
+@session_fragment
+def render_edit_metrics_section(table_key, slots):
+    """Raw metric inputs with their toggle"""
+    current_table = st.session_state.tables[table_key]
+    render_section_header("Edit Raw Metrics", 'edit_metrics')
+    
+    if st.session_state.section_visibility['edit_metrics']:
+        st.markdown("""
+        <div class="sf-card">
+            <div class="sf-card-header">
+                <h3 class="sf-card-title">Edit Raw Metrics</h3>
+            </div>
+            <p><em>Only raw metrics can be edited. Calculated metrics update automatically. API data can be overridden.</em></p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Create input fields for raw metrics only
+        raw_metrics = {k: v for k, v in current_table['metrics'].items() if v['type'] == 'raw'}
+        changed = False
+        
+        if raw_metrics:
+            # Column headers for inputs
+            # Only the visible window of columns gets input widgets
+            start, stop = column_window(table_key)
+            visible_columns = current_table['columns'][start:stop]
+            input_cols = st.columns(len(visible_columns))
+            for i, column in enumerate(visible_columns):
+                input_cols[i].markdown(f"**{column['name']}**")
+                input_cols[i].caption(column['display_name'])
             
-            # Process revenue values
-            for action_value in action_values:
-                action_type = action_value.get('action_type')
-                value = float(action_value.get('value', 0))
+            # Input fields for each raw metric
+            for metric_key, metric in raw_metrics.items():
+                st.markdown(f"### {metric['name']}")
+                input_cols = st.columns(len(visible_columns))
                 
-                if action_type in ['purchase', 'complete_registration']:
-                    metrics['purchase_revenue'] += value
-        
-        return metrics
-    
-    def get_empty_metrics(self):
-        """Return empty metrics structure"""
-        return {
-            'spend': 0,
-            'impressions': 0,
-            'clicks': 0,
-            'add_to_cart': 0,
-            'checkout': 0,
-            'purchase': 0,
-            'purchase_revenue': 0
+                for i, column in enumerate(visible_columns):
+                    current_value = current_table['data'][metric_key][column['name']]
+                    source = current_table.get('data_source', {}).get(metric_key, {}).get(column['name'], 'manual')
+                    
+                    # Show different styling for API vs manual data
+                    help_text = {
+                        'api': "API data (you can override)",
+                        'import': "Imported from a CSV export (you can override)"
+                    }.get(source, "Manual input")
+                    fetched_at = current_table.get('fetched_at', {}).get(metric_key, {}).get(column['name'])
+                    if source == 'api' and fetched_at:
+                        help_text = f"API data fetched {format_age(fetched_at)} (you can override)"
+                    
+                    new_value = input_cols[i].number_input(
+                        f"{metric['name']} - {column['name']}",
+                        value=float(current_value),
+                        step=0.01,
+                        key=f"input_{metric_key}_{column['name']}_{table_key}",
+                        label_visibility="collapsed",
+                        help=help_text
+                    )
+                    
+                    # Update data and mark as manual if changed
+                    if new_value != current_value:
+                        current_table['data'][metric_key][column['name']] = new_value
+                        current_table['data_source'][metric_key][column['name']] = 'manual'
+                        changed = True
+        
+        # Calculated cells and stat cards depend on the edited values
+        if changed:
+            record_table_version(table_key)
+            save_fragment_edits()
+            redraw_table_slots(table_key, slots)
+
+@session_fragment
+def render_quick_stats_section(table_key, slots):
+    """Quick stats toggle; the cards are drawn into their placeholder"""
+    render_section_header("Quick Stats (Current Week)", 'quick_stats')
+    render_quick_stats(table_key, slots['quick_stats'])
+
+def start_portfolio_refresh(access_token, account_text):
+    """Start a background refresh of every portfolio account"""
+    from portfolio import PortfolioRefreshJob, parse_account_ids, portfolio_periods
+    
+    job = PortfolioRefreshJob(access_token, parse_account_ids(account_text), portfolio_periods())
+    st.session_state.portfolio_job = job.start()
+    st.session_state.portfolio_pending = {}
+    return job
+
+def render_portfolio_progress():
+    """Portfolio refresh progress, polled only while a refresh runs"""
+    if st.session_state.get('portfolio_job') is not None:
+        poll_portfolio_refresh()
+
+@session_fragment(run_every=FETCH_POLL_SECONDS)
+def poll_portfolio_refresh():
+    """Poll the portfolio refresh and publish the results once every account is in"""
+    job = st.session_state.get('portfolio_job')
+    if job is None:
+        st.rerun()
+    
+    for account_id, account_data in job.drain():
+        if account_data:
+            st.session_state.portfolio_pending[account_id] = account_data
+    done = job.is_done()
+    
+    st.progress(job.completed / job.total if job.total else 1.0, text=f"Refreshed {job.completed} of {job.total} accounts")
+    
+    if not done and st.button("Cancel Refresh", key="cancel_portfolio_refresh"):
+        job.cancel()
+        done = True
+    
+    if done:
+        from portfolio import compute_portfolio, portfolio_periods
+        
+        st.session_state.portfolio_job = None
+        st.session_state.portfolio = {
+            'periods': portfolio_periods(),
+            'errors': dict(job.errors),
+            'result': compute_portfolio(st.session_state.portfolio_pending)
         }
+        st.rerun()
+
+def render_period_generator(table_key):
+    """Replace the table's columns with N generated weeks, months or quarters"""
+    from periods import MAX_GENERATED_PERIODS, PERIOD_KINDS, generate_periods, replace_columns
+    
+    with st.expander("Generate Periods"):
+        col1, col2, col3 = st.columns(3)
+        kind = col1.selectbox("Period type:", list(PERIOD_KINDS), format_func=PERIOD_KINDS.get, key=f"period_kind_{table_key}")
+        count = col2.number_input("Periods:", min_value=1, max_value=MAX_GENERATED_PERIODS, value=12, key=f"period_count_{table_key}")
+        year_over_year = col3.checkbox(
+            "Pair each with a year earlier",
+            key=f"period_yoy_{table_key}",
+            help="Adds the same period one year back next to each one"
+        )
+        
+        if st.button("Replace Columns", key=f"generate_periods_{table_key}", help="Columns that keep their name and dates keep their values"):
+            replace_columns(st.session_state.tables[table_key], generate_periods(kind, count, year_over_year))
+            clear_table_widget_state(table_key)
+            # Start on the newest page of the new columns
+            st.session_state.pop(f"column_window_{table_key}", None)
+            if table_key == 'facebook':
+                apply_indexed_totals(table_key, st.session_state.facebook_credentials)
+            record_table_version(table_key)
+            st.rerun()
+
+def render_csv_import(table_key):
+    """Sidebar importer that sums a platform CSV export by day into the table's columns"""
+    from importer import RAW_METRICS, load_column_mappings
+    
+    st.markdown(f"### Import {PLATFORM_NAMES[table_key]} CSV")
+    uploaded = st.file_uploader("Platform export:", type=['csv'], key=f"import_file_{table_key}")
+    server_path = st.text_input(
+        "Or a file path on the server:",
+        key=f"import_path_{table_key}",
+        help="For exports too large to upload"
+    )
+    
+    default_mapping = load_column_mappings().get(table_key, {})
+    mapping = {}
+    with st.expander("Column mapping"):
+        for field in ['date'] + RAW_METRICS:
+            label = "Date" if field == 'date' else DEFAULT_METRICS[field]['name']
+            mapping[field] = st.text_input(
+                label,
+                value=default_mapping.get(field, ''),
+                key=f"import_map_{field}_{table_key}",
+                help="Export column header; leave empty to skip this metric"
+            ).strip()
+    
+    if st.button("Import CSV", key=f"import_csv_{table_key}", disabled=not (uploaded or server_path)):
+        from importer import aggregate_daily
+        
+        with st.spinner("Importing export..."):
+            try:
+                imported = aggregate_daily(uploaded if uploaded is not None else server_path.strip(), mapping)
+            except (OSError, ValueError) as e:
+                st.markdown(f'<div class="error-message">Could not import the export: {e}</div>', unsafe_allow_html=True)
+                return
+        filled, skipped = apply_imported_daily(table_key, imported)
+        st.markdown(
+            f'<div class="success-message">Imported {imported["rows"]:,} rows over {len(imported["daily"])} days '
+            f'into {len(filled)} of {len(filled) + len(skipped)} columns</div>',
+            unsafe_allow_html=True
+        )
+        if skipped:
+            st.markdown(f'<div class="warning-message">Not covered by the export: {", ".join(skipped)}</div>', unsafe_allow_html=True)
+        if imported['skipped']:
+            st.caption(f"Skipped {imported['skipped']:,} rows without a valid date")
 
-def fetch_facebook_data(start_date, end_date):
-    """Fetch data from Facebook API"""
-    creds = st.session_state.facebook_credentials
+@st.cache_resource
+def get_configured_connectors(config_mtime):
+    """Connectors from the config file, rebuilt whenever the file changes"""
+    from connectors import load_configured_connectors
     
-    if not creds['token'] or not creds['account_id']:
-        return None
+    return load_configured_connectors()
+
+def get_platform_connectors(access_token, account_id):
+    """Facebook from the sidebar credentials plus every connector in the config file"""
+    from connectors import CONNECTOR_CONFIG, FacebookConnector
     
     try:
-        fb_api = FacebookAPI(creds['token'], creds['account_id'])
-        return fb_api.get_insights(start_date, end_date)
-    except Exception as e:
-        st.error(f"Error fetching Facebook data: {str(e)}")
-        return None
+        config_mtime = os.stat(CONNECTOR_CONFIG).st_mtime_ns
+    except FileNotFoundError:
+        config_mtime = None
+    connectors = dict(get_configured_connectors(config_mtime))
+    if access_token and account_id:
+        connectors['facebook'] = FacebookConnector(access_token, account_id, get_graph_transport())
+    return {table_key: connectors[table_key] for table_key in PLATFORM_NAMES if table_key in connectors}
 
-def create_initial_table(platform):
-    """Create initial table structure"""
-    today = datetime.now()
-    weeks = []
-    
-    # Generate last 4 weeks
-    for i in range(3, -1, -1):
-        week_end = today - timedelta(days=i*7)
-        week_start = week_end - timedelta(days=6)
-        
-        weeks.append({
-            'name': f'Week {4-i}',
-            'start_date': week_start.strftime('%Y-%m-%d'),
-            'end_date': week_end.strftime('%Y-%m-%d'),
-            'display_name': f"{week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}"
-        })
-    
-    # Initialize data structure
-    data = {}
-    data_source = {}  # Track whether data came from API or manual input
-    
-    for metric_key in DEFAULT_METRICS.keys():
-        data[metric_key] = {}
-        data_source[metric_key] = {}
-        for week in weeks:
-            data[metric_key][week['name']] = 0.0
-            data_source[metric_key][week['name']] = 'manual'  # default to manual
-    
-    return {
-        'platform': platform,
-        'columns': weeks,
-        'metrics': DEFAULT_METRICS.copy(),
-        'data': data,
-        'data_source': data_source,
-        'summary': f"{platform} performance summary will appear here. This section can be customized with insights, recommendations, and key takeaways."
-    }
+def start_platform_refresh(connectors):
+    """Start a background refresh of every connected platform"""
+    from connectors import PlatformRefreshJob
+    
+    job = PlatformRefreshJob(connectors, st.session_state.tables)
+    st.session_state.platform_refresh_job = job.start()
+    st.session_state.platform_refresh_summary = None
+    return job
 
-def initialize_tables():
-    """Initialize all platform tables"""
-    if not st.session_state.tables:
-        platforms = ['Facebook', 'Google', 'LinkedIn', 'TikTok', 'Microsoft', 'Summary']
-        st.session_state.tables = {
-            platform.lower(): create_initial_table(platform)
-            for platform in platforms
+def render_platform_refresh_progress(slots):
+    """Multi-platform refresh progress, polled only while a refresh runs"""
+    if st.session_state.get('platform_refresh_job') is not None:
+        poll_platform_refresh(slots)
+
+@session_fragment(run_every=FETCH_POLL_SECONDS)
+def poll_platform_refresh(slots):
+    """Poll the multi-platform refresh, fill in arrived columns and offer cancel"""
+    job = st.session_state.get('platform_refresh_job')
+    if job is None:
+        st.rerun()
+    
+    updated = {}
+    for table_key, column, api_data in job.drain():
+        # Connectors don't report fetch times; the arrival time is close enough to age API values
+        source = job.connectors[table_key].source
+        if api_data and apply_fetched_column(table_key, column, api_data, source, fetched_at=time.time()):
+            job.applied += 1
+            updated.setdefault(table_key, []).append(column['name'])
+    for table_key in updated:
+        record_table_version(table_key)
+    done = job.is_done()
+    
+    st.progress(job.completed / job.total if job.total else 1.0, text=f"Refreshed {job.completed} of {job.total} columns")
+    
+    if not done and st.button("Cancel Refresh", key="cancel_platform_refresh"):
+        job.cancel()
+        done = True
+    
+    if done:
+        st.session_state.platform_refresh_job = None
+        st.session_state.platform_refresh_summary = {
+            'platforms': [PLATFORM_NAMES[table_key] for table_key in job.connectors],
+            'updated': job.applied,
+            'total': job.total,
+            'errors': list(job.errors),
+            'cancelled': job.cancel_event.is_set()
         }
+        # One full run shows the summary and stops polling
+        st.rerun()
+    for table_key, names in updated.items():
+        redraw_arrived_columns(table_key, names, slots)
 
-def update_facebook_data_from_api():
-    """Update Facebook table with API data"""
-    if st.session_state.active_table != 'facebook':
+@session_fragment
+def render_portfolio_section():
+    """Top/bottom-N ranking of portfolio accounts for any metric"""
+    portfolio_state = st.session_state.get('portfolio')
+    if not portfolio_state:
         return
     
-    facebook_table = st.session_state.tables['facebook']
+    from portfolio import rank_accounts
     
-    for column in facebook_table['columns']:
-        with st.spinner(f"Fetching Facebook data for {column['display_name']}..."):
-            api_data = fetch_facebook_data(column['start_date'], column['end_date'])
-            
-            if api_data:
-                # Update raw metrics with API data
-                raw_metrics = ['spend', 'impressions', 'clicks', 'add_to_cart', 'checkout', 'purchase', 'purchase_revenue']
-                
-                for metric in raw_metrics:
-                    if metric in api_data:
-                        facebook_table['data'][metric][column['name']] = api_data[metric]
-                        facebook_table['data_source'][metric][column['name']] = 'api'
-                
-                st.success(f"Updated {column['name']} with Facebook API data")
-            else:
-                st.warning(f"Could not fetch data for {column['name']}")
+    render_section_header("Portfolio Ranking", 'portfolio')
+    if not st.session_state.section_visibility['portfolio']:
+        return
+    
+    result = portfolio_state['result']
+    previous_period, current_period = portfolio_state['periods']
+    st.caption(
+        f"{len(result['account_ids'])} accounts · current {current_period['display_name']} "
+        f"vs previous {previous_period['display_name']}"
+    )
+    for account_id, error in portfolio_state['errors'].items():
+        st.markdown(f'<div class="warning-message">Could not refresh account {account_id}: {error}</div>', unsafe_allow_html=True)
+    
+    measures = {
+        'current': 'Current week value',
+        'change': 'Week-over-week change',
+        'pct_change': 'Week-over-week % change'
+    }
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        metric_key = st.selectbox(
+            "Metric:",
+            list(DEFAULT_METRICS.keys()),
+            format_func=lambda key: DEFAULT_METRICS[key]['name'],
+            index=list(DEFAULT_METRICS.keys()).index('roas'),
+            key="portfolio_metric"
+        )
+    with col2:
+        measure = st.selectbox("Rank by:", list(measures.keys()), format_func=measures.get, key="portfolio_measure")
+    with col3:
+        direction = st.selectbox("Show:", ['Bottom', 'Top'], key="portfolio_direction")
+    with col4:
+        n = st.number_input("Accounts:", min_value=1, max_value=100, value=10, step=1, key="portfolio_n")
+    
+    metric = DEFAULT_METRICS[metric_key]
+    ranked = rank_accounts(result, metric_key, int(n), measure, largest=(direction == 'Top'))
+    
+    table_html = "<table class='sf-table'><tr>"
+    for header in ['Rank', 'Account', 'Current', 'Previous', 'Change', '% Change']:
+        table_html += f"<th style='text-align: center;'>{header}</th>"
+    table_html += "</tr>"
+    for rank, row in enumerate(ranked, start=1):
+        table_html += "<tr>"
+        table_html += f"<td style='text-align: center;'>{rank}</td>"
+        table_html += f"<td class='sf-table-metric'>act_{row['account_id']}</td>"
+        table_html += f"<td style='text-align: center;'>{format_value(row['current'], metric['format'])}</td>"
+        table_html += f"<td style='text-align: center;'>{format_value(row['previous'], metric['format'])}</td>"
+        table_html += f"<td style='text-align: center;'>{format_value(row['change'], metric['format'])}</td>"
+        table_html += f"<td style='text-align: center;'>{format_value(row['pct_change'], 'percentage')}</td>"
+        table_html += "</tr>"
+    table_html += "</table>"
+    
+    st.markdown(table_html, unsafe_allow_html=True)
+
+@session_fragment
+def render_trend_section():
+    """Line chart of one metric over the table periods or the stored Facebook days"""
+    render_section_header("Trend Charts", 'trends')
+    if not st.session_state.section_visibility['trends']:
+        return
+    
+    from charts import build_trend_figure, daily_series, period_series
+    
+    sources = {
+        'periods': 'Table periods',
+        'daily': 'Daily (stored Facebook days)'
+    }
+    col1, col2, col3 = st.columns([2, 2, 3])
+    with col1:
+        metric_key = st.selectbox(
+            "Metric:",
+            list(DEFAULT_METRICS.keys()),
+            format_func=lambda key: DEFAULT_METRICS[key]['name'],
+            index=list(DEFAULT_METRICS.keys()).index('spend'),
+            key="trend_metric"
+        )
+    with col2:
+        source = st.selectbox("Series:", list(sources.keys()), format_func=sources.get, key="trend_source")
+    with col3:
+        if source == 'periods':
+            table_keys = st.multiselect(
+                "Platforms:",
+                list(PLATFORM_NAMES.keys()),
+                default=['facebook'],
+                format_func=PLATFORM_NAMES.get,
+                key="trend_platforms"
+            )
+    
+    series = []
+    if source == 'daily':
+        index = get_range_index(st.session_state.facebook_credentials)
+        if index is None:
+            st.markdown("No stored daily Facebook data for this account yet. Enter its credentials and fetch Facebook data to build the daily history.")
+            return
+        dates, values = daily_series(index, metric_key)
+        series.append((PLATFORM_NAMES['facebook'], dates, values))
+    else:
+        for table_key in table_keys:
+            table = st.session_state.tables[table_key]
+            if table['columns']:
+                dates, values = period_series(table, metric_key)
+                series.append((PLATFORM_NAMES[table_key], dates, values))
+    if not series:
+        st.markdown("Choose at least one platform with columns.")
+        return
+    
+    figure, sent, total = build_trend_figure(series, metric_key)
+    st.plotly_chart(figure, width="stretch", key="trend_chart")
+    if sent < total:
+        st.caption(f"Showing {sent:,} of {total:,} points (downsampled with LTTB)")
+    else:
+        st.caption(f"{total:,} points")
+
+# Conflicts listed in the sidebar after a save; the rest are counted
+WORKSPACE_CONFLICTS_SHOWN = 5
+
+def describe_workspace_conflict(conflict):
+    """One line on what another session saved first, and what was kept"""
+    table = st.session_state.tables[conflict['table']]
+    platform = PLATFORM_NAMES.get(conflict['table'], conflict['table'])
+    if conflict['part'] != 'cell':
+        parts = {'columns': 'date columns were', 'metrics': 'metrics were', 'summary': 'summary was', 'table': 'table was'}
+        return f"{platform} {parts[conflict['part']]} changed in another session first; your change was not saved"
+    metric = table['metrics'].get(conflict['metric'], DEFAULT_METRICS.get(conflict['metric'], {}))
+    format_type = metric.get('format', 'number')
+    return (
+        f"{platform} · {metric.get('name', conflict['metric'])} · {conflict['column']}: another session saved "
+        f"{format_value(conflict['theirs'], format_type)} first, so your {format_value(conflict['yours'], format_type)} was not saved"
+    )
+
+def render_workspace_controls():
+    """Current workspace with its save state, and a switch to another one"""
+    st.markdown("### Workspace")
+    if st.session_state.workspace_name is None:
+        st.caption("These tables are private to this session and not saved. Open a workspace to save them and share them through its link.")
+    else:
+        workspace = get_workspaces().get(st.session_state.workspace_name)
+        stats = workspace.get_stats()
+        if stats['pending']:
+            saved = f"{stats['pending']} edits saving..."
+        elif stats['saved_at']:
+            saved = f"saved {datetime.fromtimestamp(stats['saved_at']).strftime('%m/%d %H:%M:%S')}"
+        else:
+            saved = "nothing saved yet"
+        st.caption(f"**{workspace.name}** · {saved} · {workspace.describe()}")
+    
+    conflicts = st.session_state.workspace_conflicts
+    if conflicts:
+        for conflict in conflicts[:WORKSPACE_CONFLICTS_SHOWN]:
+            st.markdown(f'<div class="warning-message">{describe_workspace_conflict(conflict)}</div>', unsafe_allow_html=True)
+        if len(conflicts) > WORKSPACE_CONFLICTS_SHOWN:
+            st.caption(f"... and {len(conflicts) - WORKSPACE_CONFLICTS_SHOWN} more")
+        if st.button("Dismiss Conflicts"):
+            st.session_state.workspace_conflicts = []
+            st.rerun()
+    
+    name = st.text_input("Open workspace:", placeholder="e.g. client-acme", help="Letters, digits, '-' and '_'. A new name starts with this session's tables, or empty when switching from another workspace.")
+    if st.button("Open Workspace", disabled=not name.strip()):
+        if open_session_workspace(name.strip()):
+            st.rerun()
+        st.markdown('<div class="error-message">Workspace names use letters, digits, \'-\' and \'_\' only</div>', unsafe_allow_html=True)
+
+def fetch_hourly_insights(access_token, account_id):
+    """Fetch hourly rows for the trailing weeks into an array-backed store"""
+    from hourly import HOURLY_DAYS, fetch_hourly_store
+    
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=HOURLY_DAYS - 1)
+    api = get_facebook_api(access_token, account_id)
+    st.session_state.hourly_store = fetch_hourly_store(
+        api, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    )
+    return st.session_state.hourly_store
+
+def build_heatmap_html(grid, format_type):
+    """Day-of-week x hour table shaded by value"""
+    from hourly import WEEKDAY_NAMES
+    
+    peak = float(grid.max()) if grid.size else 0
+    table_html = "<table class='sf-table'><tr><th></th>"
+    for hour in range(24):
+        table_html += f"<th style='text-align: center; font-size: 0.7rem;'>{hour:02d}</th>"
+    table_html += "</tr>"
+    for weekday, row in enumerate(grid):
+        table_html += f"<tr><td class='sf-table-metric'>{WEEKDAY_NAMES[weekday]}</td>"
+        for value in row:
+            alpha = value / peak if peak > 0 else 0
+            table_html += (
+                f"<td style='background-color: rgba(1, 118, 211, {alpha:.2f}); font-size: 0.7rem; text-align: center;' "
+                f"title='{format_value(value, format_type)}'>{format_value(value, format_type) if alpha >= 0.5 else ''}</td>"
+            )
+        table_html += "</tr>"
+    table_html += "</table>"
+    return table_html
+
+@session_fragment
+def render_hourly_section():
+    """Hour-of-day heatmap and intraday pacing from the stored hourly arrays"""
+    store = st.session_state.get('hourly_store')
+    if store is None:
+        return
+    
+    render_section_header("Hourly Insights", 'hourly')
+    if not st.session_state.section_visibility['hourly']:
+        return
+    
+    st.caption(
+        f"{store.days} days of hourly data · {store.start_date.strftime('%m/%d')} - {store.end_date.strftime('%m/%d')} "
+        f"· {store.values.nbytes / 1024:.1f} KB"
+    )
+    
+    metric_key = st.selectbox(
+        "Metric:",
+        list(DEFAULT_METRICS.keys()),
+        format_func=lambda key: DEFAULT_METRICS[key]['name'],
+        key="hourly_metric"
+    )
+    metric = DEFAULT_METRICS[metric_key]
+    
+    st.markdown("#### Day of Week x Hour")
+    st.markdown(build_heatmap_html(store.dow_hour_heatmap(metric_key), metric['format']), unsafe_allow_html=True)
+    
+    # Pace today against the average day so far, up to the latest hour with delivery
+    actual, expected = store.intraday_pacing(metric_key)
+    delivered_hours = [hour for hour in range(24) if store.values[-1, hour].any()]
+    st.markdown("#### Intraday Pacing (Today)")
+    if delivered_hours:
+        hour = delivered_hours[-1]
+        pace = f" ({actual[hour] / expected[hour] * 100:.0f}% of typical)" if expected[hour] else ""
+        st.markdown(
+            f"Through {hour:02d}:59: **{format_value(actual[hour], metric['format'])}** "
+            f"vs typical {format_value(expected[hour], metric['format'])}{pace}"
+        )
+    else:
+        st.markdown("No delivery recorded today yet.")
+    
+    if st.button("Fill Facebook Columns from Hourly Data", help="Roll stored hours up into every covered week without new API calls"):
+        applied = apply_hourly_totals(store)
+        if applied:
+            st.rerun()
+        st.markdown('<div class="warning-message">No Facebook column falls inside the stored hourly range</div>', unsafe_allow_html=True)
 
 def main():
     # Initialize tables
@@ -673,9 +1424,12 @@ def main():
             'data_table': True,
             'edit_metrics': True,
             'quick_stats': True,
+            'portfolio': True,
+            'hourly': True,
+            'trends': True,
             'instructions': False
         }
-
+    
     # Header with Salesforce styling
     st.markdown("""
     <div class="sf-header">
@@ -722,20 +1476,136 @@ def main():
             else:
                 st.markdown('<div class="warning-message">Please enter both token and account ID</div>', unsafe_allow_html=True)
         
+        # Graph transport counters
+        transport_stats = get_graph_transport().get_stats()
+        if transport_stats['requests'] or transport_stats['errors']:
+            st.caption(
+                f"Graph API: {transport_stats['requests']} requests, "
+                f"{transport_stats['errors']} errors, "
+                f"avg {transport_stats['avg_seconds'] * 1000:.0f} ms, "
+                f"{transport_stats['wire_bytes'] / 1024:.1f} KB received"
+            )
+        
+        st.button(
+            "Profile Next Rerun",
+            on_click=request_profile,
+            help="Save a cProfile and flame-graph stack file for the next full rerun"
+        )
+        
         st.markdown("---")
         
+        # Cached values stay on screen while stale columns refetch in the background
+        refresh_stale_facebook_data()
+        
         # Facebook Auto-Pull
         if st.session_state.active_table == 'facebook':
             st.markdown("### Auto-Pull Facebook Data")
-            if st.button("Fetch All Facebook Data", type="primary", help="Pull data for all date ranges"):
+            fetch_running = st.session_state.get('facebook_fetch_job') is not None
+            if st.button("Fetch All Facebook Data", type="primary", help="Pull data for all date ranges", disabled=fetch_running):
                 if fb_token and fb_account_id:
                     update_facebook_data_from_api()
                 else:
                     st.markdown('<div class="error-message">Please configure Facebook credentials first</div>', unsafe_allow_html=True)
+        
+        # Background fetch progress stays visible on every platform tab;
+        # it is drawn at the end of the run, once the table slots exist
+        fetch_progress_area = st.container()
+        
+        summary = st.session_state.get('facebook_fetch_summary')
+        if summary:
+            if summary['cancelled']:
+                st.markdown(f'<div class="warning-message">Fetch cancelled after {summary["completed"]} of {summary["total"]} columns</div>', unsafe_allow_html=True)
+            else:
+                st.markdown(f'<div class="success-message">Updated {summary["updated"]} of {summary["total"]} columns with Facebook API data</div>', unsafe_allow_html=True)
+            for error in summary['errors']:
+                st.markdown(f'<div class="warning-message">Could not fetch data for {error}</div>', unsafe_allow_html=True)
+        
+        # Platform CSV exports streamed into the active table
+        if st.session_state.active_table != 'summary':
+            st.markdown("---")
+            render_csv_import(st.session_state.active_table)
+        
+        st.markdown("---")
+        
+        # Every connected platform refreshed in one go
+        st.markdown("### All Platforms")
+        try:
+            platform_connectors = get_platform_connectors(fb_token, fb_account_id)
+        except (OSError, ValueError, KeyError) as e:
+            platform_connectors = {}
+            st.markdown(f'<div class="error-message">Could not load platform connectors: {e}</div>', unsafe_allow_html=True)
+        if platform_connectors:
+            st.caption("Connected: " + ", ".join(
+                f"{PLATFORM_NAMES[table_key]} ({connector.describe()})" for table_key, connector in platform_connectors.items()
+            ))
+        
+        refresh_running = st.session_state.get('platform_refresh_job') is not None
+        if st.button("Refresh All Platforms", help="Fetch every column of every connected platform at once", disabled=refresh_running):
+            if platform_connectors:
+                start_platform_refresh(platform_connectors)
+                st.rerun()
+            else:
+                st.markdown('<div class="error-message">No platform connectors are configured</div>', unsafe_allow_html=True)
+        
+        platform_refresh_area = st.container()
+        
+        refresh_summary = st.session_state.get('platform_refresh_summary')
+        if refresh_summary:
+            if refresh_summary['cancelled']:
+                st.markdown(f'<div class="warning-message">Refresh cancelled after {refresh_summary["updated"]} of {refresh_summary["total"]} columns</div>', unsafe_allow_html=True)
+            else:
+                st.markdown(
+                    f'<div class="success-message">Updated {refresh_summary["updated"]} of {refresh_summary["total"]} columns '
+                    f'across {", ".join(refresh_summary["platforms"])}</div>',
+                    unsafe_allow_html=True
+                )
+            for error in refresh_summary['errors']:
+                st.markdown(f'<div class="warning-message">Could not fetch data for {error}</div>', unsafe_allow_html=True)
+        
+        st.markdown("---")
+        
+        # Portfolio of ad accounts ranked side by side
+        st.markdown("### Portfolio Accounts")
+        portfolio_accounts = st.text_area(
+            "Ad account IDs:",
+            value=st.session_state.get('portfolio_accounts', ''),
+            height=100,
+            help="One account ID per line or comma separated (no 'act_' prefix needed)"
+        )
+        st.session_state.portfolio_accounts = portfolio_accounts
+        
+        portfolio_running = st.session_state.get('portfolio_job') is not None
+        if st.button("Refresh Portfolio", help="Pull the last two weeks for every account", disabled=portfolio_running):
+            if fb_token and portfolio_accounts.strip():
+                start_portfolio_refresh(fb_token, portfolio_accounts)
+                st.rerun()
+            else:
+                st.markdown('<div class="error-message">Please enter a token and at least one account ID</div>', unsafe_allow_html=True)
+        
+        render_portfolio_progress()
+        
+        st.markdown("---")
+        
+        # Hourly breakdown for heatmaps and pacing
+        st.markdown("### Hourly Insights")
+        if st.button("Fetch Hourly Data", help="Pull the last four weeks broken down by hour"):
+            if fb_token and fb_account_id:
+                with st.spinner("Fetching hourly data..."):
+                    try:
+                        fetch_hourly_insights(fb_token, fb_account_id)
+                    except Exception as e:
+                        st.markdown(f'<div class="error-message">Could not fetch hourly data: {e}</div>', unsafe_allow_html=True)
+            else:
+                st.markdown('<div class="error-message">Please configure Facebook credentials first</div>', unsafe_allow_html=True)
+        
+        st.markdown("---")
+        
+        # Saved workspace the tables are persisted to
+        render_workspace_controls()
     
     # Platform selection with tabs
-    platforms = list(st.session_state.tables.keys())
-    platform_display_names = [st.session_state.tables[p]['platform'] for p in platforms]
+    platforms = list(PLATFORM_NAMES.keys())
+    platform_display_names = list(PLATFORM_NAMES.values())
     
     # Create platform tabs
     tab_cols = st.columns(len(platforms))
@@ -766,33 +1636,10 @@ def main():
     current_table = st.session_state.tables[st.session_state.active_table]
     
     # Summary section with toggle
-    col1, col2 = st.columns([6, 1])
-    with col1:
-        st.markdown(f"### {current_table['platform']} Summary")
-    with col2:
-        if st.button("Show/Hide" if st.session_state.section_visibility['summary'] else "Show/Hide", 
-                    key="toggle_summary"):
-            st.session_state.section_visibility['summary'] = not st.session_state.section_visibility['summary']
-    
-    if st.session_state.section_visibility['summary']:
-        st.markdown(f"""
-        <div class="sf-card">
-            <div class="sf-card-header">
-                <h3 class="sf-card-title">{current_table['platform']} Summary</h3>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        summary_text = st.text_area(
-            "Platform Summary:",
-            value=current_table['summary'],
-            height=100,
-            key=f"summary_{st.session_state.active_table}",
-            label_visibility="collapsed"
-        )
-        current_table['summary'] = summary_text
+    render_summary_section(st.session_state.active_table)
     
     # Controls section with toggle
+    sent_diff_slot = None
     col1, col2 = st.columns([6, 1])
     with col1:
         st.markdown("### Table Controls")
@@ -823,38 +1670,69 @@ def main():
                 st.session_state.tables[st.session_state.active_table] = create_initial_table(
                     current_table['platform']
                 )
+                clear_table_widget_state(st.session_state.active_table)
+                record_table_version(st.session_state.active_table)
                 st.rerun()
         
         with col4:
-            # Export functionality
-            export_data = []
-            for metric_key, metric in current_table['metrics'].items():
-                row = {'Metric': metric['name']}
-                for column in current_table['columns']:
-                    if metric['type'] == 'calculated':
-                        raw_data = {k: current_table['data'][k][column['name']] 
-                                  for k in current_table['data'].keys()}
-                        value = calculate_metric(metric_key, raw_data)
-                    else:
-                        value = current_table['data'][metric_key][column['name']]
-                    
-                    # Add data source indicator
-                    source = current_table.get('data_source', {}).get(metric_key, {}).get(column['name'], 'manual')
-                    source_indicator = " (API)" if source == 'api' else ""
-                    
-                    row[f"{column['name']} ({column['display_name']})"] = format_value(value, metric['format']) + source_indicator
-                export_data.append(row)
-            
-            df_export = pd.DataFrame(export_data)
-            csv = df_export.to_csv(index=False)
-            
+            # Export is generated on click so it always reflects fragment edits
             st.download_button(
                 label="Export CSV",
-                data=csv,
+                data=lambda: build_export_csv(current_table),
                 file_name=f"{st.session_state.active_table}_report_{datetime.now().strftime('%Y%m%d')}.csv",
                 mime="text/csv",
-                help="Download current table data as CSV"
+                help="Download current table data as CSV",
+                on_click="ignore"
+            )
+            tables = st.session_state.tables
+            daily_range = st.session_state.get('facebook_daily_range')
+            # Stored days only go into the workbook for an account the session's token may read
+            token = st.session_state.facebook_credentials['token']
+            if daily_range and not get_facebook_api(token, daily_range['account_id']).has_access(wait=False):
+                daily_range = None
+            daily_store = get_insights_store() if daily_range else None
+            hourly_store = st.session_state.get('hourly_store')
+            st.download_button(
+                label="Export Workbook",
+                data=lambda: build_export_workbook(tables, daily_store, daily_range, hourly_store),
+                file_name=f"ad_report_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                help="Download every platform, the summary and raw daily data as one Excel workbook",
+                on_click="ignore"
+            )
+        
+        render_period_generator(st.session_state.active_table)
+        
+        # Snapshot history: undo/redo and "as sent" versions of this table
+        history = get_table_history(st.session_state.active_table)
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            snapshot_label = st.text_input(
+                "Snapshot label:",
+                placeholder=f"Sent {datetime.now().strftime('%A %m/%d')}",
+                key=f"snapshot_label_{st.session_state.active_table}",
+                label_visibility="collapsed"
             )
+        
+        with col2:
+            if st.button("Mark as Sent", help="Save this version as the report that was sent"):
+                label = snapshot_label or f"Sent {datetime.now().strftime('%A %m/%d')}"
+                record_table_version(st.session_state.active_table, label=label, sent=True)
+                st.rerun()
+        
+        with col3:
+            if st.button("Undo", help="Go back to the previous version"):
+                restore_table_version(st.session_state.active_table, history.undo())
+                st.rerun()
+        
+        with col4:
+            if st.button("Redo", help="Reapply the version you undid"):
+                restore_table_version(st.session_state.active_table, history.redo())
+                st.rerun()
+        
+        # Filled in at the end of the run and by the editing fragments
+        sent_diff_slot = st.empty()
     
     # Add metric functionality
     if 'add_metric' in locals() and add_metric:
@@ -886,6 +1764,7 @@ def main():
                         current_table['data_source'][metric_key] = {
                             col['name']: 'manual' for col in current_table['columns']
                         }
+                        record_table_version(st.session_state.active_table)
                         st.success(f"Added metric: {new_metric_name}")
                         st.rerun()
             with col2:
@@ -927,257 +1806,54 @@ def main():
                             current_table['data'][metric_key][new_column_name] = 0.0
                             current_table['data_source'][metric_key][new_column_name] = 'manual'
                         
+                        if st.session_state.active_table == 'facebook':
+                            apply_indexed_totals('facebook', st.session_state.facebook_credentials, [new_column])
+                        record_table_version(st.session_state.active_table)
                         st.success(f"Added column: {new_column_name}")
                         st.rerun()
             with button_col2:
                 if st.form_submit_button("Cancel"):
                     st.rerun()
     
-    # Date range configuration section with toggle
-    col1, col2 = st.columns([6, 1])
-    with col1:
-        st.markdown("### Date Range Configuration")
-    with col2:
-        if st.button("Show/Hide" if st.session_state.section_visibility['date_config'] else "Show/Hide", 
-                    key="toggle_date_config"):
-            st.session_state.section_visibility['date_config'] = not st.session_state.section_visibility['date_config']
-    
-    if st.session_state.section_visibility['date_config']:
-        date_cols = st.columns(len(current_table['columns']))
-        
-        for i, column in enumerate(current_table['columns']):
-            with date_cols[i]:
-                st.markdown(f"""
-                <div class="date-picker-container">
-                    <div class="date-range-label">{column['name']}</div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Parse current dates
-                current_start = datetime.strptime(column['start_date'], '%Y-%m-%d').date()
-                current_end = datetime.strptime(column['end_date'], '%Y-%m-%d').date()
-                
-                # Date inputs
-                new_start = st.date_input(
-                    f"Start",
-                    value=current_start,
-                    key=f"start_{column['name']}_{st.session_state.active_table}",
-                    label_visibility="collapsed"
-                )
-                
-                new_end = st.date_input(
-                    f"End",
-                    value=current_end,
-                    key=f"end_{column['name']}_{st.session_state.active_table}",
-                    label_visibility="collapsed"
-                )
-                
-                # Update dates if changed
-                if new_start != current_start or new_end != current_end:
-                    current_table['columns'][i]['start_date'] = new_start.strftime('%Y-%m-%d')
-                    current_table['columns'][i]['end_date'] = new_end.strftime('%Y-%m-%d')
-                    current_table['columns'][i]['display_name'] = f"{new_start.strftime('%m/%d')} - {new_end.strftime('%m/%d')}"
+    # Reserve section slots in page order so fragments can redraw the
+    # table and stats placeholders they feed
+    table_key = st.session_state.active_table
+    render_table_window_controls(table_key)
+    date_config_area = st.container()
+    data_table_area = st.container()
+    slots = {
+        'data_table': st.empty(),
+        'sent_diff': sent_diff_slot
+    }
+    edit_metrics_area = st.container()
+    quick_stats_area = st.container()
+    slots['quick_stats'] = st.empty()
     
-    # Data table section with toggle
-    col1, col2 = st.columns([6, 1])
-    with col1:
-        st.markdown("### Performance Data Table")
-    with col2:
-        if st.button("Show/Hide" if st.session_state.section_visibility['data_table'] else "Show/Hide", 
-                    key="toggle_data_table"):
-            st.session_state.section_visibility['data_table'] = not st.session_state.section_visibility['data_table']
+    with date_config_area:
+        render_date_config_section(table_key, slots)
+    with data_table_area:
+        render_data_table_section(table_key, slots)
+    with edit_metrics_area:
+        render_edit_metrics_section(table_key, slots)
+    with quick_stats_area:
+        render_quick_stats_section(table_key, slots)
     
-    if st.session_state.section_visibility['data_table']:
-        # Create the main data table
-        table_html = "<table class='sf-table'>"
-        
-        # Header row
-        table_html += "<tr>"
-        table_html += "<th style='text-align: left; min-width: 200px;'>Metric</th>"
-        
-        for column in current_table['columns']:
-            table_html += f"<th style='text-align: center; min-width: 150px;'>"
-            table_html += f"<strong>{column['name']}</strong><br>"
-            table_html += f"<small style='color: #706e6b; font-weight: normal;'>{column['display_name']}</small></th>"
-        
-        table_html += "</tr>"
-        
-        # Data rows
-        for metric_key, metric in current_table['metrics'].items():
-            if metric['type'] == 'calculated':
-                row_class = "sf-table-calculated"
-                metric_icon = " (Calc)"
-            else:
-                row_class = ""
-                metric_icon = ""
-            
-            table_html += f"<tr class='{row_class}'>"
-            table_html += f"<td class='sf-table-metric'>{metric['name']}{metric_icon}</td>"
-            
-            for column in current_table['columns']:
-                if metric['type'] == 'calculated':
-                    raw_data = {k: current_table['data'][k][column['name']] for k in current_table['data'].keys()}
-                    value = calculate_metric(metric_key, raw_data)
-                    formatted_value = format_value(value, metric['format'])
-                    table_html += f"<td style='text-align: center;'>"
-                    table_html += f"<span class='status-calculated'>CALC {formatted_value}</span></td>"
-                else:
-                    value = current_table['data'][metric_key][column['name']]
-                    formatted_value = format_value(value, metric['format'])
-                    
-                    # Add data source indicator
-                    source = current_table.get('data_source', {}).get(metric_key, {}).get(column['name'], 'manual')
-                    
-                    if source == 'api':
-                        cell_class = "sf-table-api"
-                        status_html = f"<span class='status-api'>API {formatted_value}</span>"
-                    else:
-                        cell_class = ""
-                        status_html = f"<span class='status-manual'>MANUAL {formatted_value}</span>"
-                    
-                    table_html += f"<td class='{cell_class}' style='text-align: center;'>{status_html}</td>"
-            
-            table_html += "</tr>"
-        
-        table_html += "</table>"
-        
-        # Legend
-        st.markdown("""
-        <div class="legend">
-            <div class="legend-item">
-                <span class="status-calculated">CALC Auto-calculated</span>
-            </div>
-            <div class="legend-item">
-                <span class="status-api">API From Facebook API</span>
-            </div>
-            <div class="legend-item">
-                <span class="status-manual">MANUAL Manual input</span>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Display the HTML table
-        st.markdown(table_html, unsafe_allow_html=True)
+    render_sent_diff(table_key, slots['sent_diff'])
     
-    # Editable inputs section with toggle
-    col1, col2 = st.columns([6, 1])
-    with col1:
-        st.markdown("### Edit Raw Metrics")
-    with col2:
-        if st.button("Show/Hide" if st.session_state.section_visibility['edit_metrics'] else "Show/Hide", 
-                    key="toggle_edit_metrics"):
-            st.session_state.section_visibility['edit_metrics'] = not st.session_state.section_visibility['edit_metrics']
+    # Progress pollers redraw the slots above as columns arrive
+    with fetch_progress_area:
+        render_facebook_fetch_progress(redraw=lambda updated_key, names: redraw_arrived_columns(updated_key, names, slots))
+    with platform_refresh_area:
+        render_platform_refresh_progress(slots)
     
-    if st.session_state.section_visibility['edit_metrics']:
-        st.markdown("""
-        <div class="sf-card">
-            <div class="sf-card-header">
-                <h3 class="sf-card-title">Edit Raw Metrics</h3>
-            </div>
-            <p><em>Only raw metrics can be edited. Calculated metrics update automatically. API data can be overridden.</em></p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Create input fields for raw metrics only
-        raw_metrics = {k: v for k, v in current_table['metrics'].items() if v['type'] == 'raw'}
-        
-        if raw_metrics:
-            # Column headers for inputs
-            input_cols = st.columns(len(current_table['columns']))
-            for i, column in enumerate(current_table['columns']):
-                input_cols[i].markdown(f"**{column['name']}**")
-                input_cols[i].caption(column['display_name'])
-            
-            # Input fields for each raw metric
-            for metric_key, metric in raw_metrics.items():
-                st.markdown(f"### {metric['name']}")
-                input_cols = st.columns(len(current_table['columns']))
-                
-                for i, column in enumerate(current_table['columns']):
-                    current_value = current_table['data'][metric_key][column['name']]
-                    source = current_table.get('data_source', {}).get(metric_key, {}).get(column['name'], 'manual')
-                    
-                    # Show different styling for API vs manual data
-                    help_text = "API data (you can override)" if source == 'api' else "Manual input"
-                    
-                    new_value = input_cols[i].number_input(
-                        f"{metric['name']} - {column['name']}",
-                        value=float(current_value),
-                        step=0.01,
-                        key=f"input_{metric_key}_{column['name']}_{st.session_state.active_table}",
-                        label_visibility="collapsed",
-                        help=help_text
-                    )
-                    
-                    # Update data and mark as manual if changed
-                    if new_value != current_value:
-                        current_table['data'][metric_key][column['name']] = new_value
-                        current_table['data_source'][metric_key][column['name']] = 'manual'
+    # Portfolio ranking across ad accounts
+    render_portfolio_section()
     
-    # Quick stats section with toggle
-    col1, col2 = st.columns([6, 1])
-    with col1:
-        st.markdown("### Quick Stats (Current Week)")
-    with col2:
-        if st.button("Show/Hide" if st.session_state.section_visibility['quick_stats'] else "Show/Hide", 
-                    key="toggle_quick_stats"):
-            st.session_state.section_visibility['quick_stats'] = not st.session_state.section_visibility['quick_stats']
+    # Hourly heatmap and pacing
+    render_hourly_section()
     
-    if st.session_state.section_visibility['quick_stats']:
-        st.markdown("""
-        <div class="sf-card">
-            <div class="sf-card-header">
-                <h3 class="sf-card-title">Quick Stats (Current Week)</h3>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        if current_table['columns']:
-            current_week = current_table['columns'][-1]['name']  # Most recent week
-            week_data = {k: current_table['data'][k][current_week] for k in current_table['data'].keys()}
-            
-            # Create metrics cards
-            st.markdown('<div class="metrics-grid">', unsafe_allow_html=True)
-            
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                spend = week_data.get('spend', 0)
-                st.markdown(f"""
-                <div class="metric-card">
-                    <div class="metric-value">{format_value(spend, 'currency')}</div>
-                    <div class="metric-label">Total Spend</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                clicks = week_data.get('clicks', 0)
-                st.markdown(f"""
-                <div class="metric-card">
-                    <div class="metric-value">{format_value(clicks, 'number')}</div>
-                    <div class="metric-label">Total Clicks</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col3:
-                ctr = calculate_metric('ctr', week_data)
-                st.markdown(f"""
-                <div class="metric-card">
-                    <div class="metric-value">{format_value(ctr, 'percentage')}</div>
-                    <div class="metric-label">CTR</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col4:
-                roas = calculate_metric('roas', week_data)
-                st.markdown(f"""
-                <div class="metric-card">
-                    <div class="metric-value">{format_value(roas, 'ratio')}</div>
-                    <div class="metric-label">ROAS</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            st.markdown('</div>', unsafe_allow_html=True)
+    # Metric trend charts
+    render_trend_section()
     
     # Instructions section with toggle
     col1, col2 = st.columns([6, 1])
@@ -1237,4 +1913,4 @@ def main():
         """)
 
 if __name__ == "__main__":
-    main()
+    run_main(main, 'streamlit_app')
@@ -0,0 +1,32 @@
+import arrow_store
+from arrow_store import InsightsStore
+
+def spend(store, start_date='2024-01-01', end_date='2024-01-31'):
+    return {date: row['spend'] for date, row in store.get_daily('1', start_date, end_date).items()}
+
+def test_newer_segment_overrides_days(tmp_path):
+    store = InsightsStore(str(tmp_path))
+    store.append_days('1', {'2024-01-01': {'spend': 1}, '2024-01-02': {'spend': 2}}, '2024-01-01', '2024-01-02')
+    store.append_days('1', {'2024-01-02': {'spend': 20}, '2024-01-03': {'spend': 30}}, '2024-01-02', '2024-01-03')
+    assert spend(store) == {'2024-01-01': 1.0, '2024-01-02': 20.0, '2024-01-03': 30.0}
+    assert spend(store, '2024-01-02', '2024-01-02') == {'2024-01-02': 20.0}
+
+def test_refetched_span_drops_days_without_delivery(tmp_path):
+    store = InsightsStore(str(tmp_path))
+    store.append_days('1', {'2024-01-01': {'spend': 1}, '2024-01-02': {'spend': 2}, '2024-01-03': {'spend': 3}})
+    store.append_days('1', {'2024-01-01': {'spend': 10}}, '2024-01-01', '2024-01-02')
+    assert spend(store) == {'2024-01-01': 10.0, '2024-01-03': 3.0}
+    # A re-fetch that returned no rows at all still covers its span
+    store.append_days('1', {}, '2024-01-03', '2024-01-03')
+    assert spend(store) == {'2024-01-01': 10.0}
+
+def test_compaction_keeps_latest_days(tmp_path, monkeypatch):
+    monkeypatch.setattr(arrow_store, 'COMPACT_SEGMENTS', 3)
+    store = InsightsStore(str(tmp_path))
+    store.append_days('1', {'2024-01-01': {'spend': 1}, '2024-01-02': {'spend': 2}}, '2024-01-01', '2024-01-02', 100)
+    store.append_days('1', {}, '2024-01-02', '2024-01-02', 200)
+    store.append_days('1', {'2024-01-05': {'spend': 5}}, '2024-01-04', '2024-01-05', 300)
+    segments = store.read_manifest('1')['segments']
+    assert len(segments) == 1
+    assert (segments[0]['min_date'], segments[0]['max_date'], segments[0]['fetched_at']) == ('2024-01-01', '2024-01-05', 100)
+    assert spend(store) == {'2024-01-01': 1.0, '2024-01-05': 5.0}
@@ -0,0 +1,44 @@
+from cache_daemon import LRUCache
+
+def size(key, raw):
+    return len(key) + len(raw)
+
+def test_get_many_hits_and_misses():
+    cache = LRUCache(1000)
+    assert cache.set_many([('a', '1', 60), ('b', '[2]', 60)]) == 2
+    assert cache.get_many(['a', 'b', 'c']) == ['1', '[2]', None]
+    assert (cache.stats['hits'], cache.stats['misses']) == (2, 1)
+
+def test_later_value_of_a_key_wins():
+    cache = LRUCache(1000)
+    assert cache.set_many([('a', '1', 60), ('a', '22', 60)]) == 1
+    cache.set_many([('a', '333', 60)])
+    assert cache.get_many(['a']) == ['333']
+    assert cache.bytes == size('a', '333')
+
+def test_expired_entries_are_dropped():
+    cache = LRUCache(1000)
+    cache.set_many([('a', '1', -1), ('b', '2', 60)])
+    assert cache.get_many(['a', 'b']) == [None, '2']
+    assert cache.stats['expired'] == 1
+    assert cache.bytes == size('b', '2')
+
+def test_coldest_entries_are_evicted():
+    cache = LRUCache(3 * size('k1', 'x' * 8))
+    cache.set_many([('k1', 'x' * 8, 60), ('k2', 'x' * 8, 60), ('k3', 'x' * 8, 60)])
+    # Reading k1 makes k2 the coldest
+    cache.get_many(['k1'])
+    cache.set_many([('k4', 'x' * 8, 60)])
+    assert cache.get_many(['k1', 'k2', 'k3', 'k4']) == ['x' * 8, None, 'x' * 8, 'x' * 8]
+    assert cache.stats['evictions'] == 1
+    assert cache.bytes <= cache.max_bytes
+
+def test_batch_never_evicts_itself():
+    cache = LRUCache(2 * size('k1', 'x' * 8))
+    cache.set_many([('old', 'x', 60)])
+    items = [('k1', 'x' * 8, 60), ('k2', 'x' * 8, 60), ('k3', 'x' * 8, 60), ('k4', 'y' * 100, 60)]
+    # The last items that fit are kept; k4 alone is bigger than the cache
+    assert cache.set_many(items) == 2
+    assert cache.get_many(['old', 'k1', 'k2', 'k3', 'k4']) == [None, None, 'x' * 8, 'x' * 8, None]
+    assert cache.stats['rejected'] == 2
+    assert cache.bytes == cache.max_bytes
@@ -0,0 +1,40 @@
+import numpy as np
+
+from charts import build_trend_figure, lttb
+
+def test_short_series_are_kept_whole():
+    assert lttb(np.arange(10), np.ones(10), threshold=10).tolist() == list(range(10))
+    assert lttb(np.arange(10), np.ones(10), threshold=2).tolist() == list(range(10))
+
+def test_downsampling_keeps_ends_in_order():
+    x = np.arange(10000)
+    y = np.sin(x / 50.0)
+    kept = lttb(x, y, threshold=500)
+    assert len(kept) == 500
+    assert (kept[0], kept[-1]) == (0, 9999)
+    assert (np.diff(kept) > 0).all()
+
+def test_downsampling_keeps_peaks_and_dips():
+    y = np.zeros(5000)
+    y[1234] = 100.0
+    y[3210] = -50.0
+    kept = lttb(np.arange(5000), y, threshold=100)
+    assert 1234 in kept
+    assert 3210 in kept
+
+def test_one_point_per_bucket():
+    x = np.arange(1001)
+    kept = lttb(x, np.random.default_rng(0).normal(size=1001), threshold=12)
+    edges = np.floor(np.linspace(1, 1000, 11)).astype(np.int64)
+    # Each middle point comes from its own bucket
+    assert (np.searchsorted(edges, kept[1:-1], side='right') == np.arange(1, 11)).all()
+
+def test_figure_reports_points_sent():
+    dates = np.datetime64('2020-01-01') + np.arange(3000)
+    values = np.arange(3000, dtype=np.float64)
+    figure, sent, total = build_trend_figure([('Daily', dates[::-1], values[::-1])], 'spend', max_points=300)
+    assert (sent, total) == (300, 3000)
+    trace = figure.data[0]
+    assert len(trace.x) == 300
+    # Points are sorted by date before downsampling
+    assert trace.y[0] == 0.0 and trace.y[-1] == 2999.0
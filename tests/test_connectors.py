@@ -0,0 +1,30 @@
+import json
+
+from connectors import FileConnector
+
+def test_csv_rows_for_one_date_are_summed(tmp_path):
+    path = tmp_path / 'daily.csv'
+    path.write_text('date,spend,clicks\n2024-01-01,1.5,2\n2024-01-01,3,\n2024-01-02,5,1\n')
+    daily_data = FileConnector(str(path)).read_daily_rows()
+    assert daily_data['2024-01-01']['spend'] == 4.5
+    assert daily_data['2024-01-01']['clicks'] == 2.0
+    assert daily_data['2024-01-02']['spend'] == 5.0
+
+def test_json_list_rows_for_one_date_are_summed(tmp_path):
+    path = tmp_path / 'daily.json'
+    path.write_text(json.dumps([
+        {'date': '2024-01-01', 'spend': 1, 'purchase': 1},
+        {'date': '2024-01-01', 'spend': 2},
+        {'date': '2024-01-03', 'spend': 4}
+    ]))
+    connector = FileConnector(str(path))
+    assert connector.read_daily_rows()['2024-01-01']['spend'] == 3.0
+    totals = connector.fetch_range('2024-01-01', '2024-01-02', ['spend', 'purchase'])
+    assert totals == {'spend': 3.0, 'purchase': 1.0}
+
+def test_json_mapping_by_date(tmp_path):
+    path = tmp_path / 'daily.json'
+    path.write_text(json.dumps({'2024-01-01': {'spend': 4, 'impressions': 100}}))
+    daily_data = FileConnector(str(path)).read_daily_rows()
+    assert list(daily_data) == ['2024-01-01']
+    assert (daily_data['2024-01-01']['spend'], daily_data['2024-01-01']['impressions']) == (4.0, 100.0)
@@ -0,0 +1,53 @@
+from dashboard_core import FACEBOOK_FIELD_MAP, ROLLUP_MAX_DAYS, plan_fetch_granularity, plan_insights_fields
+
+def test_plan_all_metrics_by_default():
+    plan = plan_insights_fields()
+    assert plan['raw_metrics'] == list(FACEBOOK_FIELD_MAP)
+    assert plan['fields'] == ['spend', 'impressions', 'clicks', 'actions', 'action_values']
+    assert plan['action_types'] == ['add_to_cart', 'initiate_checkout', 'purchase', 'complete_registration']
+
+def test_plan_expands_calculated_metrics():
+    plan = plan_insights_fields(['ctr'])
+    assert plan['raw_metrics'] == ['clicks', 'impressions']
+    assert plan['fields'] == ['clicks', 'impressions']
+    assert plan['action_types'] == []
+
+def test_plan_requests_only_needed_action_types():
+    plan = plan_insights_fields(['roas'])
+    assert plan['raw_metrics'] == ['purchase_revenue', 'spend']
+    assert plan['fields'] == ['action_values', 'spend']
+    assert plan['action_types'] == ['purchase', 'complete_registration']
+
+def test_plan_shares_fields_between_metrics():
+    plan = plan_insights_fields(['cpc', 'ctr', 'purchase', 'purchase_revenue'])
+    assert plan['raw_metrics'] == ['spend', 'clicks', 'impressions', 'purchase', 'purchase_revenue']
+    assert plan['fields'] == ['spend', 'clicks', 'impressions', 'actions', 'action_values']
+    assert plan['action_types'] == ['purchase', 'complete_registration']
+
+def test_plan_ignores_unknown_metrics():
+    assert plan_insights_fields(['custom']) == {'raw_metrics': [], 'fields': [], 'action_types': []}
+
+def column(start_date, end_date):
+    return {'name': f"{start_date}..{end_date}", 'start_date': start_date, 'end_date': end_date}
+
+def test_granularity_without_columns():
+    assert plan_fetch_granularity([]) == {'granularity': 'total', 'since': None, 'until': None}
+
+def test_granularity_separate_ranges_fetch_totals():
+    plan = plan_fetch_granularity([column('2024-01-08', '2024-01-14'), column('2024-01-01', '2024-01-07')])
+    assert plan == {'granularity': 'total', 'since': '2024-01-01', 'until': '2024-01-14'}
+
+def test_granularity_overlapping_ranges_share_daily_rows():
+    plan = plan_fetch_granularity([column('2024-01-01', '2024-01-14'), column('2024-01-08', '2024-01-21')])
+    assert plan == {'granularity': 'daily', 'since': '2024-01-01', 'until': '2024-01-21'}
+
+def test_granularity_long_overlapping_span_fetches_totals():
+    columns = [column('2024-01-01', '2024-01-31'), column('2024-01-15', '2024-02-15')]
+    assert plan_fetch_granularity(columns)['granularity'] == 'total'
+    # The span limit is inclusive of both ends
+    columns = [column('2024-01-01', '2024-01-20'), column('2024-01-10', f"2024-01-{ROLLUP_MAX_DAYS}")]
+    assert plan_fetch_granularity(columns)['granularity'] == 'daily'
+
+def test_granularity_daily_when_needed():
+    plan = plan_fetch_granularity([column('2024-01-01', '2024-03-31')], needs_daily=True)
+    assert plan == {'granularity': 'daily', 'since': '2024-01-01', 'until': '2024-03-31'}
@@ -0,0 +1,54 @@
+from arrow_store import InsightsStore
+from range_index import INITIAL_CAPACITY_DAYS, PrefixSumIndex, RangeIndexRegistry
+
+def test_range_totals_sum_loaded_days():
+    index = PrefixSumIndex(['spend', 'clicks'])
+    index.add_days({'2024-01-01': {'spend': 1, 'clicks': 10}, '2024-01-02': {'spend': 2}, '2024-01-03': {'spend': 4}})
+    assert index.range_totals('2024-01-01', '2024-01-03') == {'spend': 7.0, 'clicks': 10.0}
+    assert index.range_totals('2024-01-02', '2024-01-02') == {'spend': 2.0, 'clicks': 0.0}
+
+def test_range_totals_need_every_day():
+    index = PrefixSumIndex(['spend'])
+    index.add_days({'2024-01-01': {'spend': 1}, '2024-01-03': {'spend': 4}})
+    assert index.range_totals('2024-01-01', '2024-01-03') is None
+    assert index.range_totals('2023-12-31', '2024-01-01') is None
+    assert index.range_totals('2024-01-03', '2024-01-04') is None
+    # A fetched span counts its days without delivery as zero
+    index.add_days({}, '2024-01-02', '2024-01-02')
+    assert index.range_totals('2024-01-01', '2024-01-03') == {'spend': 5.0}
+
+def test_earlier_and_later_days_extend_the_index():
+    index = PrefixSumIndex(['spend'])
+    index.add_days({'2024-03-01': {'spend': 1}})
+    index.add_days({'2024-02-28': {'spend': 2}, '2024-02-29': {'spend': 3}})
+    index.add_days({'2024-06-30': {'spend': 8}}, '2024-03-02', '2024-06-30')
+    assert index.days > INITIAL_CAPACITY_DAYS
+    assert index.coverage() == ('2024-02-28', '2024-06-30')
+    assert index.range_totals('2024-02-28', '2024-03-01') == {'spend': 6.0}
+    assert index.range_totals('2024-02-29', '2024-06-30') == {'spend': 12.0}
+
+def test_fetched_at_reports_oldest_day():
+    index = PrefixSumIndex(['spend'])
+    index.add_days({'2024-01-01': {'spend': 1}}, '2024-01-01', '2024-01-02', fetched_at=100)
+    index.add_days({'2024-01-02': {'spend': 1}}, fetched_at=200)
+    assert index.range_fetched_at('2024-01-01', '2024-01-02') == 100
+    assert index.range_fetched_at('2024-01-02', '2024-01-02') == 200
+    index.add_days({'2024-01-03': {'spend': 1}})
+    assert index.range_fetched_at('2024-01-01', '2024-01-03') is None
+
+def test_registry_builds_from_store_and_follows_appends(tmp_path):
+    store = InsightsStore(str(tmp_path))
+    registry = RangeIndexRegistry(store)
+    store.append_days('1', {'2024-01-01': {'spend': 1}, '2024-01-02': {'spend': 2}}, '2024-01-01', '2024-01-02', 100)
+    assert registry.get('1').range_totals('2024-01-01', '2024-01-02')['spend'] == 3.0
+    
+    daily_data = {'2024-01-03': {'spend': 4}}
+    version = store.append_days('1', daily_data, '2024-01-02', '2024-01-03', 200)
+    registry.add_days('1', daily_data, '2024-01-02', '2024-01-03', version, 200)
+    index = registry.get('1')
+    assert index.version == version
+    assert index.range_totals('2024-01-01', '2024-01-03')['spend'] == 5.0
+    
+    # Rebuilt from the store once another writer moved the manifest on
+    store.append_days('1', {'2024-01-01': {'spend': 10}}, '2024-01-01', '2024-01-01', 300)
+    assert registry.get('1').range_totals('2024-01-01', '2024-01-03')['spend'] == 14.0
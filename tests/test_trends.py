@@ -0,0 +1,43 @@
+import numpy as np
+
+from trends import MAD_SCALE, anomaly_scores, compute_trends
+
+def test_scores_need_a_full_window():
+    scores = anomaly_scores(np.array([[1.0, 2.0, 3.0, 4.0]]), window=4)
+    assert np.isnan(scores).all()
+
+def test_robust_score_against_trailing_window():
+    scores = anomaly_scores(np.array([[10.0, 12.0, 11.0, 13.0, 12.0, 40.0]]), window=4)
+    assert np.isnan(scores[0, :4]).all()
+    assert np.isclose(scores[0, 4], 0.5 / MAD_SCALE)
+    assert np.isclose(scores[0, 5], 28 / (0.5 * MAD_SCALE))
+
+def test_no_spread_falls_back_to_standard_score():
+    scores = anomaly_scores(np.array([[5.0, 5.0, 5.0, 9.0, 6.0], [5.0, 5.0, 5.0, 5.0, 7.0]]), window=4)
+    # MAD is 0 but the standard deviation is not
+    assert np.isclose(scores[0, 4], 0.0)
+    # A flat window has no baseline spread at all
+    assert np.isnan(scores[1, 4])
+
+def test_trends_flag_spikes_and_rate_direction():
+    columns = [{'name': f"W{i}"} for i in range(6)]
+    spend = [100.0, 110.0, 105.0, 95.0, 100.0, 400.0]
+    clicks = [50.0] * 6
+    table = {
+        'columns': columns,
+        'metrics': {'spend': {'type': 'raw'}, 'clicks': {'type': 'raw'}, 'cpc': {'type': 'calculated'}},
+        'data': {
+            'spend': dict(zip([column['name'] for column in columns], spend)),
+            'clicks': dict(zip([column['name'] for column in columns], clicks)),
+            'cpc': {}
+        }
+    }
+    trends = compute_trends(table, window=4)
+    assert trends['metrics'] == ['spend', 'clicks', 'cpc']
+    assert np.allclose(trends['delta'][2, 1:], np.diff(np.array(spend) / 50))
+    assert trends['flags'][0].tolist() == [False] * 5 + [True]
+    assert not trends['flags'][1].any()
+    # Rising spend is good news, a rising cost per click is not
+    assert trends['direction'][0, 5] == 1.0
+    assert trends['direction'][2, 5] == -1.0
+    assert np.isclose(trends['pct'][0, 5], 300.0)
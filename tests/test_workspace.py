@@ -0,0 +1,115 @@
+import json
+import os
+
+import workspace
+from workspace import JOURNAL_NAME, SNAPSHOT_NAME, Workspace, diff_table
+
+def make_table():
+    columns = [{'name': 'Week 1', 'start_date': '2024-01-01', 'end_date': '2024-01-07'}]
+    return {
+        'platform': 'Facebook',
+        'columns': columns,
+        'metrics': {'spend': {'type': 'raw'}, 'clicks': {'type': 'raw'}},
+        'data': {'spend': {'Week 1': 0.0}, 'clicks': {'Week 1': 0.0}},
+        'data_source': {'spend': {'Week 1': 'manual'}, 'clicks': {'Week 1': 'manual'}},
+        'fetched_at': {},
+        'summary': ''
+    }
+
+def edit_cells(ws, count):
+    """Record count single-cell edits to the spend cell, one journal entry each"""
+    for i in range(count):
+        old = ws.tables['facebook']
+        new = json.loads(json.dumps(old))
+        new['data']['spend']['Week 1'] = float(i + 1)
+        new['data_source']['spend']['Week 1'] = 'api'
+        new['fetched_at'] = {'spend': {'Week 1': 1000.0 + i}}
+        ws.record({'facebook': diff_table(old, new)})
+
+def journal_lines(tmp_path):
+    return (tmp_path / 'ws' / JOURNAL_NAME).read_text().splitlines()
+
+def test_reopen_replays_journal(tmp_path):
+    ws = Workspace('ws', str(tmp_path))
+    ws.record({'facebook': diff_table(None, make_table())})
+    edit_cells(ws, 3)
+    ws.flush()
+    assert len(journal_lines(tmp_path)) == 4
+    
+    reopened = Workspace('ws', str(tmp_path))
+    assert reopened.tables == ws.tables
+    assert reopened.seq == 4
+    assert reopened.journal_entries == 4
+    assert reopened.tables['facebook']['data']['spend']['Week 1'] == 3.0
+    assert reopened.tables['facebook']['fetched_at'] == {'spend': {'Week 1': 1002.0}}
+
+def test_column_and_metric_ops_reshape_rows(tmp_path):
+    ws = Workspace('ws', str(tmp_path))
+    ws.record({'facebook': diff_table(None, make_table())})
+    edit_cells(ws, 1)
+    old = ws.tables['facebook']
+    new = json.loads(json.dumps(old))
+    new['columns'].append({'name': 'Week 2', 'start_date': '2024-01-08', 'end_date': '2024-01-14'})
+    new['metrics'] = {'spend': {'type': 'raw'}}
+    ws.record({'facebook': diff_table(old, new)})
+    ws.flush()
+    
+    table = Workspace('ws', str(tmp_path)).tables['facebook']
+    assert table['data'] == {'spend': {'Week 1': 1.0, 'Week 2': 0.0}}
+    assert table['data_source'] == {'spend': {'Week 1': 'api', 'Week 2': 'manual'}}
+    assert table['fetched_at'] == {'spend': {'Week 1': 1000.0}}
+
+def test_torn_final_line_is_cut(tmp_path):
+    ws = Workspace('ws', str(tmp_path))
+    ws.record({'facebook': diff_table(None, make_table())})
+    edit_cells(ws, 2)
+    ws.flush()
+    with open(tmp_path / 'ws' / JOURNAL_NAME, 'a') as f:
+        f.write('{"seq": 4, "time": 0, "table": "facebook", "op": "summary", "value": "torn"}')
+    
+    reopened = Workspace('ws', str(tmp_path))
+    assert reopened.seq == 3
+    assert reopened.tables['facebook']['summary'] == ''
+    assert len(journal_lines(tmp_path)) == 3
+    # Later appends start on a line of their own
+    reopened.record({'facebook': [('summary', 'kept')]})
+    reopened.flush()
+    assert Workspace('ws', str(tmp_path)).tables['facebook']['summary'] == 'kept'
+
+def test_long_journal_compacts_into_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, 'JOURNAL_COMPACT_ENTRIES', 5)
+    ws = Workspace('ws', str(tmp_path))
+    ws.record({'facebook': diff_table(None, make_table())})
+    edit_cells(ws, 2)
+    ws.flush()
+    assert not os.path.exists(tmp_path / 'ws' / SNAPSHOT_NAME)
+    
+    edit_cells(ws, 4)
+    ws.flush()
+    assert journal_lines(tmp_path) == []
+    assert ws.journal_entries == 0
+    snapshot = json.loads((tmp_path / 'ws' / SNAPSHOT_NAME).read_text())
+    assert snapshot['seq'] == 7
+    assert snapshot['tables'] == ws.tables
+    
+    edit_cells(ws, 1)
+    ws.flush()
+    reopened = Workspace('ws', str(tmp_path))
+    assert reopened.tables == ws.tables
+    assert (reopened.seq, reopened.journal_entries) == (8, 1)
+
+def test_entries_covered_by_snapshot_are_skipped(tmp_path):
+    ws = Workspace('ws', str(tmp_path))
+    ws.record({'facebook': diff_table(None, make_table())})
+    ws.record({'facebook': [('summary', 'first')]})
+    ws.flush()
+    journal = (tmp_path / 'ws' / JOURNAL_NAME).read_text()
+    ws.record({'facebook': [('summary', 'second')]})
+    ws.flush()
+    ws.compact()
+    # A crash between the snapshot and the journal truncation leaves the old entries behind
+    (tmp_path / 'ws' / JOURNAL_NAME).write_text(journal)
+    
+    reopened = Workspace('ws', str(tmp_path))
+    assert reopened.seq == 3
+    assert reopened.tables['facebook']['summary'] == 'second'
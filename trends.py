@@ -0,0 +1,95 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from dashboard_core import METRIC_FORMULAS
+
+# Trailing periods each column is compared against for anomaly flags
+ANOMALY_WINDOW = 4
+
+# |z| above this flags a cell
+ANOMALY_THRESHOLD = 3.0
+
+# Scales the median absolute deviation to a standard deviation for normal data
+MAD_SCALE = 1.4826
+
+# Metrics where a rise is bad news
+LOWER_IS_BETTER = {'cpm', 'cpc', 'cost_per_purchase'}
+
+def table_matrix(table):
+    """Metric keys and a metrics x columns float array of the table's raw and calculated values"""
+    metric_keys = list(table['metrics'].keys())
+    column_names = [column['name'] for column in table['columns']]
+    data = table['data']
+    values = np.array(
+        [[float(data.get(metric_key, {}).get(name, 0) or 0) for name in column_names] for metric_key in metric_keys],
+        dtype=np.float64
+    ).reshape(len(metric_keys), len(column_names))
+    
+    # Calculated rows are recomputed a whole row at a time from their raw rows
+    rows = {metric_key: i for i, metric_key in enumerate(metric_keys)}
+    for metric_key, i in rows.items():
+        if metric_key in METRIC_FORMULAS and table['metrics'][metric_key]['type'] == 'calculated':
+            numerator, denominator, scale = METRIC_FORMULAS[metric_key]
+            top = values[rows[numerator]] if numerator in rows else np.zeros(len(column_names))
+            bottom = values[rows[denominator]] if denominator in rows else np.zeros(len(column_names))
+            values[i] = 0.0
+            np.divide(top * scale, bottom, out=values[i], where=bottom > 0)
+    return metric_keys, values
+
+def period_changes(values):
+    """Absolute and percent change of every cell against the previous column (NaN for the first)"""
+    delta = np.full(values.shape, np.nan)
+    pct = np.full(values.shape, np.nan)
+    if values.shape[1] > 1:
+        previous = values[:, :-1]
+        delta[:, 1:] = values[:, 1:] - previous
+        np.divide(delta[:, 1:] * 100, np.abs(previous), out=pct[:, 1:], where=previous != 0)
+    return delta, pct
+
+def anomaly_scores(values, window=ANOMALY_WINDOW):
+    """Robust z-score of each cell against the trailing window of columns before it
+    
+    The baseline is the window's median and MAD; a window with no spread
+    (MAD of 0) falls back to the mean and standard deviation. Cells with fewer
+    than `window` earlier columns, or a flat window, score NaN.
+    """
+    scores = np.full(values.shape, np.nan)
+    if values.shape[1] <= window:
+        return scores
+    
+    # metrics x periods x window view of the columns before each scored column
+    windows = sliding_window_view(values[:, :-1], window, axis=1)
+    current = values[:, window:]
+    median = np.median(windows, axis=2)
+    mad = np.median(np.abs(windows - median[..., None]), axis=2) * MAD_SCALE
+    mean = windows.mean(axis=2)
+    std = windows.std(axis=2)
+    
+    robust = np.full(current.shape, np.nan)
+    np.divide(current - median, mad, out=robust, where=mad > 0)
+    standard = np.full(current.shape, np.nan)
+    np.divide(current - mean, std, out=standard, where=std > 0)
+    scores[:, window:] = np.where(mad > 0, robust, standard)
+    return scores
+
+def compute_trends(table, window=ANOMALY_WINDOW, threshold=ANOMALY_THRESHOLD):
+    """Changes and anomaly flags for every cell of a table, computed as whole-array operations
+    
+    Returns {'metrics': keys, 'delta', 'pct', 'score', 'flags', 'direction'}
+    with metrics x columns arrays. direction is +1 where the move is good for
+    the metric, -1 where it is bad and 0 where there is no change.
+    """
+    metric_keys, values = table_matrix(table)
+    delta, pct = period_changes(values)
+    score = anomaly_scores(values, window)
+    flags = np.abs(np.nan_to_num(score)) > threshold
+    polarity = np.array([-1.0 if metric_key in LOWER_IS_BETTER else 1.0 for metric_key in metric_keys])
+    direction = np.sign(np.nan_to_num(delta)) * polarity[:, None]
+    return {
+        'metrics': metric_keys,
+        'delta': delta,
+        'pct': pct,
+        'score': score,
+        'flags': flags,
+        'direction': direction
+    }
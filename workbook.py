@@ -0,0 +1,135 @@
+import os
+import tempfile
+
+import xlsxwriter
+
+from dashboard_core import DEFAULT_METRICS, PLATFORM_NAMES, calculate_metric, create_initial_table
+
+RAW_METRICS = [key for key, metric in DEFAULT_METRICS.items() if metric['type'] == 'raw']
+
+# Excel number formats for the table's format types (percentages are already x100)
+NUMBER_FORMATS = {
+    'currency': '$#,##0.00',
+    'percentage': '0.00"%"',
+    'ratio': '0.00"x"',
+    'number': '#,##0'
+}
+
+# Same fills as the dashboard's API-sourced and imported cells
+SOURCE_FILLS = {
+    'api': '#e8f7ea',
+    'import': '#f3ecfb'
+}
+
+SHEET_NAME_MAX = 31
+
+class FormatCache:
+    """Create each (number format, source fill, bold) combination once per workbook"""
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self.formats = {}
+    
+    def get(self, format_type=None, source=None, bold=False):
+        key = (format_type, source, bold)
+        if key not in self.formats:
+            properties = {}
+            if format_type in NUMBER_FORMATS:
+                properties['num_format'] = NUMBER_FORMATS[format_type]
+            if source in SOURCE_FILLS:
+                properties['bg_color'] = SOURCE_FILLS[source]
+            if bold:
+                properties['bold'] = True
+            self.formats[key] = self.workbook.add_format(properties)
+        return self.formats[key]
+
+def write_row(worksheet, row_index, values, cell_format=None):
+    for column_index, value in enumerate(values):
+        worksheet.write(row_index, column_index, value, cell_format)
+
+def write_summary_sheet(workbook, formats, tables):
+    """One row per platform: date range, column count and the summary text"""
+    worksheet = workbook.add_worksheet('Report Summary')
+    write_row(worksheet, 0, ['Platform', 'Columns', 'From', 'To', 'Summary'], formats.get(bold=True))
+    for row_index, table in enumerate(tables, start=1):
+        columns = table['columns']
+        write_row(worksheet, row_index, [
+            table['platform'],
+            len(columns),
+            min((column['start_date'] for column in columns), default=''),
+            max((column['end_date'] for column in columns), default=''),
+            table['summary']
+        ])
+    worksheet.set_column(4, 4, 80)
+
+def write_table_sheet(workbook, formats, table):
+    """Metrics down, columns across, numbers kept numeric with the table's formats"""
+    worksheet = workbook.add_worksheet(table['platform'][:SHEET_NAME_MAX])
+    columns = table['columns']
+    header = ['Metric'] + [f"{column['name']} ({column['display_name']})" for column in columns]
+    write_row(worksheet, 0, header, formats.get(bold=True))
+    worksheet.set_column(0, 0, 24)
+    
+    for row_index, (metric_key, metric) in enumerate(table['metrics'].items(), start=1):
+        worksheet.write(row_index, 0, metric['name'], formats.get(bold=True))
+        for column_index, column in enumerate(columns, start=1):
+            if metric['type'] == 'calculated':
+                raw_data = {key: table['data'][key][column['name']] for key in table['data']}
+                value = calculate_metric(metric_key, raw_data)
+            else:
+                value = table['data'][metric_key][column['name']]
+            source = table['data_source'].get(metric_key, {}).get(column['name'])
+            worksheet.write_number(row_index, column_index, float(value or 0), formats.get(metric['format'], source))
+
+def write_daily_sheet(workbook, formats, daily_rows):
+    """Raw metrics per day and source; daily_rows yields (date, source, metrics dict)"""
+    worksheet = workbook.add_worksheet('Raw Daily')
+    write_row(worksheet, 0, ['Date', 'Source'] + [DEFAULT_METRICS[key]['name'] for key in RAW_METRICS], formats.get(bold=True))
+    for row_index, (date, source, metrics) in enumerate(daily_rows, start=1):
+        worksheet.write(row_index, 0, date)
+        worksheet.write(row_index, 1, source)
+        for column_index, metric_key in enumerate(RAW_METRICS, start=2):
+            worksheet.write_number(
+                row_index, column_index, float(metrics.get(metric_key, 0)), formats.get(DEFAULT_METRICS[metric_key]['format'])
+            )
+
+def write_workbook(path, tables, daily_rows=()):
+    """Stream every table plus the summary and daily rows into an .xlsx file
+    
+    constant_memory mode flushes each row to disk as soon as the next one
+    starts, so memory does not grow with the number of columns or days.
+    """
+    tables = list(tables)
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    formats = FormatCache(workbook)
+    try:
+        write_summary_sheet(workbook, formats, tables)
+        for table in tables:
+            write_table_sheet(workbook, formats, table)
+        write_daily_sheet(workbook, formats, daily_rows)
+    finally:
+        workbook.close()
+
+def build_workbook_bytes(tables, daily_rows=()):
+    """Write the workbook to a temporary file and return its bytes for download"""
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    try:
+        write_workbook(path, tables, daily_rows)
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+def platform_tables(tables):
+    """Every platform in tab order, using a fresh table for tabs never opened"""
+    for table_key, platform in PLATFORM_NAMES.items():
+        yield tables[table_key] if table_key in tables else create_initial_table(platform)
+
+def iter_daily_rows(facebook_daily_data=None, hourly_store=None):
+    """Daily raw metrics from a Facebook daily fetch and from the hourly store, by date"""
+    for date in sorted(facebook_daily_data or {}):
+        yield date, 'Facebook API', facebook_daily_data[date]
+    if hourly_store is not None:
+        daily = hourly_store.daily_totals()
+        for date, values in zip(hourly_store.day_dates(), daily):
+            yield date.strftime('%Y-%m-%d'), 'Facebook hourly', dict(zip(hourly_store.metrics, values.tolist()))
@@ -0,0 +1,291 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+
+# One directory per workspace: snapshot.json plus journal.jsonl of the edits made since it
+WORKSPACE_DIR = os.environ.get('DASHBOARD_WORKSPACE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workspaces'))
+
+# Buffered edits are written once no new edit arrived for this long...
+JOURNAL_FLUSH_SECONDS = 1.0
+
+# ...and never held longer than this under a steady stream of edits
+JOURNAL_MAX_DELAY_SECONDS = 5.0
+
+# Fold the journal into a new snapshot once it has this many entries
+JOURNAL_COMPACT_ENTRIES = 500
+
+SNAPSHOT_NAME = 'snapshot.json'
+JOURNAL_NAME = 'journal.jsonl'
+
+WORKSPACE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Table keys journaled op by op; a difference anywhere else rewrites the whole table
+TABLE_FIELDS = ('platform', 'columns', 'metrics', 'data', 'data_source', 'fetched_at', 'summary')
+
+def copy_tables(tables):
+    """Deep copy of plain table data (dicts, lists, strings and numbers)"""
+    return json.loads(json.dumps(tables))
+
+def diff_table(old, new):
+    """Journal ops turning table old into new; old is None for a table not saved before"""
+    if old is None:
+        # Only created if no other session saved the table first
+        return [('create', new)]
+    if old['platform'] != new['platform'] or any(
+        old.get(key) != new.get(key) for key in set(old) | set(new) if key not in TABLE_FIELDS
+    ):
+        return [('table', new)]
+    
+    ops = []
+    if old['columns'] != new['columns']:
+        ops.append(('columns', new['columns']))
+    if old['metrics'] != new['metrics']:
+        ops.append(('metrics', new['metrics']))
+    cells = []
+    for metric_key, row in new['data'].items():
+        old_row = old['data'].get(metric_key, {})
+        sources = new['data_source'].get(metric_key, {})
+        old_sources = old['data_source'].get(metric_key, {})
+        fetched = new.get('fetched_at', {}).get(metric_key, {})
+        old_fetched = old.get('fetched_at', {}).get(metric_key, {})
+        # Whole-row comparison skips untouched rows without a per-cell loop
+        if row == old_row and sources == old_sources and fetched == old_fetched:
+            continue
+        for column_name, value in row.items():
+            source = sources.get(column_name, 'manual')
+            if (
+                old_row.get(column_name) != value or old_sources.get(column_name, 'manual') != source
+                or old_fetched.get(column_name) != fetched.get(column_name)
+            ):
+                cells.append([metric_key, column_name, value, source, fetched.get(column_name)])
+    if cells:
+        ops.append(('cells', cells))
+    if old['summary'] != new['summary']:
+        ops.append(('summary', new['summary']))
+    return ops
+
+def apply_entry(tables, entry):
+    """Apply one journal entry to a tables dict in place"""
+    table_key, op, value = entry['table'], entry['op'], entry['value']
+    if op == 'table':
+        tables[table_key] = value
+        return
+    if op == 'create':
+        tables.setdefault(table_key, value)
+        return
+    table = tables.get(table_key)
+    if table is None:
+        return
+    
+    fetched = table.setdefault('fetched_at', {})
+    if op == 'columns':
+        # Values of columns that keep their name are kept; new columns start empty
+        names = [column['name'] for column in value]
+        table['columns'] = value
+        for rows, default in ((table['data'], 0.0), (table['data_source'], 'manual')):
+            for metric_key, row in rows.items():
+                rows[metric_key] = {name: row.get(name, default) for name in names}
+        for metric_key, row in fetched.items():
+            fetched[metric_key] = {name: row[name] for name in names if name in row}
+    elif op == 'metrics':
+        names = [column['name'] for column in table['columns']]
+        table['metrics'] = value
+        for rows, default in ((table['data'], 0.0), (table['data_source'], 'manual')):
+            for metric_key in [key for key in rows if key not in value]:
+                del rows[metric_key]
+            for metric_key in value:
+                rows.setdefault(metric_key, {name: default for name in names})
+        for metric_key in [key for key in fetched if key not in value]:
+            del fetched[metric_key]
+    elif op == 'cells':
+        for metric_key, column_name, cell, source, *stamp in value:
+            # A cell of a column or metric removed in the meantime is dropped
+            if column_name in table['data'].get(metric_key, {}):
+                table['data'][metric_key][column_name] = cell
+                table['data_source'][metric_key][column_name] = source
+                # Cells journaled before fetch times were kept have no stamp
+                if stamp and stamp[0] is not None:
+                    fetched.setdefault(metric_key, {})[column_name] = stamp[0]
+                else:
+                    fetched.get(metric_key, {}).pop(column_name, None)
+    elif op == 'summary':
+        table['summary'] = value
+
+class Workspace:
+    """Named set of platform tables saved as a snapshot plus an append-only edit journal
+    
+    Edits apply in memory at once and are appended to the journal in batches,
+    JOURNAL_FLUSH_SECONDS after the last edit (at most JOURNAL_MAX_DELAY_SECONDS
+    after the first). Past JOURNAL_COMPACT_ENTRIES the journal is folded into a
+    new snapshot, so opening never replays more than that many entries. Each
+    workspace directory is written by one server process, and sessions never
+    see each other's edits until they reopen it; DASHBOARD_WORKSPACE_DB
+    switches to the shared store in shared_workspace.py.
+    """
+    def __init__(self, name, root=WORKSPACE_DIR):
+        if not WORKSPACE_NAME_PATTERN.match(name):
+            raise ValueError("Workspace names use letters, digits, '-' and '_' only (up to 64)")
+        self.name = name
+        self.directory = os.path.join(root, name)
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.tables = {}
+        self.seq = 0
+        self.journal_entries = 0
+        self.pending = []
+        self.first_pending = None
+        self.timer = None
+        self.saved_at = None
+        self.load()
+    
+    def path(self, name):
+        return os.path.join(self.directory, name)
+    
+    def load(self):
+        """Read the snapshot and replay the journal entries written after it"""
+        try:
+            with open(self.path(SNAPSHOT_NAME)) as f:
+                snapshot = json.load(f)
+            self.tables = snapshot['tables']
+            self.seq = snapshot['seq']
+            self.saved_at = snapshot['saved_at']
+        except FileNotFoundError:
+            pass
+        
+        try:
+            with open(self.path(JOURNAL_NAME), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return
+        good = 0
+        for line in content.splitlines(keepends=True):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            # An unterminated line is a torn write, whether or not it happens to parse
+            if not line.endswith(b'\n'):
+                break
+            good += len(line)
+            self.journal_entries += 1
+            # Entries folded into the snapshot before the journal was cleared
+            if entry['seq'] <= self.seq:
+                continue
+            apply_entry(self.tables, entry)
+            self.seq = entry['seq']
+            self.saved_at = entry['time']
+        if good < len(content):
+            # Cut a crash's torn final line so later appends start on a line of their own
+            os.truncate(self.path(JOURNAL_NAME), good)
+    
+    def checkout(self):
+        """A private copy of the workspace's tables for a session, and its versions (none here)"""
+        with self.lock:
+            return copy_tables(self.tables), {}
+    
+    def commit(self, changes, versions):
+        """Save a session's changes; one user per workspace, so nothing conflicts or comes back"""
+        self.record(changes)
+        return versions, [], []
+    
+    def changes_since(self, versions):
+        return [], versions
+    
+    def record(self, changes):
+        """Apply {table_key: ops} from a session and queue them for the journal"""
+        now = time.time()
+        with self.lock:
+            for table_key, ops in changes.items():
+                for op, value in ops:
+                    self.seq += 1
+                    line = json.dumps({'seq': self.seq, 'time': now, 'table': table_key, 'op': op, 'value': value})
+                    self.pending.append(line)
+                    # Applied from the serialized line so the session's objects are never shared
+                    apply_entry(self.tables, json.loads(line))
+            
+            if self.first_pending is None:
+                self.first_pending = now
+            delay = min(JOURNAL_FLUSH_SECONDS, max(0.0, self.first_pending + JOURNAL_MAX_DELAY_SECONDS - now))
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+    
+    def flush(self):
+        """Append the queued entries to the journal, compacting it when it is long"""
+        with self.write_lock:
+            with self.lock:
+                lines = self.pending
+                self.pending = []
+                self.first_pending = None
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+            if not lines:
+                return
+            
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(JOURNAL_NAME), 'a') as f:
+                f.write(''.join(line + '\n' for line in lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_entries += len(lines)
+            self.saved_at = time.time()
+            if self.journal_entries >= JOURNAL_COMPACT_ENTRIES:
+                self.compact()
+    
+    def compact(self):
+        """Write the in-memory tables as the new snapshot and start an empty journal
+        
+        The snapshot can include queued entries not yet in the journal; they
+        keep their sequence numbers and are skipped when replayed after it.
+        """
+        with self.lock:
+            content = json.dumps({'seq': self.seq, 'saved_at': time.time(), 'tables': self.tables})
+        temp_path = self.path(SNAPSHOT_NAME + '.tmp')
+        with open(temp_path, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path(SNAPSHOT_NAME))
+        # A crash before this truncation only leaves entries the snapshot already covers
+        open(self.path(JOURNAL_NAME), 'w').close()
+        self.journal_entries = 0
+    
+    def describe(self):
+        return f"{self.journal_entries} journal entries since the last snapshot"
+    
+    def get_stats(self):
+        return {
+            'tables': len(self.tables),
+            'journal_entries': self.journal_entries,
+            'pending': len(self.pending),
+            'saved_at': self.saved_at
+        }
+
+class WorkspaceRegistry:
+    """Workspaces opened by this process, shared by every session using them"""
+    def __init__(self, root=WORKSPACE_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+        self.workspaces = {}
+        # Queued edits are written on a clean shutdown instead of waiting for the timer
+        atexit.register(self.flush_all)
+    
+    def get(self, name):
+        with self.lock:
+            workspace = self.workspaces.get(name)
+            if workspace is None:
+                workspace = Workspace(name, self.root)
+                self.workspaces[name] = workspace
+            return workspace
+    
+    def flush_all(self):
+        with self.lock:
+            workspaces = list(self.workspaces.values())
+        for workspace in workspaces:
+            workspace.flush()